@@ -0,0 +1,193 @@
+"""
+JSON API (/api/v1) for the platform entities
+Takes the same filters as the HTML list views; results are streamed from a
+server-side cursor so memory use does not grow with the number of rows
+"""
+
+import json
+import os
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from werkzeug.exceptions import BadRequest
+
+from models import SessionLocal
+import listings
+
+
+API_YIELD_PER = int(os.getenv('API_YIELD_PER', '1000'))
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+def _name(user):
+    return f"{user.given_name} {user.surname}"
+
+
+def serialize_user(user):
+    return {
+        'user_id': user.user_id,
+        'email': user.email,
+        'given_name': user.given_name,
+        'surname': user.surname,
+        'city': user.city,
+        'phone_number': user.phone_number,
+        'profile_description': user.profile_description,
+    }
+
+
+def serialize_caregiver(caregiver):
+    return {
+        'caregiver_user_id': caregiver.caregiver_user_id,
+        'name': _name(caregiver.user),
+        'email': caregiver.user.email,
+        'city': caregiver.user.city,
+        'photo': caregiver.photo,
+        'gender': caregiver.gender,
+        'caregiving_type': caregiver.caregiving_type,
+        'hourly_rate': str(caregiver.hourly_rate),
+    }
+
+
+def serialize_member(member):
+    address = member.address
+    return {
+        'member_user_id': member.member_user_id,
+        'name': _name(member.user),
+        'email': member.user.email,
+        'city': member.user.city,
+        'house_rules': member.house_rules,
+        'dependent_description': member.dependent_description,
+        'address': {
+            'house_number': address.house_number,
+            'street': address.street,
+            'town': address.town,
+        } if address else None,
+    }
+
+
+def serialize_job(job):
+    return {
+        'job_id': job.job_id,
+        'member_user_id': job.member_user_id,
+        'member_name': _name(job.member.user),
+        'required_caregiving_type': job.required_caregiving_type,
+        'other_requirements': job.other_requirements,
+        'date_posted': job.date_posted.isoformat(),
+    }
+
+
+def serialize_job_application(application):
+    return {
+        'caregiver_user_id': application.caregiver_user_id,
+        'caregiver_name': _name(application.caregiver.user),
+        'job_id': application.job_id,
+        'required_caregiving_type': application.job.required_caregiving_type,
+        'date_applied': application.date_applied.isoformat(),
+    }
+
+
+def serialize_appointment(appointment):
+    return {
+        'appointment_id': appointment.appointment_id,
+        'caregiver_user_id': appointment.caregiver_user_id,
+        'caregiver_name': _name(appointment.caregiver.user),
+        'member_user_id': appointment.member_user_id,
+        'member_name': _name(appointment.member.user),
+        'appointment_date': appointment.appointment_date.isoformat(),
+        'appointment_time': appointment.appointment_time.strftime('%H:%M'),
+        'work_hours': str(appointment.work_hours),
+        'status': appointment.status,
+    }
+
+
+def limit_arg(args):
+    """The positive `limit` argument, or None when it is absent
+
+    Raises BadRequest for anything else: once a stream has started, its 200
+    status can no longer be changed.
+    """
+    value = args.get('limit', '').strip()
+    if not value:
+        return None
+    try:
+        limit = int(value)
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        raise BadRequest("limit must be a positive integer")
+    return limit
+
+
+def _rows(build_listing, args, limit):
+    db = SessionLocal()
+    try:
+        query = build_listing(db, args).ordered()
+        if limit:
+            query = query.limit(limit)
+        yield from query.yield_per(API_YIELD_PER)
+    finally:
+        db.close()
+
+
+def stream_rows(build_listing, args=None):
+    """Iterator over the listing's rows from a server-side cursor; owns its session
+
+    `args` are the filter arguments (the request's query string by default).
+    `limit` caps the number of rows; it is checked before anything streams.
+    """
+    args = request.args if args is None else args
+    return _rows(build_listing, args, limit_arg(args))
+
+
+def _json_array(rows, serialize):
+    # One chunk per API_YIELD_PER rows rather than one per row
+    yield '['
+    chunk = []
+    first = True
+    for row in rows:
+        chunk.append(('' if first else ',') + json.dumps(serialize(row)))
+        first = False
+        if len(chunk) >= API_YIELD_PER:
+            yield ''.join(chunk)
+            chunk = []
+    yield ''.join(chunk) + ']\n'
+
+
+def stream_json(build_listing, serialize):
+    rows = stream_rows(build_listing)
+    return Response(stream_with_context(_json_array(rows, serialize)), mimetype='application/json')
+
+
+@api.errorhandler(BadRequest)
+def bad_request(error):
+    return jsonify(error=error.description), 400
+
+
+@api.route('/users')
+def users():
+    return stream_json(listings.users, serialize_user)
+
+
+@api.route('/caregivers')
+def caregivers():
+    return stream_json(listings.caregivers, serialize_caregiver)
+
+
+@api.route('/members')
+def members():
+    return stream_json(listings.members, serialize_member)
+
+
+@api.route('/jobs')
+def jobs():
+    return stream_json(listings.jobs, serialize_job)
+
+
+@api.route('/job_applications')
+def job_applications():
+    return stream_json(listings.job_applications, serialize_job_application)
+
+
+@api.route('/appointments')
+def appointments():
+    return stream_json(listings.appointments, serialize_appointment)
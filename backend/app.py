@@ -1,23 +1,81 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
+import click
+from flask import Flask, g, render_template, request, redirect, url_for, flash, jsonify
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import joinedload
+from werkzeug.exceptions import BadRequestKeyError
 from models import (
-    SessionLocal,
+    engine,
     User, Caregiver, Member, Address, Job, JobApplication, Appointment
 )
+from api import api
+from lookup import lookup
+from instrumentation import query_budget
+from pagination import page_url
+from sessions import get_db
+import bulk_import
+import cache
+import exports
+import indexes
+import instrumentation
+import listings
+import matching
+import matviews
+import migrate
+import pooling
+import refdata
+import reports
+import schedule
+import scheduling
+import search
+import sessions
+import slowlog
 from datetime import datetime
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
+import time
 
 app = Flask(__name__)
 app.secret_key = '67blud'
+instrumentation.init_app(app, engine)
+slowlog.init_app(app)
+sessions.init_app(app)
+app.jinja_env.globals['page_url'] = page_url
+app.jinja_env.globals['option_label'] = refdata.record_label
+app.register_blueprint(api)
+app.register_blueprint(lookup)
 
-def get_db():
-    db = SessionLocal()
-    try:
-        return db
-    finally:
-        pass 
 
-def close_db(db):
-    db.close()
+# Errors a form submission reports back to the user instead of failing with a
+# 500 (or, for a missing form field, a bare 400)
+FORM_ERRORS = (SQLAlchemyError, ValueError, InvalidOperation, ArithmeticError, BadRequestKeyError)
+
+
+def _form_error(error):
+    if request.method != 'POST':
+        raise error
+    if 'db' in g:
+        g.db.rollback()
+    if isinstance(error, BadRequestKeyError):
+        flash(f'Error: missing form field {error.args[0]!r}', 'error')
+    elif isinstance(error, InvalidOperation):
+        # str() of it is only the list of decimal signals
+        flash('Error: not a valid number', 'error')
+    else:
+        flash(f'Error: {str(error)}', 'error')
+    return redirect(request.referrer or url_for('index'))
+
+
+for _error in FORM_ERRORS:
+    app.register_error_handler(_error, _form_error)
+
+
+def _form_decimal(name):
+    try:
+        value = Decimal(request.form[name])
+    except InvalidOperation:
+        value = None
+    if value is None or not value.is_finite():
+        raise ValueError(f"{name.replace('_', ' ')} must be a number")
+    return value
 
 
 @app.route('/')
@@ -25,633 +83,632 @@ def index():
     return render_template('index.html')
 
 
+@app.route('/pool')
+def pool_status():
+    return jsonify(pooling.pool_stats(engine.pool))
+
+
+def _schedule_args():
+    view = request.args.get('view')
+    try:
+        start = datetime.strptime(request.args.get('start', ''), '%Y-%m-%d').date()
+    except ValueError:
+        start = None
+    if start is not None and not schedule.FIRST_START <= start <= schedule.LAST_START:
+        start = None
+    return (view if view in schedule.VIEWS else 'week'), start
+
+
+def _bulk_import(kind, title, list_endpoint):
+    result = None
+    if request.method == 'POST':
+        try:
+            result = bulk_import.import_upload(kind, request.files['file'])
+            flash(f'{result.imported} {title.lower()} imported, {len(result.errors)} rows rejected.', 'success')
+        except Exception as e:
+            flash(f'Error: {str(e)}', 'error')
+    return render_template(
+        'imports/upload.html',
+        title=title,
+        list_endpoint=list_endpoint,
+        columns=[column.name for column in bulk_import.import_columns(kind)],
+        result=result
+    )
+
+
 # user
 
 @app.route('/users')
+@query_budget(1)
+@cache.cached('users')
 def list_users():
     search_query = request.args.get('search', '').strip()
-    db = get_db()
-    try:
-        users_query = db.query(User)
-        if search_query:
-            users_query = users_query.filter(
-                (User.given_name.ilike(f"%{search_query}%")) |
-                (User.surname.ilike(f"%{search_query}%")) |
-                (User.email.ilike(f"%{search_query}%")) |
-                (User.city.ilike(f"%{search_query}%"))
-            )
-        users = users_query.all()
-        return render_template('users/list.html', users=users, search_query=search_query)
-    finally:
-        close_db(db)
+    users = listings.users(get_db(), request.args).page()
+    return render_template(
+        'users/list.html',
+        users=users,
+        page=users,
+        search_query=search_query,
+        search_mode=search.search_mode_arg(request.args)
+    )
 
 
 @app.route('/users/create', methods=['GET', 'POST'])
 def create_user():
-    db = get_db()
-    try:
-        if request.method == 'POST':
-            user = User(
-                email=request.form['email'],
-                given_name=request.form['given_name'],
-                surname=request.form['surname'],
-                city=request.form['city'],
-                phone_number=request.form['phone_number'],
-                profile_description=request.form.get('profile_description', ''),
-                password=request.form['password']
-            )
-            db.add(user)
-            db.commit()
-            flash('User created successfully!', 'success')
-            return redirect(url_for('list_users'))
-        return render_template('users/create.html')
-    except Exception as e:
-        db.rollback()
-        flash(f'Error: {str(e)}', 'error')
-        return render_template('users/create.html')
-    finally:
-        close_db(db)
+    if request.method == 'POST':
+        db = get_db()
+        user = User(
+            email=request.form['email'],
+            given_name=request.form['given_name'],
+            surname=request.form['surname'],
+            city=request.form['city'],
+            phone_number=request.form['phone_number'],
+            profile_description=request.form.get('profile_description', ''),
+            password=request.form['password']
+        )
+        db.add(user)
+        db.commit()
+        flash('User created successfully!', 'success')
+        return redirect(url_for('list_users'))
+    return render_template('users/create.html')
 
 
 @app.route('/users/<int:user_id>/edit', methods=['GET', 'POST'])
+@cache.cached('users', store=False)
 def edit_user(user_id):
     db = get_db()
-    try:
-        user = db.query(User).filter(User.user_id == user_id).first()
-        if not user:
-            flash('User not found!', 'error')
-            return redirect(url_for('list_users'))
-        
-        if request.method == 'POST':
-            user.email = request.form['email']
-            user.given_name = request.form['given_name']
-            user.surname = request.form['surname']
-            user.city = request.form['city']
-            user.phone_number = request.form['phone_number']
-            user.profile_description = request.form.get('profile_description', '')
-            user.password = request.form['password']
-            db.commit()
-            flash('User updated successfully!', 'success')
-            return redirect(url_for('list_users'))
-        
-        return render_template('users/edit.html', user=user)
-    except Exception as e:
-        db.rollback()
-        flash(f'Error: {str(e)}', 'error')
-        return render_template('users/edit.html', user=user)
-    finally:
-        close_db(db)
+    user = db.query(User).filter(User.user_id == user_id).first()
+    if not user:
+        flash('User not found!', 'error')
+        return redirect(url_for('list_users'))
+    
+    if request.method == 'POST':
+        user.email = request.form['email']
+        user.given_name = request.form['given_name']
+        user.surname = request.form['surname']
+        user.city = request.form['city']
+        user.phone_number = request.form['phone_number']
+        user.profile_description = request.form.get('profile_description', '')
+        user.password = request.form['password']
+        db.commit()
+        flash('User updated successfully!', 'success')
+        return redirect(url_for('list_users'))
+    
+    return render_template('users/edit.html', user=user)
 
 
 @app.route('/users/<int:user_id>/delete', methods=['POST'])
 def delete_user(user_id):
     db = get_db()
-    try:
-        user = db.query(User).filter(User.user_id == user_id).first()
-        if user:
-            db.delete(user)
-            db.commit()
-            flash('User deleted successfully!', 'success')
-        else:
-            flash('User not found!', 'error')
-    except Exception as e:
-        db.rollback()
-        flash(f'Error: {str(e)}', 'error')
-    finally:
-        close_db(db)
+    user = db.query(User).filter(User.user_id == user_id).first()
+    if user:
+        db.delete(user)
+        db.commit()
+        flash('User deleted successfully!', 'success')
+    else:
+        flash('User not found!', 'error')
     return redirect(url_for('list_users'))
 
 
 # caregiver
 
 @app.route('/caregivers')
+@query_budget(1)
+@cache.cached('caregiver', 'users')
 def list_caregivers():
     caregiving_type_filter = request.args.get('caregiving_type', '').strip()
     city_filter = request.args.get('city', '').strip()
-    
-    db = get_db()
-    try:
-        caregivers_query = db.query(Caregiver).join(User)
-        
-        if caregiving_type_filter:
-            caregivers_query = caregivers_query.filter(Caregiver.caregiving_type == caregiving_type_filter)
-        
-        if city_filter:
-            caregivers_query = caregivers_query.filter(User.city.ilike(f"%{city_filter}%"))
-        
-        caregivers = caregivers_query.all()
-        caregiving_types = ['babysitter', 'elderly care', 'playmate for children']
-        
-        return render_template(
-            'caregivers/list.html',
-            caregivers=caregivers,
-            caregiving_types=caregiving_types,
-            selected_caregiving_type=caregiving_type_filter,
-            search_city=city_filter
-        )
-    finally:
-        close_db(db)
+    caregivers = listings.caregivers(get_db(), request.args).page()
+    return render_template(
+        'caregivers/list.html',
+        caregivers=caregivers,
+        page=caregivers,
+        caregiving_types=listings.CAREGIVING_TYPES,
+        selected_caregiving_type=caregiving_type_filter,
+        search_city=city_filter,
+        city_mode=search.search_mode_arg(request.args, default='substring')
+    )
 
 
 @app.route('/caregivers/create', methods=['GET', 'POST'])
 def create_caregiver():
-    db = get_db()
-    try:
-        if request.method == 'POST':
-            # First create the user
-            user = User(
-                email=request.form['email'],
-                given_name=request.form['given_name'],
-                surname=request.form['surname'],
-                city=request.form['city'],
-                phone_number=request.form['phone_number'],
-                profile_description=request.form.get('profile_description', ''),
-                password=request.form['password']
-            )
-            db.add(user)
-            db.flush()  # Get the user_id
-            
-            # Then create the caregiver
-            caregiver = Caregiver(
-                caregiver_user_id=user.user_id,
-                photo=request.form.get('photo', ''),
-                gender=request.form['gender'],
-                caregiving_type=request.form['caregiving_type'],
-                hourly_rate=Decimal(request.form['hourly_rate'])
-            )
-            db.add(caregiver)
-            db.commit()
-            flash('Caregiver created successfully!', 'success')
-            return redirect(url_for('list_caregivers'))
+    if request.method == 'POST':
+        db = get_db()
+        # First create the user
+        user = User(
+            email=request.form['email'],
+            given_name=request.form['given_name'],
+            surname=request.form['surname'],
+            city=request.form['city'],
+            phone_number=request.form['phone_number'],
+            profile_description=request.form.get('profile_description', ''),
+            password=request.form['password']
+        )
+        db.add(user)
+        db.flush()  # Get the user_id
         
-        return render_template('caregivers/create.html')
-    except Exception as e:
-        db.rollback()
-        flash(f'Error: {str(e)}', 'error')
-        return render_template('caregivers/create.html')
-    finally:
-        close_db(db)
+        # Then create the caregiver
+        caregiver = Caregiver(
+            caregiver_user_id=user.user_id,
+            photo=request.form.get('photo', ''),
+            gender=request.form['gender'],
+            caregiving_type=request.form['caregiving_type'],
+            hourly_rate=_form_decimal('hourly_rate')
+        )
+        db.add(caregiver)
+        db.commit()
+        flash('Caregiver created successfully!', 'success')
+        return redirect(url_for('list_caregivers'))
+    
+    return render_template('caregivers/create.html')
+
+
+@app.route('/caregivers/import', methods=['GET', 'POST'])
+def import_caregivers():
+    return _bulk_import('caregiver', 'Caregivers', 'list_caregivers')
 
 
 @app.route('/caregivers/<int:caregiver_id>/edit', methods=['GET', 'POST'])
+@cache.cached('caregiver', 'users', store=False)
 def edit_caregiver(caregiver_id):
     db = get_db()
-    try:
-        caregiver = db.query(Caregiver).filter(Caregiver.caregiver_user_id == caregiver_id).first()
-        if not caregiver:
-            flash('Caregiver not found!', 'error')
-            return redirect(url_for('list_caregivers'))
-        
-        if request.method == 'POST':
-            caregiver.user.email = request.form['email']
-            caregiver.user.given_name = request.form['given_name']
-            caregiver.user.surname = request.form['surname']
-            caregiver.user.city = request.form['city']
-            caregiver.user.phone_number = request.form['phone_number']
-            caregiver.user.profile_description = request.form.get('profile_description', '')
-            caregiver.user.password = request.form['password']
-            caregiver.photo = request.form.get('photo', '')
-            caregiver.gender = request.form['gender']
-            caregiver.caregiving_type = request.form['caregiving_type']
-            caregiver.hourly_rate = Decimal(request.form['hourly_rate'])
-            db.commit()
-            flash('Caregiver updated successfully!', 'success')
-            return redirect(url_for('list_caregivers'))
-        
-        return render_template('caregivers/edit.html', caregiver=caregiver)
-    except Exception as e:
-        db.rollback()
-        flash(f'Error: {str(e)}', 'error')
-        return render_template('caregivers/edit.html', caregiver=caregiver)
-    finally:
-        close_db(db)
+    caregiver = db.query(Caregiver).filter(Caregiver.caregiver_user_id == caregiver_id).first()
+    if not caregiver:
+        flash('Caregiver not found!', 'error')
+        return redirect(url_for('list_caregivers'))
+    
+    if request.method == 'POST':
+        caregiver.user.email = request.form['email']
+        caregiver.user.given_name = request.form['given_name']
+        caregiver.user.surname = request.form['surname']
+        caregiver.user.city = request.form['city']
+        caregiver.user.phone_number = request.form['phone_number']
+        caregiver.user.profile_description = request.form.get('profile_description', '')
+        caregiver.user.password = request.form['password']
+        caregiver.photo = request.form.get('photo', '')
+        caregiver.gender = request.form['gender']
+        caregiver.caregiving_type = request.form['caregiving_type']
+        caregiver.hourly_rate = _form_decimal('hourly_rate')
+        db.commit()
+        flash('Caregiver updated successfully!', 'success')
+        return redirect(url_for('list_caregivers'))
+    
+    return render_template('caregivers/edit.html', caregiver=caregiver)
 
 
 @app.route('/caregivers/<int:caregiver_id>/delete', methods=['POST'])
 def delete_caregiver(caregiver_id):
     db = get_db()
-    try:
-        caregiver = db.query(Caregiver).filter(Caregiver.caregiver_user_id == caregiver_id).first()
-        if caregiver:
-            db.delete(caregiver.user)  # This will cascade delete caregiver
-            db.commit()
-            flash('Caregiver deleted successfully!', 'success')
-        else:
-            flash('Caregiver not found!', 'error')
-    except Exception as e:
-        db.rollback()
-        flash(f'Error: {str(e)}', 'error')
-    finally:
-        close_db(db)
+    caregiver = db.query(Caregiver).filter(Caregiver.caregiver_user_id == caregiver_id).first()
+    if caregiver:
+        db.delete(caregiver.user)  # This will cascade delete caregiver
+        db.commit()
+        flash('Caregiver deleted successfully!', 'success')
+    else:
+        flash('Caregiver not found!', 'error')
     return redirect(url_for('list_caregivers'))
 
 
+@app.route('/caregivers/<int:caregiver_id>/schedule')
+@query_budget(2)
+def caregiver_schedule(caregiver_id):
+    db = get_db()
+    caregiver = db.query(Caregiver).options(joinedload(Caregiver.user)).filter(
+        Caregiver.caregiver_user_id == caregiver_id
+    ).first()
+    if not caregiver:
+        flash('Caregiver not found!', 'error')
+        return redirect(url_for('list_caregivers'))
+    view, start = _schedule_args()
+    return render_template(
+        'schedule.html',
+        title=f"{caregiver.user.given_name} {caregiver.user.surname} (caregiver)",
+        schedule=schedule.caregiver_schedule(db, caregiver_id, view, start),
+        endpoint='caregiver_schedule',
+        endpoint_args={'caregiver_id': caregiver_id},
+        list_endpoint='list_caregivers'
+    )
+
+
 # member
 
 @app.route('/members')
+@query_budget(1)
+@cache.cached('member', 'users', 'address')
 def list_members():
     search_query = request.args.get('search', '').strip()
-    db = get_db()
-    try:
-        members_query = db.query(Member).join(User)
-        if search_query:
-            members_query = members_query.filter(
-                (User.given_name.ilike(f"%{search_query}%")) |
-                (User.surname.ilike(f"%{search_query}%")) |
-                (User.city.ilike(f"%{search_query}%"))
-            )
-        members = members_query.all()
-        return render_template('members/list.html', members=members, search_query=search_query)
-    finally:
-        close_db(db)
+    members = listings.members(get_db(), request.args).page()
+    return render_template('members/list.html', members=members, page=members, search_query=search_query)
 
 
 @app.route('/members/create', methods=['GET', 'POST'])
 def create_member():
-    db = get_db()
-    try:
-        if request.method == 'POST':
-            # First create the user
-            user = User(
-                email=request.form['email'],
-                given_name=request.form['given_name'],
-                surname=request.form['surname'],
-                city=request.form['city'],
-                phone_number=request.form['phone_number'],
-                profile_description=request.form.get('profile_description', ''),
-                password=request.form['password']
-            )
-            db.add(user)
-            db.flush()
-            
-            # Then create the member
-            member = Member(
-                member_user_id=user.user_id,
-                house_rules=request.form.get('house_rules', ''),
-                dependent_description=request.form.get('dependent_description', '')
-            )
-            db.add(member)
-            db.flush()
-            
-            # Create address
-            address = Address(
-                member_user_id=member.member_user_id,
-                house_number=request.form['house_number'],
-                street=request.form['street'],
-                town=request.form['town']
-            )
-            db.add(address)
-            db.commit()
-            flash('Member created successfully!', 'success')
-            return redirect(url_for('list_members'))
+    if request.method == 'POST':
+        db = get_db()
+        # First create the user
+        user = User(
+            email=request.form['email'],
+            given_name=request.form['given_name'],
+            surname=request.form['surname'],
+            city=request.form['city'],
+            phone_number=request.form['phone_number'],
+            profile_description=request.form.get('profile_description', ''),
+            password=request.form['password']
+        )
+        db.add(user)
+        db.flush()
+        
+        # Then create the member
+        member = Member(
+            member_user_id=user.user_id,
+            house_rules=request.form.get('house_rules', ''),
+            dependent_description=request.form.get('dependent_description', '')
+        )
+        db.add(member)
+        db.flush()
         
-        return render_template('members/create.html')
-    except Exception as e:
-        db.rollback()
-        flash(f'Error: {str(e)}', 'error')
-        return render_template('members/create.html')
-    finally:
-        close_db(db)
+        # Create address
+        address = Address(
+            member_user_id=member.member_user_id,
+            house_number=request.form['house_number'],
+            street=request.form['street'],
+            town=request.form['town']
+        )
+        db.add(address)
+        db.commit()
+        flash('Member created successfully!', 'success')
+        return redirect(url_for('list_members'))
+    
+    return render_template('members/create.html')
+
+
+@app.route('/members/import', methods=['GET', 'POST'])
+def import_members():
+    return _bulk_import('member', 'Members', 'list_members')
 
 
 @app.route('/members/<int:member_id>/edit', methods=['GET', 'POST'])
+@cache.cached('member', 'users', 'address', store=False)
 def edit_member(member_id):
     db = get_db()
-    try:
-        member = db.query(Member).filter(Member.member_user_id == member_id).first()
-        if not member:
-            flash('Member not found!', 'error')
-            return redirect(url_for('list_members'))
+    member = db.query(Member).filter(Member.member_user_id == member_id).first()
+    if not member:
+        flash('Member not found!', 'error')
+        return redirect(url_for('list_members'))
+    
+    if request.method == 'POST':
+        member.user.email = request.form['email']
+        member.user.given_name = request.form['given_name']
+        member.user.surname = request.form['surname']
+        member.user.city = request.form['city']
+        member.user.phone_number = request.form['phone_number']
+        member.user.profile_description = request.form.get('profile_description', '')
+        member.user.password = request.form['password']
+        member.house_rules = request.form.get('house_rules', '')
+        member.dependent_description = request.form.get('dependent_description', '')
         
-        if request.method == 'POST':
-            member.user.email = request.form['email']
-            member.user.given_name = request.form['given_name']
-            member.user.surname = request.form['surname']
-            member.user.city = request.form['city']
-            member.user.phone_number = request.form['phone_number']
-            member.user.profile_description = request.form.get('profile_description', '')
-            member.user.password = request.form['password']
-            member.house_rules = request.form.get('house_rules', '')
-            member.dependent_description = request.form.get('dependent_description', '')
-            
-            # Update address
-            if member.address:
-                member.address.house_number = request.form['house_number']
-                member.address.street = request.form['street']
-                member.address.town = request.form['town']
-            
-            db.commit()
-            flash('Member updated successfully!', 'success')
-            return redirect(url_for('list_members'))
+        # Update address
+        if member.address:
+            member.address.house_number = request.form['house_number']
+            member.address.street = request.form['street']
+            member.address.town = request.form['town']
         
-        return render_template('members/edit.html', member=member)
-    except Exception as e:
-        db.rollback()
-        flash(f'Error: {str(e)}', 'error')
-        return render_template('members/edit.html', member=member)
-    finally:
-        close_db(db)
+        db.commit()
+        flash('Member updated successfully!', 'success')
+        return redirect(url_for('list_members'))
+    
+    return render_template('members/edit.html', member=member)
 
 
 @app.route('/members/<int:member_id>/delete', methods=['POST'])
 def delete_member(member_id):
     db = get_db()
-    try:
-        member = db.query(Member).filter(Member.member_user_id == member_id).first()
-        if member:
-            db.delete(member.user)  # This will cascade delete member and address
-            db.commit()
-            flash('Member deleted successfully!', 'success')
-        else:
-            flash('Member not found!', 'error')
-    except Exception as e:
-        db.rollback()
-        flash(f'Error: {str(e)}', 'error')
-    finally:
-        close_db(db)
+    member = db.query(Member).filter(Member.member_user_id == member_id).first()
+    if member:
+        db.delete(member.user)  # This will cascade delete member and address
+        db.commit()
+        flash('Member deleted successfully!', 'success')
+    else:
+        flash('Member not found!', 'error')
     return redirect(url_for('list_members'))
 
 
+@app.route('/members/<int:member_id>/schedule')
+@query_budget(2)
+def member_schedule(member_id):
+    db = get_db()
+    member = db.query(Member).options(joinedload(Member.user)).filter(Member.member_user_id == member_id).first()
+    if not member:
+        flash('Member not found!', 'error')
+        return redirect(url_for('list_members'))
+    view, start = _schedule_args()
+    return render_template(
+        'schedule.html',
+        title=f"{member.user.given_name} {member.user.surname} (member)",
+        schedule=schedule.member_schedule(db, member_id, view, start),
+        endpoint='member_schedule',
+        endpoint_args={'member_id': member_id},
+        list_endpoint='list_members'
+    )
+
+
 # job
 
 @app.route('/jobs')
+@query_budget(2)
+@cache.cached('job', 'member', 'users', 'job_application')
 def list_jobs():
     search_query = request.args.get('search', '').strip()
     db = get_db()
-    try:
-        jobs_query = db.query(Job).join(Member).join(User)
-        if search_query:
-            jobs_query = jobs_query.filter(
-                (Job.required_caregiving_type.ilike(f"%{search_query}%")) |
-                (User.given_name.ilike(f"%{search_query}%")) |
-                (User.surname.ilike(f"%{search_query}%")) |
-                (Job.other_requirements.ilike(f"%{search_query}%"))
-            )
-        jobs = jobs_query.all()
-        return render_template('jobs/list.html', jobs=jobs, search_query=search_query)
-    finally:
-        close_db(db)
+    jobs = listings.jobs(db, request.args).page()
+    applicant_counts = reports.applicant_counts(db, [job.job_id for job in jobs])
+    return render_template('jobs/list.html', jobs=jobs, page=jobs, applicant_counts=applicant_counts, search_query=search_query)
 
 
 @app.route('/jobs/create', methods=['GET', 'POST'])
 def create_job():
     db = get_db()
-    try:
-        if request.method == 'POST':
-            job = Job(
-                member_user_id=int(request.form['member_user_id']),
-                required_caregiving_type=request.form['required_caregiving_type'],
-                other_requirements=request.form.get('other_requirements', ''),
-                date_posted=datetime.strptime(request.form['date_posted'], '%Y-%m-%d').date()
-            )
-            db.add(job)
-            db.commit()
-            flash('Job created successfully!', 'success')
-            return redirect(url_for('list_jobs'))
-        
-        members = db.query(Member).join(User).all()
-        return render_template('jobs/create.html', members=members)
-    except Exception as e:
-        db.rollback()
-        flash(f'Error: {str(e)}', 'error')
-        members = db.query(Member).join(User).all()
-        return render_template('jobs/create.html', members=members)
-    finally:
-        close_db(db)
+    if request.method == 'POST':
+        job = Job(
+            member_user_id=int(request.form['member_user_id']),
+            required_caregiving_type=request.form['required_caregiving_type'],
+            other_requirements=request.form.get('other_requirements', ''),
+            date_posted=datetime.strptime(request.form['date_posted'], '%Y-%m-%d').date()
+        )
+        db.add(job)
+        db.commit()
+        flash('Job created successfully!', 'success')
+        return redirect(url_for('list_jobs'))
+    
+    return render_template('jobs/create.html')
 
 
 @app.route('/jobs/<int:job_id>/edit', methods=['GET', 'POST'])
+@cache.cached('job', 'member', 'users', store=False)
 def edit_job(job_id):
     db = get_db()
-    try:
-        job = db.query(Job).filter(Job.job_id == job_id).first()
-        if not job:
-            flash('Job not found!', 'error')
-            return redirect(url_for('list_jobs'))
-        
-        if request.method == 'POST':
-            job.member_user_id = int(request.form['member_user_id'])
-            job.required_caregiving_type = request.form['required_caregiving_type']
-            job.other_requirements = request.form.get('other_requirements', '')
-            job.date_posted = datetime.strptime(request.form['date_posted'], '%Y-%m-%d').date()
-            db.commit()
-            flash('Job updated successfully!', 'success')
-            return redirect(url_for('list_jobs'))
-        
-        members = db.query(Member).join(User).all()
-        return render_template('jobs/edit.html', job=job, members=members)
-    except Exception as e:
-        db.rollback()
-        flash(f'Error: {str(e)}', 'error')
-        members = db.query(Member).join(User).all()
-        return render_template('jobs/edit.html', job=job, members=members)
-    finally:
-        close_db(db)
+    # The member's name labels the member field
+    job = db.query(Job).options(joinedload(Job.member).joinedload(Member.user)).filter(Job.job_id == job_id).first()
+    if not job:
+        flash('Job not found!', 'error')
+        return redirect(url_for('list_jobs'))
+    
+    if request.method == 'POST':
+        job.member_user_id = int(request.form['member_user_id'])
+        job.required_caregiving_type = request.form['required_caregiving_type']
+        job.other_requirements = request.form.get('other_requirements', '')
+        job.date_posted = datetime.strptime(request.form['date_posted'], '%Y-%m-%d').date()
+        db.commit()
+        flash('Job updated successfully!', 'success')
+        return redirect(url_for('list_jobs'))
+    
+    return render_template('jobs/edit.html', job=job)
 
 
 @app.route('/jobs/<int:job_id>/delete', methods=['POST'])
 def delete_job(job_id):
     db = get_db()
-    try:
-        job = db.query(Job).filter(Job.job_id == job_id).first()
-        if job:
-            db.delete(job)
-            db.commit()
-            flash('Job deleted successfully!', 'success')
-        else:
-            flash('Job not found!', 'error')
-    except Exception as e:
-        db.rollback()
-        flash(f'Error: {str(e)}', 'error')
-    finally:
-        close_db(db)
+    job = db.query(Job).filter(Job.job_id == job_id).first()
+    if job:
+        db.delete(job)
+        db.commit()
+        flash('Job deleted successfully!', 'success')
+    else:
+        flash('Job not found!', 'error')
     return redirect(url_for('list_jobs'))
 
 
+@app.route('/jobs/<int:job_id>/matches')
+@query_budget(3)
+def job_matches(job_id):
+    db = get_db()
+    job = db.query(Job).options(joinedload(Job.member).joinedload(Member.user)).filter(Job.job_id == job_id).first()
+    if not job:
+        flash('Job not found!', 'error')
+        return redirect(url_for('list_jobs'))
+    limit = min(request.args.get('limit', type=int) or matching.MATCH_LIMIT, matching.MATCH_MAX_LIMIT)
+    matches = matching.matches(db, job, job.member.user.city, max(limit, 1))
+    refreshed_at = matviews.refreshed_at(db, 'caregiver_match_candidates')
+    return render_template('jobs/matches.html', job=job, matches=matches, refreshed_at=refreshed_at)
+
+
 # job application
 
 @app.route('/job_applications')
+@query_budget(1)
+@cache.cached('job_application', 'caregiver', 'users', 'job')
 def list_job_applications():
     search_query = request.args.get('search', '').strip()
-    db = get_db()
-    try:
-        applications_query = db.query(JobApplication).join(Caregiver).join(User).join(Job)
-        if search_query:
-            applications_query = applications_query.filter(
-                (User.given_name.ilike(f"%{search_query}%")) |
-                (User.surname.ilike(f"%{search_query}%")) |
-                (Job.required_caregiving_type.ilike(f"%{search_query}%"))
-            )
-        applications = applications_query.all()
-        return render_template('job_applications/list.html', applications=applications, search_query=search_query)
-    finally:
-        close_db(db)
+    export_format = request.args.get('format')
+    if export_format in exports.FORMATS:
+        return exports.job_applications(export_format)
+    applications = listings.job_applications(get_db(), request.args).page()
+    return render_template('job_applications/list.html', applications=applications, page=applications, search_query=search_query)
 
 
 @app.route('/job_applications/create', methods=['GET', 'POST'])
 def create_job_application():
     db = get_db()
-    try:
-        if request.method == 'POST':
-            application = JobApplication(
-                caregiver_user_id=int(request.form['caregiver_user_id']),
-                job_id=int(request.form['job_id']),
-                date_applied=datetime.strptime(request.form['date_applied'], '%Y-%m-%d').date()
-            )
-            db.add(application)
-            db.commit()
-            flash('Job application created successfully!', 'success')
-            return redirect(url_for('list_job_applications'))
-        
-        caregivers = db.query(Caregiver).join(User).all()
-        jobs = db.query(Job).all()
-        return render_template('job_applications/create.html', caregivers=caregivers, jobs=jobs)
-    except Exception as e:
-        db.rollback()
-        flash(f'Error: {str(e)}', 'error')
-        caregivers = db.query(Caregiver).join(User).all()
-        jobs = db.query(Job).all()
-        return render_template('job_applications/create.html', caregivers=caregivers, jobs=jobs)
-    finally:
-        close_db(db)
+    if request.method == 'POST':
+        application = JobApplication(
+            caregiver_user_id=int(request.form['caregiver_user_id']),
+            job_id=int(request.form['job_id']),
+            date_applied=datetime.strptime(request.form['date_applied'], '%Y-%m-%d').date()
+        )
+        db.add(application)
+        db.commit()
+        flash('Job application created successfully!', 'success')
+        return redirect(url_for('list_job_applications'))
+    
+    return render_template('job_applications/create.html')
 
 
 @app.route('/job_applications/<int:caregiver_id>/<int:job_id>/delete', methods=['POST'])
 def delete_job_application(caregiver_id, job_id):
     db = get_db()
-    try:
-        application = db.query(JobApplication).filter(
-            JobApplication.caregiver_user_id == caregiver_id,
-            JobApplication.job_id == job_id
-        ).first()
-        if application:
-            db.delete(application)
-            db.commit()
-            flash('Job application deleted successfully!', 'success')
-        else:
-            flash('Job application not found!', 'error')
-    except Exception as e:
-        db.rollback()
-        flash(f'Error: {str(e)}', 'error')
-    finally:
-        close_db(db)
+    application = db.query(JobApplication).filter(
+        JobApplication.caregiver_user_id == caregiver_id,
+        JobApplication.job_id == job_id
+    ).first()
+    if application:
+        db.delete(application)
+        db.commit()
+        flash('Job application deleted successfully!', 'success')
+    else:
+        flash('Job application not found!', 'error')
     return redirect(url_for('list_job_applications'))
 
 
 # appointment
 
 @app.route('/appointments')
+@query_budget(1)
+@cache.cached('appointment', 'caregiver', 'member', 'users')
 def list_appointments():
     search_query = request.args.get('search', '').strip()
-    db = get_db()
-    try:
-        from sqlalchemy.orm import aliased
-        from sqlalchemy import or_
-        caregiver_user = aliased(User)
-        member_user = aliased(User)
-        appointments_query = db.query(Appointment).join(Caregiver).join(caregiver_user, Caregiver.caregiver_user_id == caregiver_user.user_id).join(Member, Appointment.member_user_id == Member.member_user_id).join(member_user, Member.member_user_id == member_user.user_id)
-        if search_query:
-            appointments_query = appointments_query.filter(
-                or_(
-                    caregiver_user.given_name.ilike(f"%{search_query}%"),
-                    caregiver_user.surname.ilike(f"%{search_query}%"),
-                    member_user.given_name.ilike(f"%{search_query}%"),
-                    member_user.surname.ilike(f"%{search_query}%"),
-                    Appointment.status.ilike(f"%{search_query}%")
-                )
-            )
-        appointments = appointments_query.all()
-        return render_template('appointments/list.html', appointments=appointments, search_query=search_query)
-    finally:
-        close_db(db)
+    export_format = request.args.get('format')
+    if export_format in exports.FORMATS:
+        return exports.appointments(export_format)
+    appointments = listings.appointments(get_db(), request.args).page()
+    return render_template('appointments/list.html', appointments=appointments, page=appointments, search_query=search_query)
 
 
 @app.route('/appointments/create', methods=['GET', 'POST'])
 def create_appointment():
     """Create a new appointment"""
     db = get_db()
-    try:
-        if request.method == 'POST':
-            appointment = Appointment(
-                caregiver_user_id=int(request.form['caregiver_user_id']),
-                member_user_id=int(request.form['member_user_id']),
-                appointment_date=datetime.strptime(request.form['appointment_date'], '%Y-%m-%d').date(),
-                appointment_time=datetime.strptime(request.form['appointment_time'], '%H:%M').time(),
-                work_hours=Decimal(request.form['work_hours']),
-                status=request.form['status']
-            )
-            db.add(appointment)
-            db.commit()
-            flash('Appointment created successfully!', 'success')
-            return redirect(url_for('list_appointments'))
-        
-        caregivers = db.query(Caregiver).join(User).all()
-        members = db.query(Member).join(User).all()
-        return render_template('appointments/create.html', caregivers=caregivers, members=members)
-    except Exception as e:
-        db.rollback()
-        flash(f'Error: {str(e)}', 'error')
-        caregivers = db.query(Caregiver).join(User).all()
-        members = db.query(Member).join(User).all()
-        return render_template('appointments/create.html', caregivers=caregivers, members=members)
-    finally:
-        close_db(db)
+    if request.method == 'POST':
+        appointment = Appointment(
+            caregiver_user_id=int(request.form['caregiver_user_id']),
+            member_user_id=int(request.form['member_user_id']),
+            appointment_date=datetime.strptime(request.form['appointment_date'], '%Y-%m-%d').date(),
+            appointment_time=datetime.strptime(request.form['appointment_time'], '%H:%M').time(),
+            work_hours=_form_decimal('work_hours'),
+            status=request.form['status']
+        )
+        scheduling.check_booking(db, appointment)
+        db.add(appointment)
+        scheduling.commit_booking(db, appointment)
+        flash('Appointment created successfully!', 'success')
+        return redirect(url_for('list_appointments'))
+    
+    return render_template('appointments/create.html')
 
 
 @app.route('/appointments/<int:appointment_id>/edit', methods=['GET', 'POST'])
+@cache.cached('appointment', 'caregiver', 'member', 'users', store=False)
 def edit_appointment(appointment_id):
     """Edit an existing appointment"""
     db = get_db()
-    try:
-        appointment = db.query(Appointment).filter(Appointment.appointment_id == appointment_id).first()
-        if not appointment:
-            flash('Appointment not found!', 'error')
-            return redirect(url_for('list_appointments'))
-        
-        if request.method == 'POST':
-            appointment.caregiver_user_id = int(request.form['caregiver_user_id'])
-            appointment.member_user_id = int(request.form['member_user_id'])
-            appointment.appointment_date = datetime.strptime(request.form['appointment_date'], '%Y-%m-%d').date()
-            appointment.appointment_time = datetime.strptime(request.form['appointment_time'], '%H:%M').time()
-            appointment.work_hours = Decimal(request.form['work_hours'])
-            appointment.status = request.form['status']
-            db.commit()
-            flash('Appointment updated successfully!', 'success')
-            return redirect(url_for('list_appointments'))
-        
-        caregivers = db.query(Caregiver).join(User).all()
-        members = db.query(Member).join(User).all()
-        return render_template('appointments/edit.html', appointment=appointment, caregivers=caregivers, members=members)
-    except Exception as e:
-        db.rollback()
-        flash(f'Error: {str(e)}', 'error')
-        caregivers = db.query(Caregiver).join(User).all()
-        members = db.query(Member).join(User).all()
-        return render_template('appointments/edit.html', appointment=appointment, caregivers=caregivers, members=members)
-    finally:
-        close_db(db)
+    appointment = db.query(Appointment).options(
+        joinedload(Appointment.caregiver).joinedload(Caregiver.user),
+        joinedload(Appointment.member).joinedload(Member.user)
+    ).filter(Appointment.appointment_id == appointment_id).first()
+    if not appointment:
+        flash('Appointment not found!', 'error')
+        return redirect(url_for('list_appointments'))
+    
+    if request.method == 'POST':
+        appointment.caregiver_user_id = int(request.form['caregiver_user_id'])
+        appointment.member_user_id = int(request.form['member_user_id'])
+        appointment.appointment_date = datetime.strptime(request.form['appointment_date'], '%Y-%m-%d').date()
+        appointment.appointment_time = datetime.strptime(request.form['appointment_time'], '%H:%M').time()
+        appointment.work_hours = _form_decimal('work_hours')
+        appointment.status = request.form['status']
+        scheduling.check_booking(db, appointment)
+        scheduling.commit_booking(db, appointment)
+        flash('Appointment updated successfully!', 'success')
+        return redirect(url_for('list_appointments'))
+    
+    return render_template('appointments/edit.html', appointment=appointment)
 
 
 @app.route('/appointments/<int:appointment_id>/delete', methods=['POST'])
 def delete_appointment(appointment_id):
     """Delete an appointment"""
     db = get_db()
-    try:
-        appointment = db.query(Appointment).filter(Appointment.appointment_id == appointment_id).first()
-        if appointment:
-            db.delete(appointment)
-            db.commit()
-            flash('Appointment deleted successfully!', 'success')
-        else:
-            flash('Appointment not found!', 'error')
-    except Exception as e:
-        db.rollback()
-        flash(f'Error: {str(e)}', 'error')
-    finally:
-        close_db(db)
+    appointment = db.query(Appointment).filter(Appointment.appointment_id == appointment_id).first()
+    if appointment:
+        db.delete(appointment)
+        db.commit()
+        flash('Appointment deleted successfully!', 'success')
+    else:
+        flash('Appointment not found!', 'error')
     return redirect(url_for('list_appointments'))
 
 
+# maintenance commands (flask --app app <command>)
+
+@app.cli.command('create-indexes')
+@click.argument('names', nargs=-1)
+def create_indexes_command(names):
+    """Build the indexes declared in models.py that are missing (or only NAMES)"""
+    try:
+        indexes.create_indexes(names or None, log=click.echo)
+    except ValueError as error:
+        raise click.BadParameter(str(error), param_hint='NAMES')
+
+
+@app.cli.command('migrate')
+@click.option('--to', 'target', type=int, help="Stop after this migration version")
+def migrate_command(target):
+    """Apply the pending schema migrations"""
+    applied = migrate.migrate(target, log=click.echo)
+    click.echo(f"{len(applied)} migration(s) applied")
+
+
+@app.cli.command('migration-status')
+def migration_status_command():
+    """List the schema migrations and when each was applied"""
+    for version, description, applied_at in migrate.status():
+        click.echo(f"{version:>4}  {applied_at or 'pending':<32}  {description}")
+
+
+@app.cli.command('dump-schema')
+@click.argument('path', default='schema.sql', type=click.Path(dir_okay=False))
+def dump_schema_command(path):
+    """Write the schema declared in models.py as SQL (default: schema.sql)"""
+    with open(path, 'w', encoding='utf-8') as output:
+        output.write(migrate.schema_sql())
+    click.echo(f"Wrote {path}")
+
+
+@app.cli.command('refresh-views')
+@click.option('--every', type=int, help="Keep running and refresh every N seconds")
+def refresh_views_command(every):
+    """Refresh the materialized views without blocking readers"""
+    matviews.create_views()
+    while True:
+        matviews.refresh(log=click.echo)
+        if not every:
+            break
+        time.sleep(every)
+
+
+def _import_command(kind, path):
+    if not cache.shared():
+        click.echo(f"Warning: {cache.MEMORY_BACKEND_WARNING}", err=True)
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        result = bulk_import.import_csv(kind, stream)
+    for line_no, error in result.errors:
+        click.echo(f"line {line_no}: {error}")
+    click.echo(f"{result.imported} imported, {len(result.errors)} rejected")
+
+
+@app.cli.command('import-caregivers')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def import_caregivers_command(path):
+    """Bulk-load caregivers from a CSV file"""
+    _import_command('caregiver', path)
+
+
+@app.cli.command('import-members')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def import_members_command(path):
+    """Bulk-load members (with addresses) from a CSV file"""
+    _import_command('member', path)
+
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5001)
 
@@ -0,0 +1,194 @@
+"""
+Bulk CSV import of caregivers and members
+The file is parsed with the csv module and the rows are streamed with COPY
+into a temporary staging table, validated with set-based UPDATEs, and the
+valid rows are inserted into users / caregiver / member / address with
+INSERT ... SELECT. Invalid rows, malformed ones included, are reported by
+the file line they start on and skipped; they do not abort the batch.
+"""
+
+import csv
+import io
+import itertools
+
+from sqlalchemy import String
+
+from models import engine, User, Caregiver, Member, Address
+from listings import CAREGIVING_TYPES
+import cache
+
+
+USER_FIELDS = ['email', 'given_name', 'surname', 'city', 'phone_number', 'profile_description', 'password']
+CAREGIVER_FIELDS = ['photo', 'gender', 'caregiving_type', 'hourly_rate']
+MEMBER_FIELDS = ['house_rules', 'dependent_description']
+ADDRESS_FIELDS = ['house_number', 'street', 'town']
+
+COPY_BATCH_ROWS = 10000
+
+
+class CSVImportError(Exception):
+    pass
+
+
+class ImportResult:
+    def __init__(self, imported, errors):
+        self.imported = imported
+        self.errors = errors  # [(line number, message)]
+
+
+def import_columns(kind):
+    columns = [User.__table__.c[name] for name in USER_FIELDS]
+    if kind == 'caregiver':
+        columns += [Caregiver.__table__.c[name] for name in CAREGIVER_FIELDS]
+    else:
+        columns += [Member.__table__.c[name] for name in MEMBER_FIELDS]
+        columns += [Address.__table__.c[name] for name in ADDRESS_FIELDS]
+    return columns
+
+
+def _quote(value):
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _validation_checks(kind):
+    """SQL (condition, message) pairs derived from the model columns"""
+    checks = []
+    for column in import_columns(kind):
+        if not column.nullable:
+            checks.append((f"coalesce(btrim({column.name}), '') = ''", f"{column.name} is required"))
+        if isinstance(column.type, String) and column.type.length:
+            checks.append((f"length({column.name}) > {column.type.length}",
+                           f"{column.name} is longer than {column.type.length} characters"))
+    if kind == 'caregiver':
+        types = ', '.join(_quote(t) for t in CAREGIVING_TYPES)
+        checks.append((f"caregiving_type NOT IN ({types})", "caregiving_type must be one of " + ', '.join(CAREGIVING_TYPES)))
+        rate = Caregiver.__table__.c.hourly_rate.type
+        whole_digits = rate.precision - rate.scale
+        # CASE so the cast only sees well-formed amounts
+        checks.append((f"CASE WHEN hourly_rate ~ '^[0-9]{{1,{whole_digits}}}(\\.[0-9]{{1,{rate.scale}}})?$' "
+                       f"THEN hourly_rate::numeric <= 0 ELSE hourly_rate IS NOT NULL END",
+                       "hourly_rate must be a positive amount with at most two decimals"))
+    checks.append(("EXISTS (SELECT 1 FROM staging earlier WHERE earlier.email = staging.email AND earlier.line_no < staging.line_no)",
+                   "email appears earlier in the file"))
+    checks.append(("EXISTS (SELECT 1 FROM users WHERE users.email = staging.email)", "email is already registered"))
+    return checks
+
+
+def _read_header(reader, kind):
+    fields = [name.strip() for name in next(reader, [])]
+    allowed = [column.name for column in import_columns(kind)]
+    unknown = [name for name in fields if name not in allowed]
+    if unknown:
+        raise CSVImportError(f"Unknown column(s): {', '.join(unknown)}")
+    missing = [column.name for column in import_columns(kind) if not column.nullable and column.name not in fields]
+    if missing:
+        raise CSVImportError(f"Missing column(s): {', '.join(missing)}")
+    return fields
+
+
+def _parse_rows(reader, width):
+    """(line number, values, error) per record; a malformed record has no values"""
+    line_no = reader.line_num + 1
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as error:
+            yield line_no, [None] * width, f"malformed CSV: {error}"
+        else:
+            if not row:
+                pass  # blank line
+            elif len(row) != width:
+                yield line_no, [None] * width, f"expected {width} fields, found {len(row)}"
+            elif any('\0' in value for value in row):
+                # PostgreSQL text cannot hold it
+                yield line_no, [None] * width, "contains a NUL character"
+            else:
+                yield line_no, row, None
+        # A quoted field can span lines; the next record starts after them
+        line_no = reader.line_num + 1
+
+
+def _copy_rows(cursor, columns, rows):
+    # In batches, so a large file is never held in memory as a whole
+    while True:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for line_no, values, error in itertools.islice(rows, COPY_BATCH_ROWS):
+            writer.writerow([line_no, *values, error])
+        if not buffer.tell():
+            return
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY staging (line_no, {', '.join(columns)}, error) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def import_csv(kind, stream):
+    """Import caregivers or members (`kind`) from a CSV text stream with a header row"""
+    if kind not in ('caregiver', 'member'):
+        raise ValueError(kind)
+    reader = csv.reader(stream, strict=True)
+    fields = _read_header(reader, kind)
+    all_fields = [column.name for column in import_columns(kind)]
+    checks = _validation_checks(kind)
+    error_sql = "nullif(concat_ws('; ', " + ', '.join(
+        f"CASE WHEN {condition} THEN {_quote(message)} END" for condition, message in checks
+    ) + "), '')"
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TEMP TABLE staging ("
+            "line_no bigint NOT NULL, "
+            + ', '.join(f"{name} text" for name in all_fields)
+            + ", error text, user_id integer) ON COMMIT DROP"
+        )
+        cursor = conn.connection.dbapi_connection.cursor()
+        _copy_rows(cursor, fields, _parse_rows(reader, len(fields)))
+        conn.exec_driver_sql("CREATE INDEX ON staging (email, line_no)")
+        conn.exec_driver_sql("ANALYZE staging")
+        conn.exec_driver_sql(f"UPDATE staging SET error = {error_sql} WHERE error IS NULL")
+
+        user_columns = ', '.join(USER_FIELDS)
+        conn.exec_driver_sql(
+            f"WITH inserted AS ("
+            f"  INSERT INTO users ({user_columns})"
+            f"  SELECT {user_columns} FROM staging WHERE error IS NULL ORDER BY line_no"
+            f"  ON CONFLICT (email) DO NOTHING"
+            f"  RETURNING user_id, email"
+            f") UPDATE staging SET user_id = inserted.user_id FROM inserted"
+            f"  WHERE staging.email = inserted.email AND staging.error IS NULL"
+        )
+        # Lost a race with a concurrent insert of the same email
+        conn.exec_driver_sql(
+            "UPDATE staging SET error = 'email is already registered' WHERE error IS NULL AND user_id IS NULL"
+        )
+
+        if kind == 'caregiver':
+            conn.exec_driver_sql(
+                "INSERT INTO caregiver (caregiver_user_id, photo, gender, caregiving_type, hourly_rate) "
+                "SELECT user_id, photo, gender, caregiving_type, hourly_rate::numeric "
+                "FROM staging WHERE user_id IS NOT NULL"
+            )
+        else:
+            conn.exec_driver_sql(
+                "INSERT INTO member (member_user_id, house_rules, dependent_description) "
+                "SELECT user_id, house_rules, dependent_description FROM staging WHERE user_id IS NOT NULL"
+            )
+            conn.exec_driver_sql(
+                "INSERT INTO address (member_user_id, house_number, street, town) "
+                "SELECT user_id, house_number, street, town FROM staging WHERE user_id IS NOT NULL"
+            )
+
+        imported = conn.exec_driver_sql("SELECT count(*) FROM staging WHERE user_id IS NOT NULL").scalar()
+        errors = conn.exec_driver_sql(
+            "SELECT line_no, error FROM staging WHERE error IS NOT NULL ORDER BY line_no"
+        ).fetchall()
+    # Written on a plain connection, so the session hooks do not see it
+    cache.bump(['users', 'caregiver'] if kind == 'caregiver' else ['users', 'member', 'address'])
+    return ImportResult(imported, [(line_no, error) for line_no, error in errors])
+
+
+def import_upload(kind, file_storage):
+    """import_csv() for a file uploaded through a form"""
+    stream = io.TextIOWrapper(file_storage.stream, encoding='utf-8-sig', newline='')
+    return import_csv(kind, stream)
@@ -0,0 +1,264 @@
+"""
+Versioned response cache for the list pages
+A cached page is keyed on its route, its normalized query arguments and the
+current version of every table it reads. Committing a session that wrote a
+table bumps that table's version (and the versions of the tables that follow
+it through ON DELETE CASCADE or the earnings triggers), so the next request
+builds a new key: invalidation is exact and a stale page is never served.
+
+The page key doubles as the page's ETag: a request whose If-None-Match
+still matches gets 304 Not Modified without running the view's queries.
+
+Writes are tracked on every session from models.SessionLocal, in whatever
+process makes them (the web app, the CLI commands, database_operations.py);
+writes on a plain connection call bump() themselves.
+
+Backends: memory:// is an in-process LRU bounded by the size of the cached
+bodies. Its versions live in one process, so it is only correct while a
+single web worker makes every write: pages stay stale after writes from
+another worker, a CLI import or a script until the server restarts. Anywhere
+else, share versions and pages with redis://... (needs the redis package).
+RESPONSE_CACHE_URL=off disables the cache.
+"""
+
+import functools
+import hashlib
+import os
+import pickle
+import threading
+import uuid
+from collections import OrderedDict
+
+from flask import Response, make_response, request, session
+from sqlalchemy import event
+from sqlalchemy.orm import object_mapper
+
+
+RESPONSE_CACHE_URL = os.getenv('RESPONSE_CACHE_URL', 'memory://')
+RESPONSE_CACHE_BYTES = int(os.getenv('RESPONSE_CACHE_BYTES', str(32 * 1024 * 1024)))
+# Shared backends only; the memory backend evicts by size
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', '3600'))
+
+# Tables whose rows are maintained by triggers on another table
+DERIVED_TABLES = {
+    'appointment': ['caregiver_earnings'],
+    'caregiver': ['caregiver_earnings'],
+}
+
+
+class MemoryBackend:
+    """Process-local LRU; evicts least recently used pages once the bodies exceed max_bytes"""
+
+    def __init__(self, max_bytes=RESPONSE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.pages = OrderedDict()  # key -> (size, value)
+        self.size = 0
+        self.table_versions = {}
+        # Versions restart at 0 with the process; the epoch keeps old keys and ETags from matching
+        self.epoch = uuid.uuid4().hex
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.pages.get(key)
+            if entry is None:
+                return None
+            self.pages.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.pages:
+                self.size -= self.pages.pop(key)[0]
+            self.pages[key] = (size, value)
+            self.size += size
+            while self.size > self.max_bytes:
+                self.size -= self.pages.popitem(last=False)[1][0]
+
+    def versions(self, tables):
+        with self.lock:
+            return [self.table_versions.get(table, 0) for table in tables]
+
+    def bump(self, tables):
+        with self.lock:
+            for table in tables:
+                self.table_versions[table] = self.table_versions.get(table, 0) + 1
+
+
+class RedisBackend:
+    """Pages and versions shared by all workers; Redis does the eviction (set maxmemory-policy)"""
+
+    def __init__(self, url, ttl=RESPONSE_CACHE_TTL):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        # Shared by the workers; a new one is only made if Redis lost its data
+        self.client.set('cache_epoch', uuid.uuid4().hex, nx=True)
+        self.epoch = self.client.get('cache_epoch').decode()
+
+    def get(self, key):
+        value = self.client.get('page:' + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, size):
+        self.client.set('page:' + key, pickle.dumps(value), ex=self.ttl)
+
+    def versions(self, tables):
+        return [int(version or 0) for version in self.client.mget(['table_version:' + table for table in tables])]
+
+    def bump(self, tables):
+        pipeline = self.client.pipeline()
+        for table in tables:
+            pipeline.incr('table_version:' + table)
+        pipeline.execute()
+
+
+def backend_from_url(url):
+    if url in ('', 'off', 'none'):
+        return None
+    if url.startswith('memory://'):
+        return MemoryBackend()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(url)
+    raise ValueError(f"unsupported RESPONSE_CACHE_URL: {url}")
+
+
+backend = backend_from_url(RESPONSE_CACHE_URL)
+
+
+@functools.cache
+def _dependents():
+    # table -> tables whose rows change when its rows change; models imports
+    # this module, so the metadata is read on first use
+    from models import Base
+    dependents = {table.name: set(DERIVED_TABLES.get(table.name, [])) for table in Base.metadata.sorted_tables}
+    for table in Base.metadata.sorted_tables:
+        for key in table.foreign_keys:
+            if key.ondelete in ('CASCADE', 'SET NULL'):
+                dependents[key.column.table.name].add(table.name)
+    return dependents
+
+
+def affected_tables(tables):
+    """`tables` plus every table their writes reach through cascades and triggers"""
+    affected = set()
+    pending = list(tables)
+    while pending:
+        table = pending.pop()
+        if table not in affected:
+            affected.add(table)
+            pending.extend(_dependents().get(table, ()))
+    return affected
+
+
+MEMORY_BACKEND_WARNING = (
+    "RESPONSE_CACHE_URL is memory://: a running web server keeps serving its cached pages "
+    "of the tables written here until it restarts (set RESPONSE_CACHE_URL=redis://... to share the cache)"
+)
+
+
+def shared():
+    """False if writes made in this process cannot invalidate another process's pages"""
+    return not isinstance(backend, MemoryBackend)
+
+
+def bump(tables):
+    """Invalidate every cached page that reads any of `tables` (after a write outside a session)"""
+    if backend is not None:
+        backend.bump(sorted(affected_tables(tables)))
+
+
+def _written_tables(session):
+    return session.info.setdefault('cache_written_tables', set())
+
+
+def _after_flush(session, flush_context):
+    written = _written_tables(session)
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        written.update(table.name for table in object_mapper(instance).tables)
+
+
+def _do_orm_execute(state):
+    # Set-based update(Model) / delete(Model) statements bypass the flush
+    if (state.is_update or state.is_delete or state.is_insert) and state.bind_mapper is not None:
+        _written_tables(state.session).update(table.name for table in state.bind_mapper.tables)
+
+
+def _after_commit(session):
+    written = session.info.pop('cache_written_tables', None)
+    if written:
+        bump(written)
+
+
+def _after_rollback(session):
+    session.info.pop('cache_written_tables', None)
+
+
+def track_writes(session_factory):
+    """Bump table versions when sessions from `session_factory` commit writes"""
+    event.listen(session_factory, 'after_flush', _after_flush)
+    event.listen(session_factory, 'do_orm_execute', _do_orm_execute)
+    event.listen(session_factory, 'after_commit', _after_commit)
+    event.listen(session_factory, 'after_rollback', _after_rollback)
+
+
+def _normalized_args():
+    # Blank arguments are the same page as missing ones; order does not matter
+    return sorted((name, value.strip()) for name, values in request.args.lists() for value in values if value.strip())
+
+
+def _page_key(tables):
+    versions = backend.versions(tables)
+    parts = [
+        request.endpoint, sorted(request.view_args.items()), _normalized_args(),
+        backend.epoch, list(zip(tables, versions))
+    ]
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+def _validated(response, key):
+    # Weak: the same key always renders the same page, but not necessarily byte for byte
+    response.set_etag(key, weak=True)
+    # Clients may keep the page but must revalidate it on every use
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def cached(*tables, store=True):
+    """Cache a GET view's response until one of `tables` is written, and answer
+    conditional GETs for it with 304 Not Modified
+
+    With store=False only the ETag is used; the body is not kept (e.g. pages
+    showing a password).
+    """
+    tables = sorted(tables)
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            # Pending flashes are shown (and consumed) by the page, so it is rendered fresh
+            if backend is None or request.method != 'GET' or session.get('_flashes'):
+                return view(*args, **kwargs)
+            # Versions are read before rendering: a write committed meanwhile
+            # moves later requests to a new key instead of hitting this page
+            key = _page_key(tables)
+            if request.if_none_match.contains_weak(key):
+                return _validated(Response(status=304), key)
+            hit = backend.get(key) if store else None
+            if hit is not None:
+                body, mimetype = hit
+                response = Response(body, mimetype=mimetype)
+                response.headers['X-Cache'] = 'HIT'
+                return _validated(response, key)
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                if store:
+                    body = response.get_data()
+                    backend.set(key, (body, response.mimetype), len(body))
+                    response.headers['X-Cache'] = 'MISS'
+                _validated(response, key)
+            return response
+        return wrapper
+    return decorator
@@ -1,165 +1,27 @@
-from sqlalchemy import create_engine, Column, Integer, String, Date, Time, DECIMAL, Text, ForeignKey, CheckConstraint, func
-from sqlalchemy.orm import sessionmaker, declarative_base, relationship
+from sqlalchemy import insert, update, delete, select, case
 from datetime import date, time, datetime
 from decimal import Decimal
-import os
-import getpass
-from pathlib import Path
+import argparse
 
-Base = declarative_base()
+from models import (
+    Base, SessionLocal, engine, MATERIALIZED_VIEWS,
+    User, Caregiver, Member, Address, Job, JobApplication, Appointment
+)
+import cache
+import matviews
+import reports
+import slowlog
 
-class User(Base):
-    __tablename__ = 'users'
-    
-    user_id = Column(Integer, primary_key=True, autoincrement=True)
-    email = Column(String(255), unique=True, nullable=False)
-    given_name = Column(String(100), nullable=False)
-    surname = Column(String(100), nullable=False)
-    city = Column(String(100), nullable=False)
-    phone_number = Column(String(20), nullable=False)
-    profile_description = Column(Text)
-    password = Column(String(255), nullable=False)
-    
-
-    caregiver = relationship(
-        "Caregiver", 
-        back_populates="user", 
-        uselist=False, 
-        cascade="all, delete-orphan")
-
-    member = relationship(
-        "Member", 
-        back_populates="user", 
-        uselist=False, 
-        cascade="all, delete-orphan")
-
-
-class Caregiver(Base):
-    __tablename__ = 'caregiver'
-    
-    caregiver_user_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), primary_key=True)
-    photo = Column(String(255))
-    gender = Column(String(20), nullable=False)
-    caregiving_type = Column(String(50), nullable=False)
-    hourly_rate = Column(DECIMAL(10, 2), nullable=False)
-    
-
-    __table_args__ = (
-        CheckConstraint("caregiving_type IN ('babysitter', 'elderly care', 'playmate for children')", name='check_caregiving_type'),
-    )
-    
-
-    user = relationship("User", back_populates="caregiver")
-    job_applications = relationship("JobApplication", back_populates="caregiver", cascade="all, delete-orphan")
-    appointments = relationship("Appointment", back_populates="caregiver", cascade="all, delete-orphan")
-
-
-class Member(Base):
-    __tablename__ = 'member'
-    
-    member_user_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), primary_key=True)
-    house_rules = Column(Text)
-    dependent_description = Column(Text)
-    
-
-    user = relationship("User", back_populates="member")
-    address = relationship("Address", back_populates="member", uselist=False, cascade="all, delete-orphan")
-    jobs = relationship("Job", back_populates="member", cascade="all, delete-orphan")
-    appointments = relationship("Appointment", back_populates="member", cascade="all, delete-orphan")
-
-
-class Address(Base):
-    __tablename__ = 'address'
-    
-    member_user_id = Column(Integer, ForeignKey('member.member_user_id', ondelete='CASCADE'), primary_key=True)
-    house_number = Column(String(20), nullable=False)
-    street = Column(String(255), nullable=False)
-    town = Column(String(100), nullable=False)
-    
-
-    member = relationship("Member", back_populates="address")
-
-
-class Job(Base):
-    __tablename__ = 'job'
-    
-    job_id = Column(Integer, primary_key=True, autoincrement=True)
-    member_user_id = Column(Integer, ForeignKey('member.member_user_id', ondelete='CASCADE'), nullable=False)
-    required_caregiving_type = Column(String(50), nullable=False)
-    other_requirements = Column(Text)
-    date_posted = Column(Date, nullable=False)
-    
-
-    __table_args__ = (
-        CheckConstraint(
-            "required_caregiving_type IN ('babysitter', 'elderly care', 'playmate for children')", 
-            name='check_required_caregiving_type'),
-    )
-    
-
-    member = relationship("Member", back_populates="jobs")
-    job_applications = relationship("JobApplication", back_populates="job", cascade="all, delete-orphan")
-
-
-class JobApplication(Base):
-    __tablename__ = 'job_application'
-    
-    caregiver_user_id = Column(Integer, ForeignKey('caregiver.caregiver_user_id', ondelete='CASCADE'), primary_key=True)
-    job_id = Column(Integer, ForeignKey('job.job_id', ondelete='CASCADE'), primary_key=True)
-    date_applied = Column(Date, nullable=False)
-    
-
-    caregiver = relationship("Caregiver", back_populates="job_applications")
-    job = relationship("Job", back_populates="job_applications")
-
-
-class Appointment(Base):
-    __tablename__ = 'appointment'
-    
-    appointment_id = Column(Integer, primary_key=True, autoincrement=True)
-    caregiver_user_id = Column(Integer, ForeignKey('caregiver.caregiver_user_id', ondelete='CASCADE'), nullable=False)
-    member_user_id = Column(Integer, ForeignKey('member.member_user_id', ondelete='CASCADE'), nullable=False)
-    appointment_date = Column(Date, nullable=False)
-    appointment_time = Column(Time, nullable=False)
-    work_hours = Column(DECIMAL(5, 2), nullable=False)
-    status = Column(String(20), nullable=False)
-    
-
-    __table_args__ = (
-        CheckConstraint("status IN ('pending', 'accepted', 'declined')", name='check_status'),
-    )
-    
 
-    caregiver = relationship("Caregiver", back_populates="appointments")
-    member = relationship("Member", back_populates="appointments")
-
-
-
-import getpass
-DB_USER = os.getenv('DB_USER', getpass.getuser())
-DB_PASSWORD = os.getenv('DB_PASSWORD', '')
-DB_HOST = os.getenv('DB_HOST', 'localhost')
-DB_PORT = os.getenv('DB_PORT', '5432')
-DB_NAME = os.getenv('DB_NAME', 'caregivers_db')
-
-
-if DB_PASSWORD:
-    DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-else:
-    DATABASE_URL = f"postgresql://{DB_USER}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-
-
-engine = create_engine(DATABASE_URL, echo=False)
-Session = sessionmaker(bind=engine)
-session = Session()
+session = SessionLocal()
 
 
 def create_tables():
+    slowlog.set_step("create_tables")
     print("PART 2.1: Creating Tables")
     
     from sqlalchemy import text as sql_text
     with engine.connect() as conn:
-        conn.execute(sql_text("DROP VIEW IF EXISTS job_applications_view CASCADE"))
         conn.execute(sql_text("DROP TABLE IF EXISTS appointment CASCADE"))
         conn.execute(sql_text("DROP TABLE IF EXISTS job_application CASCADE"))
         conn.execute(sql_text("DROP TABLE IF EXISTS caregiver CASCADE"))
@@ -175,220 +37,271 @@ def create_tables():
     print("All tables created successfully!\n")
 
 
-def insert_data():
-    print("PART 2.2: Inserting Data")
-    
-    users_data = [
-        User(email='arman.armanov@email.com', given_name='Arman', surname='Armanov', city='Astana', phone_number='+77771234567', profile_description='Experienced caregiver', password='password123'),
-        User(email='amina.aminova@email.com', given_name='Amina', surname='Aminova', city='Almaty', phone_number='+77772345678', profile_description='Family member seeking care', password='password123'),
-        User(email='david.davidov@email.com', given_name='David', surname='Davidov', city='Astana', phone_number='+77773456789', profile_description='Professional babysitter', password='password123'),
-        User(email='elena.elenova@email.com', given_name='Elena', surname='Elenova', city='Astana', phone_number='+77774567890', profile_description='Looking for elderly care', password='password123'),
-        User(email='farid.faridov@email.com', given_name='Farid', surname='Faridov', city='Almaty', phone_number='+77775678901', profile_description='Elderly care specialist', password='password123'),
-        User(email='gulnara.gulnarova@email.com', given_name='Gulnara', surname='Gulnarova', city='Astana', phone_number='+77776789012', profile_description='Mother of two children', password='password123'),
-        User(email='hasan.hasanov@email.com', given_name='Hasan', surname='Hasanov', city='Shymkent', phone_number='+77777890123', profile_description='Playmate for children', password='password123'),
-        User(email='irina.irinova@email.com', given_name='Irina', surname='Irinova', city='Astana', phone_number='+77778901234', profile_description='Babysitter with 5 years experience', password='password123'),
-        User(email='john.johnson@email.com', given_name='John', surname='Johnson', city='Almaty', phone_number='+77779012345', profile_description='Father seeking babysitter', password='password123'),
-        User(email='kate.kateova@email.com', given_name='Kate', surname='Kateova', city='Astana', phone_number='+77770123456', profile_description='Elderly care professional', password='password123'),
-        User(email='lisa.lisova@email.com', given_name='Lisa', surname='Lisova', city='Astana', phone_number='+77771234560', profile_description='Mother of 5-year-old son', password='password123'),
-        User(email='michael.michaelov@email.com', given_name='Michael', surname='Michaelov', city='Almaty', phone_number='+77772345601', profile_description='Babysitter', password='password123'),
-        User(email='nina.ninova@email.com', given_name='Nina', surname='Ninova', city='Shymkent', phone_number='+77773456712', profile_description='Family member', password='password123'),
-        User(email='omar.omarov@email.com', given_name='Omar', surname='Omarov', city='Astana', phone_number='+77774567823', profile_description='Playmate specialist', password='password123'),
-        User(email='paul.paulov@email.com', given_name='Paul', surname='Paulov', city='Astana', phone_number='+77775678934', profile_description='Seeking elderly care', password='password123'),
-        User(email='qasim.qasimov@email.com', given_name='Qasim', surname='Qasimov', city='Almaty', phone_number='+77776789045', profile_description='Elderly care expert', password='password123'),
-        User(email='rosa.rosova@email.com', given_name='Rosa', surname='Rosova', city='Astana', phone_number='+77777890156', profile_description='Babysitter', password='password123'),
-        User(email='sam.samov@email.com', given_name='Sam', surname='Samov', city='Shymkent', phone_number='+77778901267', profile_description='Father of three', password='password123'),
-        User(email='tina.tinova@email.com', given_name='Tina', surname='Tinova', city='Astana', phone_number='+77779012378', profile_description='Elderly care professional', password='password123'),
-        User(email='umar.umarov@email.com', given_name='Umar', surname='Umarov', city='Almaty', phone_number='+77770123489', profile_description='Playmate for children', password='password123'),
+SEED_BATCH_COPIES = 500
+
+
+def _users_fixture():
+    return [
+        dict(email='arman.armanov@email.com', given_name='Arman', surname='Armanov', city='Astana', phone_number='+77771234567', profile_description='Experienced caregiver', password='password123'),
+        dict(email='amina.aminova@email.com', given_name='Amina', surname='Aminova', city='Almaty', phone_number='+77772345678', profile_description='Family member seeking care', password='password123'),
+        dict(email='david.davidov@email.com', given_name='David', surname='Davidov', city='Astana', phone_number='+77773456789', profile_description='Professional babysitter', password='password123'),
+        dict(email='elena.elenova@email.com', given_name='Elena', surname='Elenova', city='Astana', phone_number='+77774567890', profile_description='Looking for elderly care', password='password123'),
+        dict(email='farid.faridov@email.com', given_name='Farid', surname='Faridov', city='Almaty', phone_number='+77775678901', profile_description='Elderly care specialist', password='password123'),
+        dict(email='gulnara.gulnarova@email.com', given_name='Gulnara', surname='Gulnarova', city='Astana', phone_number='+77776789012', profile_description='Mother of two children', password='password123'),
+        dict(email='hasan.hasanov@email.com', given_name='Hasan', surname='Hasanov', city='Shymkent', phone_number='+77777890123', profile_description='Playmate for children', password='password123'),
+        dict(email='irina.irinova@email.com', given_name='Irina', surname='Irinova', city='Astana', phone_number='+77778901234', profile_description='Babysitter with 5 years experience', password='password123'),
+        dict(email='john.johnson@email.com', given_name='John', surname='Johnson', city='Almaty', phone_number='+77779012345', profile_description='Father seeking babysitter', password='password123'),
+        dict(email='kate.kateova@email.com', given_name='Kate', surname='Kateova', city='Astana', phone_number='+77770123456', profile_description='Elderly care professional', password='password123'),
+        dict(email='lisa.lisova@email.com', given_name='Lisa', surname='Lisova', city='Astana', phone_number='+77771234560', profile_description='Mother of 5-year-old son', password='password123'),
+        dict(email='michael.michaelov@email.com', given_name='Michael', surname='Michaelov', city='Almaty', phone_number='+77772345601', profile_description='Babysitter', password='password123'),
+        dict(email='nina.ninova@email.com', given_name='Nina', surname='Ninova', city='Shymkent', phone_number='+77773456712', profile_description='Family member', password='password123'),
+        dict(email='omar.omarov@email.com', given_name='Omar', surname='Omarov', city='Astana', phone_number='+77774567823', profile_description='Playmate specialist', password='password123'),
+        dict(email='paul.paulov@email.com', given_name='Paul', surname='Paulov', city='Astana', phone_number='+77775678934', profile_description='Seeking elderly care', password='password123'),
+        dict(email='qasim.qasimov@email.com', given_name='Qasim', surname='Qasimov', city='Almaty', phone_number='+77776789045', profile_description='Elderly care expert', password='password123'),
+        dict(email='rosa.rosova@email.com', given_name='Rosa', surname='Rosova', city='Astana', phone_number='+77777890156', profile_description='Babysitter', password='password123'),
+        dict(email='sam.samov@email.com', given_name='Sam', surname='Samov', city='Shymkent', phone_number='+77778901267', profile_description='Father of three', password='password123'),
+        dict(email='tina.tinova@email.com', given_name='Tina', surname='Tinova', city='Astana', phone_number='+77779012378', profile_description='Elderly care professional', password='password123'),
+        dict(email='umar.umarov@email.com', given_name='Umar', surname='Umarov', city='Almaty', phone_number='+77770123489', profile_description='Playmate for children', password='password123'),
     ]
-    
-    session.add_all(users_data)
-    session.commit()
-    
-    users_dict = {f"{u.given_name}_{u.surname}": u.user_id for u in users_data}
-    
-    caregivers_data = [
-        Caregiver(caregiver_user_id=users_dict['Arman_Armanov'], photo='photo1.jpg', gender='Male', caregiving_type='babysitter', hourly_rate=8.50),
-        Caregiver(caregiver_user_id=users_dict['David_Davidov'], photo='photo3.jpg', gender='Male', caregiving_type='babysitter', hourly_rate=9.00),
-        Caregiver(caregiver_user_id=users_dict['Farid_Faridov'], photo='photo5.jpg', gender='Male', caregiving_type='elderly care', hourly_rate=12.00),
-        Caregiver(caregiver_user_id=users_dict['Hasan_Hasanov'], photo='photo7.jpg', gender='Male', caregiving_type='playmate for children', hourly_rate=7.50),
-        Caregiver(caregiver_user_id=users_dict['Irina_Irinova'], photo='photo8.jpg', gender='Female', caregiving_type='babysitter', hourly_rate=10.00),
-        Caregiver(caregiver_user_id=users_dict['Kate_Kateova'], photo='photo10.jpg', gender='Female', caregiving_type='elderly care', hourly_rate=11.50),
-        Caregiver(caregiver_user_id=users_dict['Michael_Michaelov'], photo='photo12.jpg', gender='Male', caregiving_type='babysitter', hourly_rate=9.50),
-        Caregiver(caregiver_user_id=users_dict['Omar_Omarov'], photo='photo14.jpg', gender='Male', caregiving_type='playmate for children', hourly_rate=8.00),
-        Caregiver(caregiver_user_id=users_dict['Rosa_Rosova'], photo='photo17.jpg', gender='Female', caregiving_type='babysitter', hourly_rate=10.50),
-        Caregiver(caregiver_user_id=users_dict['Tina_Tinova'], photo='photo19.jpg', gender='Female', caregiving_type='elderly care', hourly_rate=13.00),
-        Caregiver(caregiver_user_id=users_dict['Umar_Umarov'], photo='photo20.jpg', gender='Male', caregiving_type='playmate for children', hourly_rate=7.00),
+
+
+def _caregivers_fixture(users_dict):
+    return [
+        dict(caregiver_user_id=users_dict['Arman_Armanov'], photo='photo1.jpg', gender='Male', caregiving_type='babysitter', hourly_rate=8.50),
+        dict(caregiver_user_id=users_dict['David_Davidov'], photo='photo3.jpg', gender='Male', caregiving_type='babysitter', hourly_rate=9.00),
+        dict(caregiver_user_id=users_dict['Farid_Faridov'], photo='photo5.jpg', gender='Male', caregiving_type='elderly care', hourly_rate=12.00),
+        dict(caregiver_user_id=users_dict['Hasan_Hasanov'], photo='photo7.jpg', gender='Male', caregiving_type='playmate for children', hourly_rate=7.50),
+        dict(caregiver_user_id=users_dict['Irina_Irinova'], photo='photo8.jpg', gender='Female', caregiving_type='babysitter', hourly_rate=10.00),
+        dict(caregiver_user_id=users_dict['Kate_Kateova'], photo='photo10.jpg', gender='Female', caregiving_type='elderly care', hourly_rate=11.50),
+        dict(caregiver_user_id=users_dict['Michael_Michaelov'], photo='photo12.jpg', gender='Male', caregiving_type='babysitter', hourly_rate=9.50),
+        dict(caregiver_user_id=users_dict['Omar_Omarov'], photo='photo14.jpg', gender='Male', caregiving_type='playmate for children', hourly_rate=8.00),
+        dict(caregiver_user_id=users_dict['Rosa_Rosova'], photo='photo17.jpg', gender='Female', caregiving_type='babysitter', hourly_rate=10.50),
+        dict(caregiver_user_id=users_dict['Tina_Tinova'], photo='photo19.jpg', gender='Female', caregiving_type='elderly care', hourly_rate=13.00),
+        dict(caregiver_user_id=users_dict['Umar_Umarov'], photo='photo20.jpg', gender='Male', caregiving_type='playmate for children', hourly_rate=7.00),
     ]
-    
-    session.add_all(caregivers_data)
-    session.commit()
-    
-    members_data = [
-        Member(member_user_id=users_dict['Amina_Aminova'], house_rules='No pets. Please maintain hygiene.', dependent_description='Looking for babysitter for 3-year-old daughter'),
-        Member(member_user_id=users_dict['Elena_Elenova'], house_rules='No pets. Quiet environment required.', dependent_description='Elderly mother needs daily care, age 75'),
-        Member(member_user_id=users_dict['Gulnara_Gulnarova'], house_rules='No pets. Clean environment.', dependent_description='I have a 5-year-old son who likes painting'),
-        Member(member_user_id=users_dict['John_Johnson'], house_rules='Pets allowed. Respectful behavior.', dependent_description='Two children aged 4 and 6 need babysitting'),
-        Member(member_user_id=users_dict['Lisa_Lisova'], house_rules='No pets. Strict hygiene rules.', dependent_description='5-year-old son who likes painting and drawing'),
-        Member(member_user_id=users_dict['Nina_Ninova'], house_rules='No pets. Professional care required.', dependent_description='Elderly father, age 80, needs assistance'),
-        Member(member_user_id=users_dict['Paul_Paulov'], house_rules='No pets. Regular schedule.', dependent_description='Elderly grandmother, age 70, needs care'),
-        Member(member_user_id=users_dict['Qasim_Qasimov'], house_rules='No pets. Soft-spoken caregiver preferred.', dependent_description='Elderly parent needs gentle care'),
-        Member(member_user_id=users_dict['Sam_Samov'], house_rules='Pets allowed. Flexible schedule.', dependent_description='Three children need playmate and supervision'),
+
+
+def _members_fixture(users_dict):
+    return [
+        dict(member_user_id=users_dict['Amina_Aminova'], house_rules='No pets. Please maintain hygiene.', dependent_description='Looking for babysitter for 3-year-old daughter'),
+        dict(member_user_id=users_dict['Elena_Elenova'], house_rules='No pets. Quiet environment required.', dependent_description='Elderly mother needs daily care, age 75'),
+        dict(member_user_id=users_dict['Gulnara_Gulnarova'], house_rules='No pets. Clean environment.', dependent_description='I have a 5-year-old son who likes painting'),
+        dict(member_user_id=users_dict['John_Johnson'], house_rules='Pets allowed. Respectful behavior.', dependent_description='Two children aged 4 and 6 need babysitting'),
+        dict(member_user_id=users_dict['Lisa_Lisova'], house_rules='No pets. Strict hygiene rules.', dependent_description='5-year-old son who likes painting and drawing'),
+        dict(member_user_id=users_dict['Nina_Ninova'], house_rules='No pets. Professional care required.', dependent_description='Elderly father, age 80, needs assistance'),
+        dict(member_user_id=users_dict['Paul_Paulov'], house_rules='No pets. Regular schedule.', dependent_description='Elderly grandmother, age 70, needs care'),
+        dict(member_user_id=users_dict['Qasim_Qasimov'], house_rules='No pets. Soft-spoken caregiver preferred.', dependent_description='Elderly parent needs gentle care'),
+        dict(member_user_id=users_dict['Sam_Samov'], house_rules='Pets allowed. Flexible schedule.', dependent_description='Three children need playmate and supervision'),
     ]
-    
-    session.add_all(members_data)
-    session.commit()
-    
-    addresses_data = [
-        Address(member_user_id=users_dict['Amina_Aminova'], house_number='15', street='Kabanbay Batyr', town='Astana'),
-        Address(member_user_id=users_dict['Elena_Elenova'], house_number='22', street='Abay Avenue', town='Astana'),
-        Address(member_user_id=users_dict['Gulnara_Gulnarova'], house_number='33', street='Kabanbay Batyr', town='Astana'),
-        Address(member_user_id=users_dict['John_Johnson'], house_number='44', street='Al-Farabi Avenue', town='Almaty'),
-        Address(member_user_id=users_dict['Lisa_Lisova'], house_number='55', street='Kabanbay Batyr', town='Astana'),
-        Address(member_user_id=users_dict['Nina_Ninova'], house_number='66', street='Tauelsizdik Avenue', town='Shymkent'),
-        Address(member_user_id=users_dict['Paul_Paulov'], house_number='77', street='Kabanbay Batyr', town='Astana'),
-        Address(member_user_id=users_dict['Qasim_Qasimov'], house_number='88', street='Abay Avenue', town='Astana'),
-        Address(member_user_id=users_dict['Sam_Samov'], house_number='99', street='Al-Farabi Avenue', town='Almaty'),
+
+
+def _addresses_fixture(users_dict):
+    return [
+        dict(member_user_id=users_dict['Amina_Aminova'], house_number='15', street='Kabanbay Batyr', town='Astana'),
+        dict(member_user_id=users_dict['Elena_Elenova'], house_number='22', street='Abay Avenue', town='Astana'),
+        dict(member_user_id=users_dict['Gulnara_Gulnarova'], house_number='33', street='Kabanbay Batyr', town='Astana'),
+        dict(member_user_id=users_dict['John_Johnson'], house_number='44', street='Al-Farabi Avenue', town='Almaty'),
+        dict(member_user_id=users_dict['Lisa_Lisova'], house_number='55', street='Kabanbay Batyr', town='Astana'),
+        dict(member_user_id=users_dict['Nina_Ninova'], house_number='66', street='Tauelsizdik Avenue', town='Shymkent'),
+        dict(member_user_id=users_dict['Paul_Paulov'], house_number='77', street='Kabanbay Batyr', town='Astana'),
+        dict(member_user_id=users_dict['Qasim_Qasimov'], house_number='88', street='Abay Avenue', town='Astana'),
+        dict(member_user_id=users_dict['Sam_Samov'], house_number='99', street='Al-Farabi Avenue', town='Almaty'),
     ]
-    
-    session.add_all(addresses_data)
-    session.commit()
-    
-    jobs_data = [
-        Job(member_user_id=users_dict['Amina_Aminova'], required_caregiving_type='babysitter', other_requirements='Must be soft-spoken and patient', date_posted=date(2025, 1, 15)),
-        Job(member_user_id=users_dict['Elena_Elenova'], required_caregiving_type='elderly care', other_requirements='Experience with dementia patients preferred', date_posted=date(2025, 1, 16)),
-        Job(member_user_id=users_dict['Gulnara_Gulnarova'], required_caregiving_type='babysitter', other_requirements='Art background preferred, soft-spoken', date_posted=date(2025, 1, 17)),
-        Job(member_user_id=users_dict['John_Johnson'], required_caregiving_type='babysitter', other_requirements='Energetic and fun-loving', date_posted=date(2025, 1, 18)),
-        Job(member_user_id=users_dict['Lisa_Lisova'], required_caregiving_type='playmate for children', other_requirements='Creative activities required', date_posted=date(2025, 1, 19)),
-        Job(member_user_id=users_dict['Nina_Ninova'], required_caregiving_type='elderly care', other_requirements='Medical training preferred', date_posted=date(2025, 1, 20)),
-        Job(member_user_id=users_dict['Paul_Paulov'], required_caregiving_type='elderly care', other_requirements='Gentle and caring personality', date_posted=date(2025, 1, 21)),
-        Job(member_user_id=users_dict['Qasim_Qasimov'], required_caregiving_type='elderly care', other_requirements='Soft-spoken caregiver needed', date_posted=date(2025, 1, 22)),
-        Job(member_user_id=users_dict['Sam_Samov'], required_caregiving_type='playmate for children', other_requirements='Active and engaging', date_posted=date(2025, 1, 23)),
-        Job(member_user_id=users_dict['Amina_Aminova'], required_caregiving_type='babysitter', other_requirements='Weekend availability required', date_posted=date(2025, 1, 24)),
-        Job(member_user_id=users_dict['Elena_Elenova'], required_caregiving_type='elderly care', other_requirements='Morning shifts preferred', date_posted=date(2025, 1, 25)),
-        Job(member_user_id=users_dict['Gulnara_Gulnarova'], required_caregiving_type='babysitter', other_requirements='Afternoon availability', date_posted=date(2025, 1, 26)),
-        Job(member_user_id=users_dict['John_Johnson'], required_caregiving_type='playmate for children', other_requirements='Outdoor activities preferred', date_posted=date(2025, 1, 27)),
-        Job(member_user_id=users_dict['Lisa_Lisova'], required_caregiving_type='babysitter', other_requirements='Educational activities', date_posted=date(2025, 1, 28)),
-        Job(member_user_id=users_dict['Nina_Ninova'], required_caregiving_type='elderly care', other_requirements='Evening care needed', date_posted=date(2025, 1, 29)),
+
+
+def _jobs_fixture(users_dict):
+    return [
+        dict(member_user_id=users_dict['Amina_Aminova'], required_caregiving_type='babysitter', other_requirements='Must be soft-spoken and patient', date_posted=date(2025, 1, 15)),
+        dict(member_user_id=users_dict['Elena_Elenova'], required_caregiving_type='elderly care', other_requirements='Experience with dementia patients preferred', date_posted=date(2025, 1, 16)),
+        dict(member_user_id=users_dict['Gulnara_Gulnarova'], required_caregiving_type='babysitter', other_requirements='Art background preferred, soft-spoken', date_posted=date(2025, 1, 17)),
+        dict(member_user_id=users_dict['John_Johnson'], required_caregiving_type='babysitter', other_requirements='Energetic and fun-loving', date_posted=date(2025, 1, 18)),
+        dict(member_user_id=users_dict['Lisa_Lisova'], required_caregiving_type='playmate for children', other_requirements='Creative activities required', date_posted=date(2025, 1, 19)),
+        dict(member_user_id=users_dict['Nina_Ninova'], required_caregiving_type='elderly care', other_requirements='Medical training preferred', date_posted=date(2025, 1, 20)),
+        dict(member_user_id=users_dict['Paul_Paulov'], required_caregiving_type='elderly care', other_requirements='Gentle and caring personality', date_posted=date(2025, 1, 21)),
+        dict(member_user_id=users_dict['Qasim_Qasimov'], required_caregiving_type='elderly care', other_requirements='Soft-spoken caregiver needed', date_posted=date(2025, 1, 22)),
+        dict(member_user_id=users_dict['Sam_Samov'], required_caregiving_type='playmate for children', other_requirements='Active and engaging', date_posted=date(2025, 1, 23)),
+        dict(member_user_id=users_dict['Amina_Aminova'], required_caregiving_type='babysitter', other_requirements='Weekend availability required', date_posted=date(2025, 1, 24)),
+        dict(member_user_id=users_dict['Elena_Elenova'], required_caregiving_type='elderly care', other_requirements='Morning shifts preferred', date_posted=date(2025, 1, 25)),
+        dict(member_user_id=users_dict['Gulnara_Gulnarova'], required_caregiving_type='babysitter', other_requirements='Afternoon availability', date_posted=date(2025, 1, 26)),
+        dict(member_user_id=users_dict['John_Johnson'], required_caregiving_type='playmate for children', other_requirements='Outdoor activities preferred', date_posted=date(2025, 1, 27)),
+        dict(member_user_id=users_dict['Lisa_Lisova'], required_caregiving_type='babysitter', other_requirements='Educational activities', date_posted=date(2025, 1, 28)),
+        dict(member_user_id=users_dict['Nina_Ninova'], required_caregiving_type='elderly care', other_requirements='Evening care needed', date_posted=date(2025, 1, 29)),
     ]
-    
-    session.add_all(jobs_data)
-    session.commit()
-    
-    jobs_list = session.query(Job).order_by(Job.job_id).all()
-    
-    job_applications_data = [
-        JobApplication(caregiver_user_id=users_dict['Arman_Armanov'], job_id=jobs_list[0].job_id, date_applied=date(2025, 1, 20)),
-        JobApplication(caregiver_user_id=users_dict['David_Davidov'], job_id=jobs_list[0].job_id, date_applied=date(2025, 1, 21)),
-        JobApplication(caregiver_user_id=users_dict['Irina_Irinova'], job_id=jobs_list[0].job_id, date_applied=date(2025, 1, 22)),
-        JobApplication(caregiver_user_id=users_dict['Arman_Armanov'], job_id=jobs_list[1].job_id, date_applied=date(2025, 1, 25)),
-        JobApplication(caregiver_user_id=users_dict['Farid_Faridov'], job_id=jobs_list[1].job_id, date_applied=date(2025, 1, 26)),
-        JobApplication(caregiver_user_id=users_dict['Kate_Kateova'], job_id=jobs_list[1].job_id, date_applied=date(2025, 1, 27)),
-        JobApplication(caregiver_user_id=users_dict['Tina_Tinova'], job_id=jobs_list[1].job_id, date_applied=date(2025, 1, 28)),
-        JobApplication(caregiver_user_id=users_dict['Arman_Armanov'], job_id=jobs_list[2].job_id, date_applied=date(2025, 1, 30)),
-        JobApplication(caregiver_user_id=users_dict['Irina_Irinova'], job_id=jobs_list[2].job_id, date_applied=date(2025, 1, 31)),
-        JobApplication(caregiver_user_id=users_dict['Michael_Michaelov'], job_id=jobs_list[2].job_id, date_applied=date(2025, 2, 1)),
-        JobApplication(caregiver_user_id=users_dict['Rosa_Rosova'], job_id=jobs_list[2].job_id, date_applied=date(2025, 2, 2)),
-        JobApplication(caregiver_user_id=users_dict['Hasan_Hasanov'], job_id=jobs_list[4].job_id, date_applied=date(2025, 2, 3)),
-        JobApplication(caregiver_user_id=users_dict['Omar_Omarov'], job_id=jobs_list[4].job_id, date_applied=date(2025, 2, 4)),
-        JobApplication(caregiver_user_id=users_dict['Umar_Umarov'], job_id=jobs_list[4].job_id, date_applied=date(2025, 2, 5)),
-        JobApplication(caregiver_user_id=users_dict['Farid_Faridov'], job_id=jobs_list[5].job_id, date_applied=date(2025, 2, 6)),
-        JobApplication(caregiver_user_id=users_dict['Kate_Kateova'], job_id=jobs_list[5].job_id, date_applied=date(2025, 2, 7)),
-        JobApplication(caregiver_user_id=users_dict['Tina_Tinova'], job_id=jobs_list[5].job_id, date_applied=date(2025, 2, 8)),
-        JobApplication(caregiver_user_id=users_dict['Farid_Faridov'], job_id=jobs_list[6].job_id, date_applied=date(2025, 2, 9)),
-        JobApplication(caregiver_user_id=users_dict['Kate_Kateova'], job_id=jobs_list[6].job_id, date_applied=date(2025, 2, 10)),
-        JobApplication(caregiver_user_id=users_dict['Tina_Tinova'], job_id=jobs_list[6].job_id, date_applied=date(2025, 2, 11)),
-        JobApplication(caregiver_user_id=users_dict['Farid_Faridov'], job_id=jobs_list[7].job_id, date_applied=date(2025, 2, 12)),
-        JobApplication(caregiver_user_id=users_dict['Kate_Kateova'], job_id=jobs_list[7].job_id, date_applied=date(2025, 2, 13)),
-        JobApplication(caregiver_user_id=users_dict['Tina_Tinova'], job_id=jobs_list[7].job_id, date_applied=date(2025, 2, 14)),
-        JobApplication(caregiver_user_id=users_dict['Hasan_Hasanov'], job_id=jobs_list[8].job_id, date_applied=date(2025, 2, 15)),
-        JobApplication(caregiver_user_id=users_dict['Omar_Omarov'], job_id=jobs_list[8].job_id, date_applied=date(2025, 2, 16)),
-        JobApplication(caregiver_user_id=users_dict['Umar_Umarov'], job_id=jobs_list[8].job_id, date_applied=date(2025, 2, 17)),
+
+
+def _job_applications_fixture(users_dict, job_ids):
+    return [
+        dict(caregiver_user_id=users_dict['Arman_Armanov'], job_id=job_ids[0], date_applied=date(2025, 1, 20)),
+        dict(caregiver_user_id=users_dict['David_Davidov'], job_id=job_ids[0], date_applied=date(2025, 1, 21)),
+        dict(caregiver_user_id=users_dict['Irina_Irinova'], job_id=job_ids[0], date_applied=date(2025, 1, 22)),
+        dict(caregiver_user_id=users_dict['Arman_Armanov'], job_id=job_ids[1], date_applied=date(2025, 1, 25)),
+        dict(caregiver_user_id=users_dict['Farid_Faridov'], job_id=job_ids[1], date_applied=date(2025, 1, 26)),
+        dict(caregiver_user_id=users_dict['Kate_Kateova'], job_id=job_ids[1], date_applied=date(2025, 1, 27)),
+        dict(caregiver_user_id=users_dict['Tina_Tinova'], job_id=job_ids[1], date_applied=date(2025, 1, 28)),
+        dict(caregiver_user_id=users_dict['Arman_Armanov'], job_id=job_ids[2], date_applied=date(2025, 1, 30)),
+        dict(caregiver_user_id=users_dict['Irina_Irinova'], job_id=job_ids[2], date_applied=date(2025, 1, 31)),
+        dict(caregiver_user_id=users_dict['Michael_Michaelov'], job_id=job_ids[2], date_applied=date(2025, 2, 1)),
+        dict(caregiver_user_id=users_dict['Rosa_Rosova'], job_id=job_ids[2], date_applied=date(2025, 2, 2)),
+        dict(caregiver_user_id=users_dict['Hasan_Hasanov'], job_id=job_ids[4], date_applied=date(2025, 2, 3)),
+        dict(caregiver_user_id=users_dict['Omar_Omarov'], job_id=job_ids[4], date_applied=date(2025, 2, 4)),
+        dict(caregiver_user_id=users_dict['Umar_Umarov'], job_id=job_ids[4], date_applied=date(2025, 2, 5)),
+        dict(caregiver_user_id=users_dict['Farid_Faridov'], job_id=job_ids[5], date_applied=date(2025, 2, 6)),
+        dict(caregiver_user_id=users_dict['Kate_Kateova'], job_id=job_ids[5], date_applied=date(2025, 2, 7)),
+        dict(caregiver_user_id=users_dict['Tina_Tinova'], job_id=job_ids[5], date_applied=date(2025, 2, 8)),
+        dict(caregiver_user_id=users_dict['Farid_Faridov'], job_id=job_ids[6], date_applied=date(2025, 2, 9)),
+        dict(caregiver_user_id=users_dict['Kate_Kateova'], job_id=job_ids[6], date_applied=date(2025, 2, 10)),
+        dict(caregiver_user_id=users_dict['Tina_Tinova'], job_id=job_ids[6], date_applied=date(2025, 2, 11)),
+        dict(caregiver_user_id=users_dict['Farid_Faridov'], job_id=job_ids[7], date_applied=date(2025, 2, 12)),
+        dict(caregiver_user_id=users_dict['Kate_Kateova'], job_id=job_ids[7], date_applied=date(2025, 2, 13)),
+        dict(caregiver_user_id=users_dict['Tina_Tinova'], job_id=job_ids[7], date_applied=date(2025, 2, 14)),
+        dict(caregiver_user_id=users_dict['Hasan_Hasanov'], job_id=job_ids[8], date_applied=date(2025, 2, 15)),
+        dict(caregiver_user_id=users_dict['Omar_Omarov'], job_id=job_ids[8], date_applied=date(2025, 2, 16)),
+        dict(caregiver_user_id=users_dict['Umar_Umarov'], job_id=job_ids[8], date_applied=date(2025, 2, 17)),
     ]
-    
-    session.add_all(job_applications_data)
-    session.commit()
-    
-    appointments_data = [
-        Appointment(caregiver_user_id=users_dict['Arman_Armanov'], member_user_id=users_dict['Amina_Aminova'], appointment_date=date(2025, 2, 10), appointment_time=time(9, 0), work_hours=3.0, status='accepted'),
-        Appointment(caregiver_user_id=users_dict['David_Davidov'], member_user_id=users_dict['Gulnara_Gulnarova'], appointment_date=date(2025, 2, 11), appointment_time=time(14, 0), work_hours=4.0, status='accepted'),
-        Appointment(caregiver_user_id=users_dict['Farid_Faridov'], member_user_id=users_dict['Elena_Elenova'], appointment_date=date(2025, 2, 12), appointment_time=time(10, 0), work_hours=5.0, status='accepted'),
-        Appointment(caregiver_user_id=users_dict['Irina_Irinova'], member_user_id=users_dict['John_Johnson'], appointment_date=date(2025, 2, 13), appointment_time=time(15, 0), work_hours=3.5, status='accepted'),
-        Appointment(caregiver_user_id=users_dict['Kate_Kateova'], member_user_id=users_dict['Nina_Ninova'], appointment_date=date(2025, 2, 14), appointment_time=time(8, 0), work_hours=6.0, status='accepted'),
-        Appointment(caregiver_user_id=users_dict['Michael_Michaelov'], member_user_id=users_dict['Lisa_Lisova'], appointment_date=date(2025, 2, 15), appointment_time=time(16, 0), work_hours=2.5, status='accepted'),
-        Appointment(caregiver_user_id=users_dict['Rosa_Rosova'], member_user_id=users_dict['Sam_Samov'], appointment_date=date(2025, 2, 16), appointment_time=time(11, 0), work_hours=4.0, status='accepted'),
-        Appointment(caregiver_user_id=users_dict['Tina_Tinova'], member_user_id=users_dict['Paul_Paulov'], appointment_date=date(2025, 2, 17), appointment_time=time(9, 30), work_hours=5.5, status='accepted'),
-        Appointment(caregiver_user_id=users_dict['Arman_Armanov'], member_user_id=users_dict['Gulnara_Gulnarova'], appointment_date=date(2025, 2, 18), appointment_time=time(13, 0), work_hours=3.0, status='accepted'),
-        Appointment(caregiver_user_id=users_dict['Farid_Faridov'], member_user_id=users_dict['Qasim_Qasimov'], appointment_date=date(2025, 2, 19), appointment_time=time(10, 0), work_hours=4.0, status='accepted'),
-        Appointment(caregiver_user_id=users_dict['Irina_Irinova'], member_user_id=users_dict['Amina_Aminova'], appointment_date=date(2025, 2, 20), appointment_time=time(14, 0), work_hours=3.0, status='pending'),
-        Appointment(caregiver_user_id=users_dict['Kate_Kateova'], member_user_id=users_dict['Elena_Elenova'], appointment_date=date(2025, 2, 21), appointment_time=time(11, 0), work_hours=4.0, status='pending'),
-        Appointment(caregiver_user_id=users_dict['David_Davidov'], member_user_id=users_dict['John_Johnson'], appointment_date=date(2025, 2, 22), appointment_time=time(15, 0), work_hours=2.0, status='declined'),
-        Appointment(caregiver_user_id=users_dict['Hasan_Hasanov'], member_user_id=users_dict['Lisa_Lisova'], appointment_date=date(2025, 2, 23), appointment_time=time(16, 0), work_hours=3.0, status='pending'),
-        Appointment(caregiver_user_id=users_dict['Omar_Omarov'], member_user_id=users_dict['Sam_Samov'], appointment_date=date(2025, 2, 24), appointment_time=time(12, 0), work_hours=4.0, status='declined'),
+
+
+def _appointments_fixture(users_dict):
+    return [
+        dict(caregiver_user_id=users_dict['Arman_Armanov'], member_user_id=users_dict['Amina_Aminova'], appointment_date=date(2025, 2, 10), appointment_time=time(9, 0), work_hours=3.0, status='accepted'),
+        dict(caregiver_user_id=users_dict['David_Davidov'], member_user_id=users_dict['Gulnara_Gulnarova'], appointment_date=date(2025, 2, 11), appointment_time=time(14, 0), work_hours=4.0, status='accepted'),
+        dict(caregiver_user_id=users_dict['Farid_Faridov'], member_user_id=users_dict['Elena_Elenova'], appointment_date=date(2025, 2, 12), appointment_time=time(10, 0), work_hours=5.0, status='accepted'),
+        dict(caregiver_user_id=users_dict['Irina_Irinova'], member_user_id=users_dict['John_Johnson'], appointment_date=date(2025, 2, 13), appointment_time=time(15, 0), work_hours=3.5, status='accepted'),
+        dict(caregiver_user_id=users_dict['Kate_Kateova'], member_user_id=users_dict['Nina_Ninova'], appointment_date=date(2025, 2, 14), appointment_time=time(8, 0), work_hours=6.0, status='accepted'),
+        dict(caregiver_user_id=users_dict['Michael_Michaelov'], member_user_id=users_dict['Lisa_Lisova'], appointment_date=date(2025, 2, 15), appointment_time=time(16, 0), work_hours=2.5, status='accepted'),
+        dict(caregiver_user_id=users_dict['Rosa_Rosova'], member_user_id=users_dict['Sam_Samov'], appointment_date=date(2025, 2, 16), appointment_time=time(11, 0), work_hours=4.0, status='accepted'),
+        dict(caregiver_user_id=users_dict['Tina_Tinova'], member_user_id=users_dict['Paul_Paulov'], appointment_date=date(2025, 2, 17), appointment_time=time(9, 30), work_hours=5.5, status='accepted'),
+        dict(caregiver_user_id=users_dict['Arman_Armanov'], member_user_id=users_dict['Gulnara_Gulnarova'], appointment_date=date(2025, 2, 18), appointment_time=time(13, 0), work_hours=3.0, status='accepted'),
+        dict(caregiver_user_id=users_dict['Farid_Faridov'], member_user_id=users_dict['Qasim_Qasimov'], appointment_date=date(2025, 2, 19), appointment_time=time(10, 0), work_hours=4.0, status='accepted'),
+        dict(caregiver_user_id=users_dict['Irina_Irinova'], member_user_id=users_dict['Amina_Aminova'], appointment_date=date(2025, 2, 20), appointment_time=time(14, 0), work_hours=3.0, status='pending'),
+        dict(caregiver_user_id=users_dict['Kate_Kateova'], member_user_id=users_dict['Elena_Elenova'], appointment_date=date(2025, 2, 21), appointment_time=time(11, 0), work_hours=4.0, status='pending'),
+        dict(caregiver_user_id=users_dict['David_Davidov'], member_user_id=users_dict['John_Johnson'], appointment_date=date(2025, 2, 22), appointment_time=time(15, 0), work_hours=2.0, status='declined'),
+        dict(caregiver_user_id=users_dict['Hasan_Hasanov'], member_user_id=users_dict['Lisa_Lisova'], appointment_date=date(2025, 2, 23), appointment_time=time(16, 0), work_hours=3.0, status='pending'),
+        dict(caregiver_user_id=users_dict['Omar_Omarov'], member_user_id=users_dict['Sam_Samov'], appointment_date=date(2025, 2, 24), appointment_time=time(12, 0), work_hours=4.0, status='declined'),
     ]
+
+
+def _insert_returning_ids(model, key, rows):
+    # One multi-row INSERT ... RETURNING per batch; ids come back in row order
+    if not rows:
+        return []
+    statement = insert(model).returning(key, sort_by_parameter_order=True)
+    return session.execute(statement, rows).scalars().all()
+
+
+def _insert_rows(model, rows):
+    if rows:
+        session.execute(insert(model), rows)
+
+
+def _seed_copies(copies):
+    """Insert one copy of the fixture per entry in `copies`; copy 0 is the original data"""
+    users_rows = []
+    for copy in copies:
+        for row in _users_fixture():
+            if copy:
+                row['email'] = row['email'].replace('@', f'+{copy}@')
+            users_rows.append(row)
+    user_ids = _insert_returning_ids(User, User.user_id, users_rows)
+
+    users_per_copy = len(users_rows) // len(copies)
+    users_dicts = []
+    for index in range(len(copies)):
+        block = slice(index * users_per_copy, (index + 1) * users_per_copy)
+        users_dicts.append({
+            f"{row['given_name']}_{row['surname']}": user_id
+            for row, user_id in zip(users_rows[block], user_ids[block])
+        })
+
+    _insert_rows(Caregiver, [row for users_dict in users_dicts for row in _caregivers_fixture(users_dict)])
+    _insert_rows(Member, [row for users_dict in users_dicts for row in _members_fixture(users_dict)])
+    _insert_rows(Address, [row for users_dict in users_dicts for row in _addresses_fixture(users_dict)])
+
+    jobs_rows = [row for users_dict in users_dicts for row in _jobs_fixture(users_dict)]
+    job_ids = _insert_returning_ids(Job, Job.job_id, jobs_rows)
+    jobs_per_copy = len(jobs_rows) // len(copies)
+
+    _insert_rows(JobApplication, [
+        row
+        for index, users_dict in enumerate(users_dicts)
+        for row in _job_applications_fixture(users_dict, job_ids[index * jobs_per_copy:(index + 1) * jobs_per_copy])
+    ])
+    _insert_rows(Appointment, [row for users_dict in users_dicts for row in _appointments_fixture(users_dict)])
+
+
+def insert_data(scale=1):
+    """Insert the fixture data; `scale` > 1 repeats it with distinct emails (for staging loads)"""
+    slowlog.set_step("insert_data")
+    print("PART 2.2: Inserting Data")
     
-    session.add_all(appointments_data)
+    # A single transaction; each table is written with multi-row INSERTs in batches of copies
+    for start in range(0, scale, SEED_BATCH_COPIES):
+        _seed_copies(range(start, min(start + SEED_BATCH_COPIES, scale)))
     session.commit()
     
     print("Data inserted successfully!\n")
 
 
 def update_queries():
+    """Parts 3.1 and 3.2 as single UPDATE statements; returns the affected row counts"""
     print("PART 2.3: Update SQL Statements")
     
 
+    slowlog.set_step("update_queries 3.1")
     print("3.1: Update phone number of Arman Armanov to +77773414141")
-    user = session.query(User).filter(User.given_name == 'Arman', User.surname == 'Armanov').first()
-    if user:
-        user.phone_number = '+77773414141'
-        session.commit()
-        print(f"Rows updated: 1\n")
-    else:
-        print("User not found\n")
+    phone_count = session.execute(
+        update(User)
+        .where(User.given_name == 'Arman', User.surname == 'Armanov')
+        .values(phone_number='+77773414141'),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+    print(f"Rows updated: {phone_count}\n")
     
 
+    slowlog.set_step("update_queries 3.2")
     print("3.2: Add commission fee to Caregivers' hourly rate")
     print("  - If hourly_rate < $10: add $0.3")
     print("  - If hourly_rate >= $10: add 10%")
-    caregivers = session.query(Caregiver).all()
-    updated_count = 0
-    for caregiver in caregivers:
-        if caregiver.hourly_rate < Decimal('10'):
-            caregiver.hourly_rate = caregiver.hourly_rate + Decimal('0.3')
-        else:
-            caregiver.hourly_rate = caregiver.hourly_rate * Decimal('1.10')
-        updated_count += 1
+    rate_count = session.execute(
+        update(Caregiver).values(hourly_rate=case(
+            (Caregiver.hourly_rate < 10, Caregiver.hourly_rate + Decimal('0.3')),
+            else_=Caregiver.hourly_rate * Decimal('1.10')
+        )),
+        execution_options={'synchronize_session': False}
+    ).rowcount
     session.commit()
-    print(f"Rows updated: {updated_count}\n")
+    print(f"Rows updated: {rate_count}\n")
+    return phone_count, rate_count
 
 
 def delete_queries():
-
+    """Parts 4.1 and 4.2 as single DELETE statements; dependent rows go through
+    the ON DELETE CASCADE foreign keys. Returns the deleted row counts"""
 
     print("PART 2.4: Delete SQL Statements")
 
     
 
+    slowlog.set_step("delete_queries 4.1")
     print("4.1: Delete jobs posted by Amina Aminova")
-    member = session.query(Member).join(User).filter(User.given_name == 'Amina', User.surname == 'Aminova').first()
-    if member:
-        deleted_count = len(member.jobs)
-        for job in member.jobs:
-            session.delete(job)
-        session.commit()
-        print(f"Rows deleted: {deleted_count}\n")
-    else:
-        print("Member not found\n")
+    amina = select(User.user_id).where(User.given_name == 'Amina', User.surname == 'Aminova')
+    jobs_count = session.execute(
+        delete(Job).where(Job.member_user_id.in_(amina)),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+    session.commit()
+    print(f"Rows deleted: {jobs_count}\n")
     
 
+    slowlog.set_step("delete_queries 4.2")
     print("4.2: Delete all members who live on Kabanbay Batyr street")
-    addresses = session.query(Address).filter(Address.street == 'Kabanbay Batyr').all()
-    deleted_count = 0
-    for address in addresses:
-        if address.member:
-            session.delete(address.member)
-            deleted_count += 1
+    on_street = select(Address.member_user_id).where(Address.street == 'Kabanbay Batyr')
+    members_count = session.execute(
+        delete(Member).where(Member.member_user_id.in_(on_street)),
+        execution_options={'synchronize_session': False}
+    ).rowcount
     session.commit()
-    print(f"Rows deleted: {deleted_count}\n")
+    print(f"Rows deleted: {members_count}\n")
+    return jobs_count, members_count
 
 
 def simple_queries():
@@ -398,6 +311,7 @@ def simple_queries():
 
     
 
+    slowlog.set_step("simple_queries 5.1")
     print("5.1: Select caregiver and member names for the accepted appointments")
     appointments = session.query(Appointment).filter(Appointment.status == 'accepted').all()
     for apt in appointments:
@@ -407,6 +321,7 @@ def simple_queries():
     print(f"Total rows: {len(appointments)}\n")
     
 
+    slowlog.set_step("simple_queries 5.2")
     print("5.2: List job ids that contain 'soft-spoken' in their other requirements")
     jobs = session.query(Job).filter(Job.other_requirements.contains('soft-spoken')).all()
     for job in jobs:
@@ -414,6 +329,7 @@ def simple_queries():
     print(f"Total rows: {len(jobs)}\n")
     
 
+    slowlog.set_step("simple_queries 5.3")
     print("5.3: List the work hours of all babysitter positions")
     appointments = session.query(Appointment).join(Caregiver).filter(Caregiver.caregiving_type == 'babysitter').all()
     for apt in appointments:
@@ -421,6 +337,7 @@ def simple_queries():
     print(f"Total rows: {len(appointments)}\n")
     
 
+    slowlog.set_step("simple_queries 5.4")
     print("5.4: List members looking for Elderly Care in Astana with 'No pets.' rule")
     members = session.query(Member).join(User).join(Job).filter(
         Job.required_caregiving_type == 'elderly care',
@@ -440,56 +357,36 @@ def complex_queries():
 
     
 
+    slowlog.set_step("complex_queries 6.1")
     print("6.1: Count the number of applicants for each job posted by a member")
-    jobs = session.query(Job).all()
-    for job in jobs:
-        applicant_count = len(job.job_applications)
-        member_name = f"{job.member.user.given_name} {job.member.user.surname}"
-        print(f"  Job ID: {job.job_id}, Member: {member_name}, Applicants: {applicant_count}")
-    print(f"Total rows: {len(jobs)}\n")
+    rows = reports.applicant_counts_query(session).all()
+    for row in rows:
+        print(f"  Job ID: {row.job_id}, Member: {row.member_name}, Applicants: {row.applicants}")
+    print(f"Total rows: {len(rows)}\n")
     
 
+    slowlog.set_step("complex_queries 6.2")
     print("6.2: Total hours spent by caregivers for all accepted appointments")
-    total_hours = session.query(func.sum(Appointment.work_hours)).filter(Appointment.status == 'accepted').scalar()
-    total_hours = total_hours if total_hours is not None else 0
+    total_hours = reports.total_accepted_hours(session)
     print(f"  Total hours: {total_hours}\n")
     
 
+    slowlog.set_step("complex_queries 6.3")
     print("6.3: Average pay of caregivers based on accepted appointments")
-    avg_pay = session.query(func.avg(Caregiver.hourly_rate * Appointment.work_hours)).join(
-        Appointment, Caregiver.caregiver_user_id == Appointment.caregiver_user_id
-    ).filter(Appointment.status == 'accepted').scalar()
+    avg_pay = reports.average_pay(session)
     avg_pay = avg_pay if avg_pay is not None else 0.0
     print(f"  Average pay: ${avg_pay:.2f}\n")
     
 
+    slowlog.set_step("complex_queries 6.4")
     print("6.4: Caregivers who earn above average based on accepted appointments")
-
-    avg_earnings = session.query(func.avg(Caregiver.hourly_rate * Appointment.work_hours)).join(
-        Appointment, Caregiver.caregiver_user_id == Appointment.caregiver_user_id
-    ).filter(Appointment.status == 'accepted').scalar()
-    
-    if avg_earnings is not None:
-    
-        results = session.query(
-            User.given_name + ' ' + User.surname,
-            func.sum(Caregiver.hourly_rate * Appointment.work_hours)
-        ).join(Caregiver, User.user_id == Caregiver.caregiver_user_id).join(
-            Appointment, Caregiver.caregiver_user_id == Appointment.caregiver_user_id
-        ).filter(Appointment.status == 'accepted').group_by(
-            User.given_name, User.surname
-        ).having(
-            func.sum(Caregiver.hourly_rate * Appointment.work_hours) > avg_earnings
-        ).order_by(func.sum(Caregiver.hourly_rate * Appointment.work_hours).desc()).all()
-        
-        if len(results) == 0:
-            print("  No caregivers found earning above average (or no accepted appointments exist).\n")
-        else:
-            for row in results:
-                print(f"  Caregiver: {row[0]}, Total Earnings: ${row[1]:.2f}")
-            print(f"Total rows: {len(results)}\n")
+    results = reports.above_average_earners(session)
+    if len(results) == 0:
+        print("  No caregivers found earning above average (or no accepted appointments exist).\n")
     else:
-        print("  No accepted appointments found.\n")
+        for row in results:
+            print(f"  Caregiver: {row.caregiver_name}, Total Earnings: ${row.earnings:.2f}")
+        print(f"Total rows: {len(results)}\n")
 
 
 def derived_attribute_query():
@@ -499,21 +396,17 @@ def derived_attribute_query():
 
     
 
+    slowlog.set_step("derived_attribute_query")
     print("Calculate total cost to pay for caregivers for all accepted appointments")
-    appointments = session.query(Appointment).join(Caregiver).join(User).filter(
-        Appointment.status == 'accepted'
-    ).all()
+    rows = reports.accepted_appointment_costs(session)
     
-    if len(appointments) == 0:
+    if len(rows) == 0:
         print("  No accepted appointments found.\n")
     else:
-        total_sum = 0
-        for apt in appointments:
-            caregiver_name = f"{apt.caregiver.user.given_name} {apt.caregiver.user.surname}"
-            total_cost = float(apt.caregiver.hourly_rate * apt.work_hours)
-            print(f"  Appointment {apt.appointment_id}: {caregiver_name} - ${apt.caregiver.hourly_rate:.2f}/hr × {apt.work_hours} hrs = ${total_cost:.2f}")
-            total_sum += total_cost
-        print(f"\n  Grand Total: ${total_sum:.2f}\n")
+        for row in rows:
+            print(f"  Appointment {row.appointment_id}: {row.caregiver_name} - ${row.hourly_rate:.2f}/hr × {row.work_hours} hrs = ${row.cost:.2f}")
+        # From the caregiver_earnings rollup rather than summing the rows above
+        print(f"\n  Grand Total: ${reports.total_earnings(session):.2f}\n")
 
 
 def view_operation():
@@ -523,50 +416,34 @@ def view_operation():
 
     
 
-    print("Creating view: job_applications_view")
-    from sqlalchemy import text as sql_text
-    
-    with engine.connect() as conn:
-
-        conn.execute(sql_text("DROP VIEW IF EXISTS job_applications_view"))
-        conn.commit()
-        
-
-        conn.execute(sql_text("""
-            CREATE VIEW job_applications_view AS
-            SELECT 
-                ja.job_id,
-                j.required_caregiving_type,
-                j.other_requirements,
-                j.date_posted,
-                ja.caregiver_user_id,
-                u.given_name || ' ' || u.surname AS applicant_name,
-                c.caregiving_type,
-                c.hourly_rate,
-                ja.date_applied
-            FROM job_application ja
-            JOIN job j ON ja.job_id = j.job_id
-            JOIN caregiver c ON ja.caregiver_user_id = c.caregiver_user_id
-            JOIN "user" u ON c.caregiver_user_id = u.user_id
-        """))
-        conn.commit()
-        print("View created successfully!\n")
+    slowlog.set_step("view_operation refresh")
+    # All of them, so the matching candidates also reflect the seeded data
+    print("Refreshing materialized views: " + ', '.join(MATERIALIZED_VIEWS))
+    matviews.refresh(log=lambda message: None)
+    print("Views refreshed successfully!\n")
     
 
+    slowlog.set_step("view_operation query")
     print("Querying the view:")
     with engine.connect() as conn:
-        result = conn.execute(sql_text("SELECT * FROM job_applications_view ORDER BY job_id, date_applied"))
-        rows = result.fetchall()
+        # Read straight from the view's (job_id, date_applied) index; no join at read time
+        rows = conn.exec_driver_sql(
+            "SELECT job_id, applicant_name, required_caregiving_type, date_applied "
+            "FROM job_applications_view ORDER BY job_id, date_applied"
+        ).fetchall()
         for row in rows:
-            print(f"  Job {row[0]}: {row[5]} applied for {row[1]} position on {row[8]}")
+            print(f"  Job {row.job_id}: {row.applicant_name} applied for {row.required_caregiving_type} position on {row.date_applied}")
         print(f"Total rows: {len(rows)}\n")
 
-def main():
+
+def main(scale=1):
+    if not cache.shared():
+        print(f"Warning: {cache.MEMORY_BACKEND_WARNING}")
     try:
         # input("Press Enter to start the database operations...")
         create_tables()
         # input("Press Enter to insert data...")
-        insert_data()
+        insert_data(scale)
         # input("Press Enter to perform update queries...")
         update_queries()
         # input("Press Enter to perform delete queries...")
@@ -590,4 +467,6 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Create, seed and query the caregiving database")
+    parser.add_argument('--scale', type=int, default=1, help="number of copies of the fixture data to insert")
+    main(parser.parse_args().scale)
@@ -0,0 +1,94 @@
+"""
+CSV / JSON Lines downloads of list views
+Rows stream from the same server-side cursor as the JSON API, so an export
+uses constant memory and the first bytes go out before the query finishes
+"""
+
+import csv
+import io
+import json
+from functools import partial
+
+from flask import Response, stream_with_context
+
+from api import API_YIELD_PER, stream_rows, serialize_appointment, serialize_job_application
+import listings
+
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+APPOINTMENT_COLUMNS = [
+    'appointment_id', 'caregiver_user_id', 'caregiver_name', 'member_user_id', 'member_name',
+    'appointment_date', 'appointment_time', 'work_hours', 'status',
+]
+
+JOB_APPLICATION_COLUMNS = [
+    'caregiver_user_id', 'caregiver_name', 'job_id', 'required_caregiving_type',
+    'member_user_id', 'member_name', 'date_applied',
+]
+
+
+def _csv_lines(rows, serialize, columns):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns)
+    writer.writeheader()
+    # Header goes out before the query has returned anything
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for count, row in enumerate(rows, 1):
+        writer.writerow(serialize(row))
+        if count % API_YIELD_PER == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _jsonl_lines(rows, serialize):
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps(serialize(row)) + '\n')
+        if len(chunk) >= API_YIELD_PER:
+            yield ''.join(chunk)
+            chunk = []
+    yield ''.join(chunk)
+
+
+def export(build_listing, serialize, columns, export_format, filename):
+    """Stream the listing (filtered by the request arguments) as a download"""
+    rows = stream_rows(build_listing)
+    if export_format == 'csv':
+        body = _csv_lines(rows, serialize, columns)
+    else:
+        body = _jsonl_lines(rows, serialize)
+    return Response(
+        stream_with_context(body),
+        mimetype=FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename={filename}.{export_format}'}
+    )
+
+
+def _job_application_row(application):
+    row = serialize_job_application(application)
+    member_user = application.job.member.user
+    row['member_user_id'] = application.job.member_user_id
+    row['member_name'] = f"{member_user.given_name} {member_user.surname}"
+    return row
+
+
+def appointments(export_format):
+    return export(listings.appointments, serialize_appointment, APPOINTMENT_COLUMNS, export_format, 'appointments')
+
+
+def job_applications(export_format):
+    return export(
+        partial(listings.job_applications, with_member=True),
+        _job_application_row,
+        JOB_APPLICATION_COLUMNS,
+        export_format,
+        'job_applications'
+    )
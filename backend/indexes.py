@@ -0,0 +1,71 @@
+"""
+Builds the secondary indexes declared in models.py on an existing database
+Indexes are created with CREATE INDEX CONCURRENTLY so a live database keeps
+serving reads and writes while they build. An index left INVALID by an
+interrupted concurrent build is dropped and built again.
+"""
+
+from sqlalchemy.schema import CreateIndex
+
+from models import Base, EXTENSIONS, engine
+
+
+def _create_index_sql(index, concurrently):
+    previous = index.dialect_kwargs.get('postgresql_concurrently', False)
+    index.dialect_kwargs['postgresql_concurrently'] = concurrently
+    try:
+        return str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect))
+    finally:
+        index.dialect_kwargs['postgresql_concurrently'] = previous
+
+
+def declared_indexes(names=None):
+    """The indexes declared in models.py, or only `names`; an undeclared name is a ValueError"""
+    declared = [index for table in Base.metadata.sorted_tables for index in sorted(table.indexes, key=lambda i: i.name)]
+    if names is None:
+        return declared
+    unknown = set(names) - {index.name for index in declared}
+    if unknown:
+        raise ValueError(f"no such index in models.py: {', '.join(sorted(unknown))}")
+    return [index for index in declared if index.name in names]
+
+
+def invalid_indexes(conn):
+    return set(conn.exec_driver_sql(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE NOT i.indisvalid"
+    ).scalars())
+
+
+def build_indexes(statements, concurrently=True, log=print, lock_timeout=None):
+    """Run CREATE INDEX ... IF NOT EXISTS `statements` ({index name: statement})
+
+    An index with that name left invalid is dropped first. With
+    `lock_timeout` (e.g. '5s') a build that cannot get its lock in time
+    fails instead of waiting.
+    """
+    # CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        if lock_timeout:
+            conn.exec_driver_sql(f"SET lock_timeout = '{lock_timeout}'")
+        try:
+            invalid = invalid_indexes(conn)
+            for name, statement in statements.items():
+                if name in invalid:
+                    # IF NOT EXISTS would keep the broken index
+                    log(f"Dropping invalid index {name}")
+                    conn.exec_driver_sql(f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {name}")
+                log(f"Building index {name}")
+                conn.exec_driver_sql(statement)
+        finally:
+            if lock_timeout:
+                # The connection goes back to the pool
+                conn.exec_driver_sql("RESET lock_timeout")
+
+
+def create_indexes(names=None, concurrently=True, log=print, lock_timeout=None):
+    """Create every declared index (or only `names`) that does not exist yet"""
+    statements = {index.name: _create_index_sql(index, concurrently) for index in declared_indexes(names)}
+    with engine.begin() as conn:
+        for extension in EXTENSIONS:
+            conn.exec_driver_sql(f'CREATE EXTENSION IF NOT EXISTS {extension}')
+    build_indexes(statements, concurrently, log=log, lock_timeout=lock_timeout)
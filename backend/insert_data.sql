@@ -2,7 +2,7 @@
 -- At least 10 instances per table as required
 
 -- Insert USERS (mix of caregivers and members)
-INSERT INTO "user" (email, given_name, surname, city, phone_number, profile_description, password) VALUES
+INSERT INTO users (email, given_name, surname, city, phone_number, profile_description, password) VALUES
 ('arman.armanov@email.com', 'Arman', 'Armanov', 'Astana', '+77771234567', 'Experienced caregiver', 'password123'),
 ('amina.aminova@email.com', 'Amina', 'Aminova', 'Almaty', '+77772345678', 'Family member seeking care', 'password123'),
 ('david.davidov@email.com', 'David', 'Davidov', 'Astana', '+77773456789', 'Professional babysitter', 'password123'),
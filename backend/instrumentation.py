@@ -0,0 +1,199 @@
+"""
+Per-request SQL accounting for the web application
+Counts the statements each request sends through the shared engine,
+enforces a query budget per route and records per-route histograms of
+request time, query count, DB time and rows, served at /metrics in the
+Prometheus text format. Metrics are per process.
+"""
+
+import os
+import threading
+import time
+
+from flask import Response, g, has_request_context, request, current_app
+from sqlalchemy import event
+
+from pooling import pool_stats
+
+
+DEFAULT_QUERY_BUDGET = int(os.getenv('QUERY_BUDGET', '10'))
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+ROW_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000, 100000)
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+def query_budget(limit):
+    # Attach a per-route budget; checked after the response is built
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+class Histogram:
+    """A Prometheus histogram with one series per route"""
+
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.series = {}  # route -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, route, value):
+        with self.lock:
+            series = self.series.setdefault(route, [0] * len(self.buckets) + [0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for route, series in sorted(self.series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f'{self.name}_bucket{{route="{route}",le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{route="{route}",le="+Inf"}} {series[-1]}')
+                lines.append(f'{self.name}_sum{{route="{route}"}} {series[-2]}')
+                lines.append(f'{self.name}_count{{route="{route}"}} {series[-1]}')
+        return lines
+
+
+REQUEST_SECONDS = Histogram('app_request_duration_seconds', "Time to build the response", TIME_BUCKETS)
+REQUEST_QUERIES = Histogram('app_request_queries', "SQL statements per request", COUNT_BUCKETS)
+REQUEST_DB_SECONDS = Histogram('app_request_db_seconds', "Time spent in SQL statements per request", TIME_BUCKETS)
+REQUEST_DB_ROWS = Histogram('app_request_db_rows', "Rows returned or affected by SQL statements per request", ROW_BUCKETS)
+SLOWEST_STATEMENT_SECONDS = Histogram(
+    'app_request_slowest_statement_seconds', "Slowest SQL statement of each request", TIME_BUCKETS
+)
+HISTOGRAMS = [REQUEST_SECONDS, REQUEST_QUERIES, REQUEST_DB_SECONDS, REQUEST_DB_ROWS, SLOWEST_STATEMENT_SECONDS]
+
+# pool_stats() key -> (metric name, type, description); counters only ever grow
+POOL_METRICS = {
+    'pool_size': ('db_pool_size', 'gauge', "Connections kept open by the pool"),
+    'max_overflow': ('db_pool_max_overflow', 'gauge', "Connections allowed beyond the pool size"),
+    'checked_out': ('db_pool_checked_out', 'gauge', "Connections in use"),
+    'checked_in': ('db_pool_checked_in', 'gauge', "Idle connections in the pool"),
+    'overflow': ('db_pool_overflow', 'gauge', "Connections open beyond the pool size"),
+    'timeout': ('db_pool_timeout_seconds', 'gauge', "How long a checkout waits before giving up"),
+    'checkouts': ('db_pool_checkouts_total', 'counter', "Connection checkouts"),
+    'checkout_time_total': ('db_pool_checkout_seconds_total', 'counter', "Time spent checking out connections"),
+    'checkout_time_max': ('db_pool_checkout_max_seconds', 'gauge', "Slowest connection checkout"),
+    'slow_checkouts': ('db_pool_slow_checkouts_total', 'counter', "Checkouts slower than DB_POOL_SLOW_CHECKOUT"),
+    'timeouts': ('db_pool_timeouts_total', 'counter', "Checkouts that timed out"),
+}
+
+# route -> (seconds, statement) of the slowest statement seen on that route
+slowest_statements = {}
+_slowest_lock = threading.Lock()
+
+
+def _before_statement(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and has_request_context() and 'query_count' in g:
+        g.query_count += 1
+        # On the statement's execution context, which is discarded with it
+        # even when the statement fails and the after hook never runs
+        context._request_statement_start = time.perf_counter()
+
+
+def _after_statement(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, '_request_statement_start', None)
+    if start is None or not has_request_context() or 'query_count' not in g:
+        return
+    elapsed = time.perf_counter() - start
+    g.db_time += elapsed
+    # -1 for server-side cursors, whose rows are not known up front
+    g.db_rows += max(cursor.rowcount, 0)
+    if elapsed > g.slowest_statement[0]:
+        g.slowest_statement = (elapsed, statement)
+
+
+def _start_request():
+    g.query_count = 0
+    g.db_time = 0.0
+    g.db_rows = 0
+    g.slowest_statement = (0.0, None)
+    g.request_start = time.perf_counter()
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+def _record_request(response):
+    if 'request_start' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_start
+    route = _route()
+    REQUEST_SECONDS.observe(route, elapsed)
+    REQUEST_QUERIES.observe(route, g.query_count)
+    REQUEST_DB_SECONDS.observe(route, g.db_time)
+    REQUEST_DB_ROWS.observe(route, g.db_rows)
+    SLOWEST_STATEMENT_SECONDS.observe(route, g.slowest_statement[0])
+    with _slowest_lock:
+        if g.slowest_statement[0] > slowest_statements.get(route, (0.0, None))[0]:
+            slowest_statements[route] = g.slowest_statement
+    if current_app.config['SERVER_TIMING']:
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={g.db_time * 1000:.2f};desc="{g.query_count} queries, {g.db_rows} rows", '
+            f'app;dur={elapsed * 1000:.2f}'
+        )
+    return response
+
+
+def _label(value):
+    value = ' '.join(value.split())[:200]
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def metrics_text(engine):
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines += histogram.render()
+    lines += [
+        "# HELP app_route_slowest_statement_seconds Slowest SQL statement seen on each route",
+        "# TYPE app_route_slowest_statement_seconds gauge",
+    ]
+    with _slowest_lock:
+        for route, (seconds, statement) in sorted(slowest_statements.items()):
+            lines.append(f'app_route_slowest_statement_seconds{{route="{route}",statement="{_label(statement)}"}} {seconds}')
+    stats = pool_stats(engine.pool)
+    for stat, (name, kind, description) in POOL_METRICS.items():
+        if stat in stats:
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}", f"{name} {stats[stat]}"]
+    return '\n'.join(lines) + '\n'
+
+
+def _check_budget(response):
+    view = current_app.view_functions.get(request.endpoint)
+    limit = getattr(view, 'query_budget', current_app.config['QUERY_BUDGET'])
+    count = g.get('query_count', 0)
+    if count > limit:
+        message = f"{request.endpoint} ran {count} queries (budget {limit})"
+        if current_app.config['QUERY_BUDGET_STRICT'] or current_app.testing:
+            raise QueryBudgetExceeded(message)
+        current_app.logger.error(message)
+    return response
+
+
+def init_app(app, engine):
+    app.config.setdefault('QUERY_BUDGET', DEFAULT_QUERY_BUDGET)
+    app.config.setdefault('QUERY_BUDGET_STRICT', os.getenv('QUERY_BUDGET_STRICT', '') == '1')
+    app.config.setdefault('SERVER_TIMING', os.getenv('SERVER_TIMING', '') == '1')
+    event.listen(engine, 'before_cursor_execute', _before_statement)
+    event.listen(engine, 'after_cursor_execute', _after_statement)
+    app.before_request(_start_request)
+    app.after_request(_check_budget)
+    app.after_request(_record_request)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(metrics_text(engine), mimetype='text/plain; version=0.0.4')
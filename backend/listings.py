@@ -0,0 +1,181 @@
+"""
+List queries shared by the HTML list views and the JSON API
+Each builder applies the filters found in the request arguments and returns
+a Listing: the query plus the key columns it is paged and ordered by
+"""
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import aliased, contains_eager, joinedload
+
+from models import (
+    User, Caregiver, Member, Job, JobApplication, Appointment,
+    user_name_document, user_profile_document, job_document
+)
+from pagination import paginate_request
+import search
+
+
+CAREGIVING_TYPES = ['babysitter', 'elderly care', 'playmate for children']
+APPOINTMENT_STATUSES = ['pending', 'accepted', 'declined']
+
+
+class Listing:
+    def __init__(self, query, keys, search_rank=None):
+        self.query = query
+        self.keys = keys
+        self.search_rank = search_rank
+
+    def page(self):
+        return paginate_request(self.query, self.keys, self.search_rank)
+
+    def ordered(self):
+        """The whole result in page order (best match first when searching)"""
+        if self.search_rank is not None:
+            return self.query.order_by(self.search_rank.desc(), *[key.desc() for key in self.keys])
+        return self.query.order_by(*self.keys)
+
+
+def _search_arg(args, name='search'):
+    return args.get(name, '').strip()
+
+
+def users(db, args):
+    search_query = _search_arg(args)
+    search_mode = search.search_mode_arg(args)
+    users_query = db.query(User)
+    search_rank = None
+    text_columns = [User.given_name, User.surname, User.email, User.city]
+    if search_query and search_mode == 'substring':
+        users_query = search.substring(users_query, text_columns, search_query)
+    elif search_query and search_mode == 'fuzzy':
+        users_query, search_rank = search.fuzzy(users_query, User, text_columns, search_query)
+    elif search_query:
+        users_query, search_rank = search.apply(
+            users_query, User, [user_profile_document(User)], search_query
+        )
+    return Listing(users_query, [User.user_id], search_rank)
+
+
+def caregivers(db, args):
+    caregiving_type_filter = _search_arg(args, 'caregiving_type')
+    city_filter = _search_arg(args, 'city')
+    city_mode = search.search_mode_arg(args, default='substring')
+    caregivers_query = db.query(Caregiver).join(User).options(contains_eager(Caregiver.user))
+
+    if caregiving_type_filter:
+        caregivers_query = caregivers_query.filter(Caregiver.caregiving_type == caregiving_type_filter)
+
+    search_rank = None
+    if city_filter and city_mode == 'fuzzy':
+        caregivers_query, search_rank = search.fuzzy(caregivers_query, Caregiver, [User.city], city_filter)
+    elif city_filter:
+        caregivers_query = search.substring(caregivers_query, [User.city], city_filter)
+    return Listing(caregivers_query, [Caregiver.caregiver_user_id], search_rank)
+
+
+def members(db, args):
+    search_query = _search_arg(args)
+    members_query = db.query(Member).join(User).options(
+        contains_eager(Member.user),
+        joinedload(Member.address)
+    )
+    search_rank = None
+    if search_query:
+        members_query, search_rank = search.apply(
+            members_query, Member, [user_profile_document(User)], search_query
+        )
+    return Listing(members_query, [Member.member_user_id], search_rank)
+
+
+def jobs(db, args):
+    search_query = _search_arg(args)
+    jobs_query = db.query(Job).join(Member).join(User).options(
+        contains_eager(Job.member).contains_eager(Member.user)
+    )
+    search_rank = None
+    if search_query:
+        job, member_user = aliased(Job), aliased(User)
+        jobs_query, search_rank = search.apply(
+            jobs_query, Job, [job_document(Job), user_name_document(User)], search_query,
+            key=Job.job_id,
+            sources=[
+                (select(job.job_id), job_document(job)),
+                (
+                    select(job.job_id).join(member_user, member_user.user_id == job.member_user_id),
+                    user_name_document(member_user)
+                ),
+            ]
+        )
+    return Listing(jobs_query, [Job.job_id], search_rank)
+
+
+def job_applications(db, args, with_member=False):
+    """`with_member` also loads the member who posted each job"""
+    search_query = _search_arg(args)
+    applications_query = db.query(JobApplication).join(Caregiver).join(User).join(Job).options(
+        contains_eager(JobApplication.caregiver).contains_eager(Caregiver.user),
+        contains_eager(JobApplication.job)
+    )
+    if with_member:
+        member_user = aliased(User)
+        applications_query = applications_query.join(Member, Job.member_user_id == Member.member_user_id).join(
+            member_user, Member.member_user_id == member_user.user_id
+        ).options(
+            contains_eager(JobApplication.job).contains_eager(Job.member).contains_eager(Member.user.of_type(member_user))
+        )
+    search_rank = None
+    if search_query:
+        application, caregiver_user, job = aliased(JobApplication), aliased(User), aliased(Job)
+        applications_query, search_rank = search.apply(
+            applications_query, JobApplication, [user_name_document(User), job_document(Job)], search_query,
+            key=tuple_(JobApplication.caregiver_user_id, JobApplication.job_id),
+            sources=[
+                (
+                    select(application.caregiver_user_id, application.job_id).join(
+                        caregiver_user, caregiver_user.user_id == application.caregiver_user_id
+                    ),
+                    user_name_document(caregiver_user)
+                ),
+                (
+                    select(application.caregiver_user_id, application.job_id).join(
+                        job, job.job_id == application.job_id
+                    ),
+                    job_document(job)
+                ),
+            ]
+        )
+    return Listing(applications_query, [JobApplication.caregiver_user_id, JobApplication.job_id], search_rank)
+
+
+def appointments(db, args):
+    search_query = _search_arg(args)
+    caregiver_user = aliased(User)
+    member_user = aliased(User)
+    appointments_query = db.query(Appointment).join(Caregiver).join(caregiver_user, Caregiver.caregiver_user_id == caregiver_user.user_id).join(Member, Appointment.member_user_id == Member.member_user_id).join(member_user, Member.member_user_id == member_user.user_id)
+    appointments_query = appointments_query.options(
+        contains_eager(Appointment.caregiver).contains_eager(Caregiver.user.of_type(caregiver_user)),
+        contains_eager(Appointment.member).contains_eager(Member.user.of_type(member_user))
+    )
+    search_rank = None
+    if search_query:
+        appointment, named_user = aliased(Appointment), aliased(User)
+        status = search_query.lower()
+        appointments_query, search_rank = search.apply(
+            appointments_query,
+            Appointment,
+            [user_name_document(caregiver_user), user_name_document(member_user)],
+            search_query,
+            extra=select(appointment.appointment_id).where(appointment.status == status) if status in APPOINTMENT_STATUSES else None,
+            key=Appointment.appointment_id,
+            sources=[
+                (
+                    select(appointment.appointment_id).join(named_user, named_user.user_id == appointment.caregiver_user_id),
+                    user_name_document(named_user)
+                ),
+                (
+                    select(appointment.appointment_id).join(named_user, named_user.user_id == appointment.member_user_id),
+                    user_name_document(named_user)
+                ),
+            ]
+        )
+    return Listing(appointments_query, [Appointment.appointment_id], search_rank)
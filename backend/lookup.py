@@ -0,0 +1,44 @@
+"""
+Typeahead lookups for the form selectors
+GET /lookup/caregivers?q=ar&type=babysitter, /lookup/members?q=...,
+/lookup/jobs?q=...&type=... return at most `limit` (default LOOKUP_LIMIT)
+matches as JSON; see refdata.py for how `q` is matched.
+"""
+
+from flask import Blueprint, jsonify, request
+
+from sessions import get_db
+import refdata
+
+
+lookup = Blueprint('lookup', __name__, url_prefix='/lookup')
+
+
+def _limit():
+    limit = request.args.get('limit', type=int) or refdata.LOOKUP_LIMIT
+    return max(1, min(limit, refdata.LOOKUP_MAX_LIMIT))
+
+
+def _respond(kind, options):
+    return jsonify(results=[
+        {'id': option.id, 'name': option.name, 'type': option.type, 'label': refdata.label(kind, option)}
+        for option in options
+    ])
+
+
+@lookup.route('/caregivers')
+def caregivers():
+    options = refdata.caregivers(get_db(), request.args.get('q', ''), request.args.get('type') or None, _limit())
+    return _respond('caregiver', options)
+
+
+@lookup.route('/members')
+def members():
+    options = refdata.members(get_db(), request.args.get('q', ''), _limit())
+    return _respond('member', options)
+
+
+@lookup.route('/jobs')
+def jobs():
+    options = refdata.jobs(get_db(), request.args.get('q', ''), request.args.get('type') or None, _limit())
+    return _respond('job', options)
@@ -0,0 +1,68 @@
+"""
+Caregiver-to-job matching
+Ranks the caregivers whose caregiving_type is the job's required type: those
+in the poster's city first, then the rest, each cheapest hourly_rate first.
+Caregivers who already applied are left out.
+
+Candidates come from the caregiver_match_candidates materialized view, whose
+indexes give both halves of the ranking as ordered scans that stop after
+`limit` rows. It is as fresh as the last `flask --app app refresh-views`;
+each candidate is checked against the live caregiver row, so caregivers
+deleted or moved to another caregiving type since then are left out, but
+new caregivers and changed rates or cities only show up after a refresh.
+"""
+
+import os
+
+from sqlalchemy import column, exists, literal, select, table, union_all
+
+from models import Caregiver, JobApplication
+
+
+MATCH_LIMIT = int(os.getenv('MATCH_LIMIT', '20'))
+MATCH_MAX_LIMIT = 100
+
+candidates = table(
+    'caregiver_match_candidates',
+    column('caregiver_user_id'),
+    column('caregiving_type'),
+    column('city'),
+    column('hourly_rate'),
+    column('caregiver_name'),
+)
+
+
+def _ranked(job, city_filter, same_city, limit):
+    not_applied = ~exists().where(
+        JobApplication.job_id == job.job_id,
+        JobApplication.caregiver_user_id == candidates.c.caregiver_user_id
+    )
+    still_matching = exists().where(
+        Caregiver.caregiver_user_id == candidates.c.caregiver_user_id,
+        Caregiver.caregiving_type == job.required_caregiving_type
+    )
+    return select(
+        candidates.c.caregiver_user_id,
+        candidates.c.caregiver_name,
+        candidates.c.city,
+        candidates.c.hourly_rate,
+        literal(same_city).label('same_city'),
+    ).where(
+        candidates.c.caregiving_type == job.required_caregiving_type, city_filter, not_applied, still_matching
+    ).order_by(candidates.c.hourly_rate, candidates.c.caregiver_user_id).limit(limit)
+
+
+def matches(db, job, city, limit=MATCH_LIMIT):
+    """Rows of (caregiver_user_id, caregiver_name, city, hourly_rate, same_city), best match first
+
+    `city` is the city of the member who posted `job`.
+    """
+    ranked = union_all(
+        _ranked(job, candidates.c.city == city, True, limit),
+        _ranked(job, candidates.c.city != city, False, limit),
+    ).subquery()
+    return db.execute(
+        select(ranked).order_by(
+            ranked.c.same_city.desc(), ranked.c.hourly_rate, ranked.c.caregiver_user_id
+        ).limit(limit)
+    ).all()
@@ -0,0 +1,39 @@
+"""
+Refresh of the materialized views declared in models.py
+REFRESH ... CONCURRENTLY rebuilds a view next to the old contents and swaps
+in the difference, so readers are never blocked while it runs
+"""
+
+from models import MATERIALIZED_VIEWS, MaterializedViewRefresh, engine
+
+
+def create_views(names=None):
+    """Create the materialized views (and their indexes) missing from an existing database"""
+    with engine.begin() as conn:
+        for name, statements in MATERIALIZED_VIEWS.items():
+            if names is None or name in names:
+                for statement in statements:
+                    conn.exec_driver_sql(statement)
+
+
+def refresh(names=None, concurrently=True, log=print):
+    """Refresh every materialized view (or only `names`)"""
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        for name in MATERIALIZED_VIEWS:
+            if names is None or name in names:
+                log(f"Refreshing {name}")
+                conn.exec_driver_sql(
+                    f"REFRESH MATERIALIZED VIEW {'CONCURRENTLY ' if concurrently else ''}{name}"
+                )
+                # PostgreSQL does not record when a view was refreshed
+                conn.exec_driver_sql(
+                    "INSERT INTO materialized_view_refresh (view_name, refreshed_at) VALUES (%s, now()) "
+                    "ON CONFLICT (view_name) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at",
+                    (name,)
+                )
+
+
+def refreshed_at(db, name):
+    """When the view was last refreshed, or None if it never was (only created)"""
+    refresh = db.get(MaterializedViewRefresh, name)
+    return refresh.refreshed_at if refresh else None
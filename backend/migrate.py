@@ -0,0 +1,505 @@
+"""
+Versioned schema migrations
+Migrations run in version order and every applied version is recorded in
+schema_migrations, so migrating only does what a database is missing. All
+steps are idempotent, which also makes it safe to migrate a database that
+was built by create_tables() or an earlier schema.sql.
+
+Online safety: every step runs under a short lock_timeout and is retried,
+so a migration waiting for a busy table gives up instead of queueing every
+application query behind its lock. Indexes on existing tables are built
+and dropped CONCURRENTLY. An advisory lock keeps two migrators from running
+at the same time.
+
+Every migration holds its own DDL, frozen as literal SQL: migration 1 is
+the tables as they stood when migrations were introduced, and later ones
+never read models.py, so a version means the same schema whenever and
+wherever it was reached.
+"""
+
+import os
+import time
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from models import Base, EARNINGS_TRIGGERS, EXTENSIONS, MATERIALIZED_VIEWS, engine
+import indexes
+
+
+LOCK_TIMEOUT = os.getenv('MIGRATION_LOCK_TIMEOUT', '5s')
+LOCK_RETRIES = int(os.getenv('MIGRATION_LOCK_RETRIES', '5'))
+ADVISORY_LOCK_KEY = 3412025
+
+metadata = MetaData()
+
+schema_migrations = Table(
+    'schema_migrations', metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String(255), nullable=False),
+    Column('applied_at', DateTime(timezone=True), nullable=False, server_default=func.now()),
+)
+
+
+class MigrationError(Exception):
+    pass
+
+
+class Sql:
+    """Statements run in one transaction under the lock timeout"""
+    transactional = True
+
+    def __init__(self, *statements):
+        self.statements = statements
+
+    def run(self, conn, log):
+        for statement in self.statements:
+            conn.exec_driver_sql(statement)
+
+
+class Call:
+    """A function of the connection, run in one transaction under the lock timeout"""
+    transactional = True
+
+    def __init__(self, function):
+        self.function = function
+
+    def run(self, conn, log):
+        self.function(conn)
+
+
+class BuildIndexes:
+    """Build indexes concurrently from their definitions ({name: 'ON table ...'}); does not block reads or writes"""
+    transactional = False
+
+    def __init__(self, definitions):
+        self.definitions = definitions
+
+    def run(self, conn, log):
+        indexes.build_indexes(
+            {name: f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}" for name, definition in self.definitions.items()},
+            concurrently=True, log=log, lock_timeout=LOCK_TIMEOUT,
+        )
+
+
+class DropIndexes:
+    """Drop indexes concurrently, if they exist"""
+    transactional = False
+
+    def __init__(self, *names):
+        self.names = names
+
+    def run(self, conn, log):
+        # CONCURRENTLY cannot run inside a transaction block
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as index_conn:
+            index_conn.exec_driver_sql(f"SET lock_timeout = '{LOCK_TIMEOUT}'")
+            try:
+                for name in self.names:
+                    log(f"Dropping index {name}")
+                    index_conn.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+            finally:
+                # The connection goes back to the pool
+                index_conn.exec_driver_sql("RESET lock_timeout")
+
+
+class Migration:
+    def __init__(self, version, description, *steps):
+        self.version = version
+        self.description = description
+        self.steps = steps
+
+
+# The baseline tables, frozen: later changes to models.py belong in new
+# migrations. Secondary indexes are left to migrations 2 and 5, which build
+# them concurrently, and caregiver_earnings to migration 3.
+BASELINE_SCHEMA = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id SERIAL NOT NULL,
+        email VARCHAR(255) NOT NULL,
+        given_name VARCHAR(100) NOT NULL,
+        surname VARCHAR(100) NOT NULL,
+        city VARCHAR(100) NOT NULL,
+        phone_number VARCHAR(20) NOT NULL,
+        profile_description TEXT,
+        password VARCHAR(255) NOT NULL,
+        PRIMARY KEY (user_id),
+        UNIQUE (email)
+    )""",
+    """
+    CREATE TABLE IF NOT EXISTS caregiver (
+        caregiver_user_id INTEGER NOT NULL,
+        photo VARCHAR(255),
+        gender VARCHAR(20) NOT NULL,
+        caregiving_type VARCHAR(50) NOT NULL,
+        hourly_rate DECIMAL(10, 2) NOT NULL,
+        PRIMARY KEY (caregiver_user_id),
+        CONSTRAINT check_caregiving_type CHECK (caregiving_type IN ('babysitter', 'elderly care', 'playmate for children')),
+        FOREIGN KEY(caregiver_user_id) REFERENCES users (user_id) ON DELETE CASCADE
+    )""",
+    """
+    CREATE TABLE IF NOT EXISTS member (
+        member_user_id INTEGER NOT NULL,
+        house_rules TEXT,
+        dependent_description TEXT,
+        PRIMARY KEY (member_user_id),
+        FOREIGN KEY(member_user_id) REFERENCES users (user_id) ON DELETE CASCADE
+    )""",
+    """
+    CREATE TABLE IF NOT EXISTS address (
+        member_user_id INTEGER NOT NULL,
+        house_number VARCHAR(20) NOT NULL,
+        street VARCHAR(255) NOT NULL,
+        town VARCHAR(100) NOT NULL,
+        PRIMARY KEY (member_user_id),
+        FOREIGN KEY(member_user_id) REFERENCES member (member_user_id) ON DELETE CASCADE
+    )""",
+    """
+    CREATE TABLE IF NOT EXISTS appointment (
+        appointment_id SERIAL NOT NULL,
+        caregiver_user_id INTEGER NOT NULL,
+        member_user_id INTEGER NOT NULL,
+        appointment_date DATE NOT NULL,
+        appointment_time TIME WITHOUT TIME ZONE NOT NULL,
+        work_hours DECIMAL(5, 2) NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        PRIMARY KEY (appointment_id),
+        CONSTRAINT check_status CHECK (status IN ('pending', 'accepted', 'declined')),
+        FOREIGN KEY(caregiver_user_id) REFERENCES caregiver (caregiver_user_id) ON DELETE CASCADE,
+        FOREIGN KEY(member_user_id) REFERENCES member (member_user_id) ON DELETE CASCADE
+    )""",
+    """
+    CREATE TABLE IF NOT EXISTS job (
+        job_id SERIAL NOT NULL,
+        member_user_id INTEGER NOT NULL,
+        required_caregiving_type VARCHAR(50) NOT NULL,
+        other_requirements TEXT,
+        date_posted DATE NOT NULL,
+        PRIMARY KEY (job_id),
+        CONSTRAINT check_required_caregiving_type CHECK (required_caregiving_type IN ('babysitter', 'elderly care', 'playmate for children')),
+        FOREIGN KEY(member_user_id) REFERENCES member (member_user_id) ON DELETE CASCADE
+    )""",
+    """
+    CREATE TABLE IF NOT EXISTS job_application (
+        caregiver_user_id INTEGER NOT NULL,
+        job_id INTEGER NOT NULL,
+        date_applied DATE NOT NULL,
+        PRIMARY KEY (caregiver_user_id, job_id),
+        FOREIGN KEY(caregiver_user_id) REFERENCES caregiver (caregiver_user_id) ON DELETE CASCADE,
+        FOREIGN KEY(job_id) REFERENCES job (job_id) ON DELETE CASCADE
+    )""",
+]
+
+
+# Migrations 2 onwards, frozen like the baseline: each holds the DDL as it
+# was when the migration was written, whatever models.py says today.
+
+_EARNINGS_UPSERT = """
+        INSERT INTO caregiver_earnings AS e (caregiver_user_id, accepted_appointments, accepted_hours, earnings)
+        SELECT d.caregiver_user_id, d.appointments, d.hours, d.hours * c.hourly_rate
+        FROM (
+            SELECT caregiver_user_id, sum(appointments) AS appointments, sum(hours) AS hours
+            FROM ({changes}) changes GROUP BY caregiver_user_id
+        ) d
+        JOIN caregiver c ON c.caregiver_user_id = d.caregiver_user_id
+        ORDER BY d.caregiver_user_id
+        ON CONFLICT (caregiver_user_id) DO UPDATE SET
+            accepted_appointments = e.accepted_appointments + EXCLUDED.accepted_appointments,
+            accepted_hours = e.accepted_hours + EXCLUDED.accepted_hours,
+            earnings = e.earnings + EXCLUDED.earnings;"""
+_ADDED = "SELECT caregiver_user_id, 1 AS appointments, work_hours AS hours FROM new_rows WHERE status = 'accepted'"
+_REMOVED = "SELECT caregiver_user_id, -1 AS appointments, -work_hours AS hours FROM old_rows WHERE status = 'accepted'"
+
+EARNINGS_ROLLUP = [
+    """
+    CREATE TABLE IF NOT EXISTS caregiver_earnings (
+        caregiver_user_id INTEGER NOT NULL,
+        accepted_appointments INTEGER NOT NULL,
+        accepted_hours DECIMAL(12, 2) NOT NULL,
+        earnings DECIMAL(16, 4) NOT NULL,
+        PRIMARY KEY (caregiver_user_id),
+        FOREIGN KEY(caregiver_user_id) REFERENCES caregiver (caregiver_user_id) ON DELETE CASCADE
+    )""",
+    f"""
+    CREATE OR REPLACE FUNCTION caregiver_earnings_appointments() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN{_EARNINGS_UPSERT.format(changes=_ADDED)}
+        ELSIF TG_OP = 'DELETE' THEN{_EARNINGS_UPSERT.format(changes=_REMOVED)}
+        ELSE{_EARNINGS_UPSERT.format(changes=_ADDED + ' UNION ALL ' + _REMOVED)}
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS appointment_earnings_insert ON appointment",
+    """
+    CREATE TRIGGER appointment_earnings_insert AFTER INSERT ON appointment
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION caregiver_earnings_appointments()""",
+    "DROP TRIGGER IF EXISTS appointment_earnings_update ON appointment",
+    """
+    CREATE TRIGGER appointment_earnings_update AFTER UPDATE ON appointment
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION caregiver_earnings_appointments()""",
+    "DROP TRIGGER IF EXISTS appointment_earnings_delete ON appointment",
+    """
+    CREATE TRIGGER appointment_earnings_delete AFTER DELETE ON appointment
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION caregiver_earnings_appointments()""",
+    """
+    CREATE OR REPLACE FUNCTION caregiver_earnings_rate() RETURNS trigger AS $$
+    BEGIN
+        UPDATE caregiver_earnings SET earnings = accepted_hours * NEW.hourly_rate
+        WHERE caregiver_user_id = NEW.caregiver_user_id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS caregiver_earnings_rate ON caregiver",
+    """
+    CREATE TRIGGER caregiver_earnings_rate AFTER UPDATE OF hourly_rate ON caregiver
+    FOR EACH ROW WHEN (OLD.hourly_rate IS DISTINCT FROM NEW.hourly_rate)
+    EXECUTE FUNCTION caregiver_earnings_rate()""",
+    # Backfill in the same transaction: the triggers lock out appointment
+    # writes until it commits, so no change is missed between the two
+    "DELETE FROM caregiver_earnings",
+    """
+    INSERT INTO caregiver_earnings (caregiver_user_id, accepted_appointments, accepted_hours, earnings)
+    SELECT c.caregiver_user_id, count(*), sum(a.work_hours), sum(a.work_hours) * c.hourly_rate
+    FROM caregiver c
+    JOIN appointment a ON a.caregiver_user_id = c.caregiver_user_id
+    WHERE a.status = 'accepted'
+    GROUP BY c.caregiver_user_id""",
+]
+
+JOB_APPLICATIONS_VIEW = [
+    # Replaces the plain view that database_operations used to create
+    """
+    DO $$ BEGIN
+        IF EXISTS (SELECT 1 FROM pg_class WHERE relname = 'job_applications_view' AND relkind = 'v') THEN
+            DROP VIEW job_applications_view;
+        END IF;
+    END $$""",
+    """
+    CREATE MATERIALIZED VIEW IF NOT EXISTS job_applications_view AS
+    SELECT
+        ja.job_id,
+        j.required_caregiving_type,
+        j.other_requirements,
+        j.date_posted,
+        ja.caregiver_user_id,
+        u.given_name || ' ' || u.surname AS applicant_name,
+        c.caregiving_type,
+        c.hourly_rate,
+        ja.date_applied
+    FROM job_application ja
+    JOIN job j ON ja.job_id = j.job_id
+    JOIN caregiver c ON ja.caregiver_user_id = c.caregiver_user_id
+    JOIN users u ON c.caregiver_user_id = u.user_id""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_job_applications_view ON job_applications_view (job_id, caregiver_user_id)",
+    """
+    CREATE INDEX IF NOT EXISTS ix_job_applications_view_applied ON job_applications_view (job_id, date_applied)
+    INCLUDE (applicant_name, required_caregiving_type)""",
+]
+
+CAREGIVER_MATCH_CANDIDATES = [
+    """
+    CREATE MATERIALIZED VIEW IF NOT EXISTS caregiver_match_candidates AS
+    SELECT
+        c.caregiver_user_id,
+        c.caregiving_type,
+        u.city,
+        c.hourly_rate,
+        u.given_name || ' ' || u.surname AS caregiver_name
+    FROM caregiver c
+    JOIN users u ON c.caregiver_user_id = u.user_id""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_caregiver_match_candidates ON caregiver_match_candidates (caregiver_user_id)",
+    """
+    CREATE INDEX IF NOT EXISTS ix_caregiver_match_candidates_city
+    ON caregiver_match_candidates (caregiving_type, city, hourly_rate, caregiver_user_id) INCLUDE (caregiver_name)""",
+    """
+    CREATE INDEX IF NOT EXISTS ix_caregiver_match_candidates_rate
+    ON caregiver_match_candidates (caregiving_type, hourly_rate, caregiver_user_id) INCLUDE (city, caregiver_name)""",
+]
+
+
+def _add_appointment_overlap_constraint(conn):
+    if conn.exec_driver_sql(
+        "SELECT 1 FROM pg_constraint WHERE conname = 'ex_appointment_caregiver_overlap'"
+    ).first():
+        return
+    overlaps = conn.exec_driver_sql(
+        "SELECT a.appointment_id, b.appointment_id FROM appointment a JOIN appointment b "
+        "ON a.caregiver_user_id = b.caregiver_user_id AND a.appointment_id < b.appointment_id "
+        "WHERE a.status = 'accepted' AND b.status = 'accepted' AND "
+        "tsrange(a.appointment_date + a.appointment_time, a.appointment_date + a.appointment_time + a.work_hours * interval '1 hour') && "
+        "tsrange(b.appointment_date + b.appointment_time, b.appointment_date + b.appointment_time + b.work_hours * interval '1 hour') "
+        "ORDER BY 1, 2 LIMIT 20"
+    ).all()
+    if overlaps:
+        pairs = ', '.join(f"{a}/{b}" for a, b in overlaps)
+        raise MigrationError(f"accepted appointments overlap, fix them before migrating: {pairs}")
+    # Builds the GiST index under an exclusive lock; there is no concurrent form
+    conn.exec_driver_sql(
+        "ALTER TABLE appointment ADD CONSTRAINT ex_appointment_caregiver_overlap EXCLUDE USING gist ("
+        "caregiver_user_id WITH =, "
+        "tsrange(appointment_date + appointment_time, appointment_date + appointment_time + work_hours * interval '1 hour') WITH &&"
+        ") WHERE (status = 'accepted')"
+    )
+
+
+MIGRATIONS = [
+    Migration(
+        1, "baseline schema",
+        Sql(*BASELINE_SCHEMA),
+    ),
+    Migration(
+        2, "full-text and trigram search indexes",
+        BuildIndexes({
+            'ix_users_name_search': "ON users USING gin (to_tsvector('simple'::regconfig, given_name || ' ' || surname))",
+            'ix_users_profile_search': "ON users USING gin (to_tsvector('simple'::regconfig, given_name || ' ' || surname || ' ' || email || ' ' || city))",
+            'ix_job_search': "ON job USING gin (to_tsvector('simple'::regconfig, required_caregiving_type || ' ' || coalesce(other_requirements, '')))",
+            'ix_users_given_name_trgm': "ON users USING gin (given_name gin_trgm_ops)",
+            'ix_users_surname_trgm': "ON users USING gin (surname gin_trgm_ops)",
+            'ix_users_email_trgm': "ON users USING gin (email gin_trgm_ops)",
+            'ix_users_city_trgm': "ON users USING gin (city gin_trgm_ops)",
+        }),
+    ),
+    Migration(
+        3, "caregiver earnings rollup",
+        Sql(*EARNINGS_ROLLUP),
+    ),
+    Migration(
+        4, "materialized job_applications_view",
+        Sql(*JOB_APPLICATIONS_VIEW),
+    ),
+    Migration(
+        5, "foreign-key and filter indexes",
+        BuildIndexes({
+            'ix_job_member_user_id': "ON job (member_user_id)",
+            'ix_job_application_job_id': "ON job_application (job_id)",
+            'ix_appointment_caregiver_user_id': "ON appointment (caregiver_user_id)",
+            'ix_appointment_member_user_id': "ON appointment (member_user_id)",
+            'ix_appointment_accepted': "ON appointment (caregiver_user_id, work_hours) WHERE status = 'accepted'",
+            'ix_caregiver_caregiving_type': "ON caregiver (caregiving_type, caregiver_user_id)",
+        }),
+    ),
+    Migration(
+        6, "name prefix indexes for the typeahead lookups",
+        BuildIndexes({
+            'ix_users_given_name_prefix': "ON users (lower(given_name) text_pattern_ops)",
+            'ix_users_surname_prefix': "ON users (lower(surname) text_pattern_ops)",
+        }),
+    ),
+    Migration(
+        7, "materialized caregiver_match_candidates",
+        Sql(*CAREGIVER_MATCH_CANDIDATES),
+    ),
+    Migration(
+        8, "no overlapping accepted appointments per caregiver",
+        Sql('CREATE EXTENSION IF NOT EXISTS btree_gist'),
+        Call(_add_appointment_overlap_constraint),
+    ),
+    Migration(
+        9, "appointment (person, date) indexes for the schedules",
+        BuildIndexes({
+            'ix_appointment_caregiver_date': "ON appointment (caregiver_user_id, appointment_date)",
+            'ix_appointment_member_date': "ON appointment (member_user_id, appointment_date)",
+        }),
+        # Their leading columns cover what these served
+        DropIndexes('ix_appointment_caregiver_user_id', 'ix_appointment_member_user_id'),
+    ),
+    Migration(
+        10, "materialized view refresh times",
+        Sql("""
+        CREATE TABLE IF NOT EXISTS materialized_view_refresh (
+            view_name VARCHAR(63) NOT NULL,
+            refreshed_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            PRIMARY KEY (view_name)
+        )"""),
+    ),
+]
+
+
+def _lock_not_available(error):
+    return getattr(error.orig, 'pgcode', None) == '55P03'
+
+
+def _run_step(step, log):
+    for attempt in range(1, LOCK_RETRIES + 1):
+        try:
+            if step.transactional:
+                with engine.begin() as conn:
+                    conn.exec_driver_sql(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+                    step.run(conn, log)
+            else:
+                # Sets lock_timeout on its own connection; a concurrent build
+                # that times out leaves an invalid index, rebuilt on retry
+                step.run(None, log)
+            return
+        except OperationalError as error:
+            if not _lock_not_available(error) or attempt == LOCK_RETRIES:
+                raise
+            log(f"  lock not available, retrying ({attempt}/{LOCK_RETRIES})")
+            time.sleep(attempt)
+
+
+def applied_versions(conn):
+    metadata.create_all(conn)
+    return set(conn.execute(schema_migrations.select().with_only_columns(schema_migrations.c.version)).scalars())
+
+
+def migrate(target=None, log=print):
+    """Apply the pending migrations up to `target` (default: all); returns the versions applied"""
+    versions = [migration.version for migration in MIGRATIONS]
+    if versions != sorted(set(versions)):
+        raise MigrationError("migration versions must be unique and increasing")
+    if target is not None and target not in versions:
+        raise MigrationError(f"unknown migration version {target}")
+
+    applied = []
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as lock_conn:
+        lock_conn.exec_driver_sql(f"SELECT pg_advisory_lock({ADVISORY_LOCK_KEY})")
+        try:
+            done = applied_versions(lock_conn)
+            for migration in MIGRATIONS:
+                if target is not None and migration.version > target:
+                    break
+                if migration.version in done:
+                    continue
+                log(f"Applying {migration.version}: {migration.description}")
+                for step in migration.steps:
+                    _run_step(step, log)
+                lock_conn.execute(schema_migrations.insert().values(
+                    version=migration.version, description=migration.description
+                ))
+                applied.append(migration.version)
+        finally:
+            lock_conn.exec_driver_sql(f"SELECT pg_advisory_unlock({ADVISORY_LOCK_KEY})")
+    return applied
+
+
+def status():
+    """Rows of (version, description, applied_at or None) for every migration"""
+    with engine.begin() as conn:
+        metadata.create_all(conn)
+        applied_at = dict(conn.execute(
+            schema_migrations.select().with_only_columns(schema_migrations.c.version, schema_migrations.c.applied_at)
+        ).all())
+    return [(m.version, m.description, applied_at.get(m.version)) for m in MIGRATIONS]
+
+
+def schema_sql():
+    """The full schema from models.py as a SQL script (what schema.sql holds)"""
+    dialect = engine.dialect
+    statements = [f'DROP TABLE IF EXISTS {table.name} CASCADE' for table in reversed(Base.metadata.sorted_tables)]
+    statements += [f'CREATE EXTENSION IF NOT EXISTS {extension}' for extension in EXTENSIONS]
+    for table in Base.metadata.sorted_tables:
+        statements.append(str(CreateTable(table).compile(dialect=dialect)).strip())
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            statements.append(str(CreateIndex(index).compile(dialect=dialect)))
+    statements += [statement.strip() for statement in EARNINGS_TRIGGERS]
+    for view_statements in MATERIALIZED_VIEWS.values():
+        statements += [statement.strip() for statement in view_statements]
+    header = "-- Generated from models.py by `flask --app app dump-schema`; do not edit by hand\n\n"
+    return header + ';\n\n'.join(statements) + ';\n'
@@ -3,12 +3,17 @@ Database Models for Caregivers Platform
 Shared models for both CLI and web application
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, Date, Time, DECIMAL, Text, ForeignKey, CheckConstraint, func
-from sqlalchemy.orm import sessionmaker, declarative_base, relationship
+from sqlalchemy import create_engine, event, Column, Integer, String, Date, DateTime, Time, DECIMAL, Text, ForeignKey, CheckConstraint, DDL, Index, func, literal_column
+from sqlalchemy.dialects.postgresql import ExcludeConstraint, TSRANGE
+from sqlalchemy.orm import sessionmaker, declarative_base, relationship, query_expression
 from decimal import Decimal
 import os
 import getpass
 
+from pooling import TimedQueuePool
+import cache
+import slowlog
+
 # Create base class for declarative models
 Base = declarative_base()
 
@@ -19,6 +24,13 @@ DB_HOST = os.getenv('DB_HOST', 'localhost')
 DB_PORT = os.getenv('DB_PORT', '5432')
 DB_NAME = os.getenv('DB_NAME', 'caregivers_db')
 
+# Connection pool; size it to the number of worker threads per process
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))  # seconds, -1 to disable
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', '1') == '1'
+
 # Create database connection string
 if DB_PASSWORD:
     DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
@@ -26,8 +38,58 @@ else:
     DATABASE_URL = f"postgresql://{DB_USER}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
 # Create engine and session factory
-engine = create_engine(DATABASE_URL, echo=False)
+engine = create_engine(
+    DATABASE_URL,
+    echo=False,
+    poolclass=TimedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    # Test each connection on checkout; replaces connections dropped by a failover
+    pool_pre_ping=DB_POOL_PRE_PING,
+)
 SessionLocal = sessionmaker(bind=engine)
+# Every process bumps the cached pages' table versions for what it commits
+cache.track_writes(SessionLocal)
+slowlog.install(engine)
+
+# PostgreSQL extensions the indexes and constraints below depend on
+EXTENSIONS = ['pg_trgm', 'btree_gist']
+
+for _extension in EXTENSIONS:
+    event.listen(
+        Base.metadata,
+        'before_create',
+        DDL(f'CREATE EXTENSION IF NOT EXISTS {_extension}').execute_if(dialect='postgresql'))
+
+# Text search configuration shared by the search indexes and the queries that use them
+SEARCH_CONFIG = literal_column("'simple'::regconfig")
+
+
+def user_name_document(user):
+    # `user` may be User or an aliased(User)
+    return func.to_tsvector(SEARCH_CONFIG, user.given_name + ' ' + user.surname)
+
+
+def user_profile_document(user):
+    return func.to_tsvector(
+        SEARCH_CONFIG,
+        user.given_name + ' ' + user.surname + ' ' + user.email + ' ' + user.city
+    )
+
+
+def appointment_period(appointment):
+    # The time an appointment takes, as a tsrange including its start but not its end
+    start = appointment.appointment_date + appointment.appointment_time
+    return func.tsrange(start, start + appointment.work_hours * literal_column("interval '1 hour'"), type_=TSRANGE)
+
+
+def job_document(job):
+    return func.to_tsvector(
+        SEARCH_CONFIG,
+        job.required_caregiving_type + ' ' + func.coalesce(job.other_requirements, '')
+    )
 
 
 class User(Base):
@@ -41,6 +103,16 @@ class User(Base):
     phone_number = Column(String(20), nullable=False)
     profile_description = Column(Text)
     password = Column(String(255), nullable=False)
+
+    search_rank = query_expression()
+
+    # Trigram indexes serve substring (ILIKE '%q%') and fuzzy (similarity) searches
+    __table_args__ = (
+        Index('ix_users_given_name_trgm', 'given_name', postgresql_using='gin', postgresql_ops={'given_name': 'gin_trgm_ops'}),
+        Index('ix_users_surname_trgm', 'surname', postgresql_using='gin', postgresql_ops={'surname': 'gin_trgm_ops'}),
+        Index('ix_users_email_trgm', 'email', postgresql_using='gin', postgresql_ops={'email': 'gin_trgm_ops'}),
+        Index('ix_users_city_trgm', 'city', postgresql_using='gin', postgresql_ops={'city': 'gin_trgm_ops'}),
+    )
     
 
     caregiver = relationship(
@@ -64,10 +136,14 @@ class Caregiver(Base):
     gender = Column(String(20), nullable=False)
     caregiving_type = Column(String(50), nullable=False)
     hourly_rate = Column(DECIMAL(10, 2), nullable=False)
+
+    search_rank = query_expression()
     
 
     __table_args__ = (
         CheckConstraint("caregiving_type IN ('babysitter', 'elderly care', 'playmate for children')", name='check_caregiving_type'),
+        # Type filter on the caregiver list, in page (caregiver_user_id) order
+        Index('ix_caregiver_caregiving_type', 'caregiving_type', 'caregiver_user_id'),
     )
     
 
@@ -82,6 +158,8 @@ class Member(Base):
     member_user_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), primary_key=True)
     house_rules = Column(Text)
     dependent_description = Column(Text)
+
+    search_rank = query_expression()
     
 
     user = relationship("User", back_populates="member")
@@ -110,12 +188,15 @@ class Job(Base):
     required_caregiving_type = Column(String(50), nullable=False)
     other_requirements = Column(Text)
     date_posted = Column(Date, nullable=False)
+
+    search_rank = query_expression()
     
 
     __table_args__ = (
         CheckConstraint(
             "required_caregiving_type IN ('babysitter', 'elderly care', 'playmate for children')", 
             name='check_required_caregiving_type'),
+        Index('ix_job_member_user_id', 'member_user_id'),
     )
     
 
@@ -129,6 +210,13 @@ class JobApplication(Base):
     caregiver_user_id = Column(Integer, ForeignKey('caregiver.caregiver_user_id', ondelete='CASCADE'), primary_key=True)
     job_id = Column(Integer, ForeignKey('job.job_id', ondelete='CASCADE'), primary_key=True)
     date_applied = Column(Date, nullable=False)
+
+    search_rank = query_expression()
+
+    # caregiver_user_id is covered by the primary key
+    __table_args__ = (
+        Index('ix_job_application_job_id', 'job_id'),
+    )
     
 
     caregiver = relationship("Caregiver", back_populates="job_applications")
@@ -145,12 +233,196 @@ class Appointment(Base):
     appointment_time = Column(Time, nullable=False)
     work_hours = Column(DECIMAL(5, 2), nullable=False)
     status = Column(String(20), nullable=False)
+
+    search_rank = query_expression()
     
 
     __table_args__ = (
         CheckConstraint("status IN ('pending', 'accepted', 'declined')", name='check_status'),
+        # Foreign keys, and the date range reads of schedule.py
+        Index('ix_appointment_caregiver_date', 'caregiver_user_id', 'appointment_date'),
+        Index('ix_appointment_member_date', 'member_user_id', 'appointment_date'),
+        # Accepted appointments are what the reports and the earnings rollup read
+        Index('ix_appointment_accepted', 'caregiver_user_id', 'work_hours', postgresql_where=status == 'accepted'),
     )
     
 
     caregiver = relationship("Caregiver", back_populates="appointments")
-    member = relationship("Member", back_populates="appointments")
\ No newline at end of file
+    member = relationship("Member", back_populates="appointments")
+
+
+# Full-text search indexes; see search.py
+User.__table__.append_constraint(
+    Index('ix_users_name_search', user_name_document(User), postgresql_using='gin'))
+User.__table__.append_constraint(
+    Index('ix_users_profile_search', user_profile_document(User), postgresql_using='gin'))
+Job.__table__.append_constraint(
+    Index('ix_job_search', job_document(Job), postgresql_using='gin'))
+
+# A caregiver cannot be booked for two overlapping accepted appointments; see scheduling.py
+Appointment.__table__.append_constraint(ExcludeConstraint(
+    (Appointment.caregiver_user_id, '='), (appointment_period(Appointment), '&&'),
+    name='ex_appointment_caregiver_overlap', using='gist', where=Appointment.status == 'accepted'))
+
+# Prefix lookups (lower(name) LIKE 'q%') for the form typeaheads; see refdata.py
+User.__table__.append_constraint(Index(
+    'ix_users_given_name_prefix', func.lower(User.given_name).label('given_name_lower'),
+    postgresql_ops={'given_name_lower': 'text_pattern_ops'}))
+User.__table__.append_constraint(Index(
+    'ix_users_surname_prefix', func.lower(User.surname).label('surname_lower'),
+    postgresql_ops={'surname_lower': 'text_pattern_ops'}))
+
+
+class CaregiverEarnings(Base):
+    """Accepted appointments, hours and earnings per caregiver
+
+    Maintained by the triggers in EARNINGS_TRIGGERS; earnings are always
+    accepted_hours * the caregiver's current hourly_rate.
+    """
+    __tablename__ = 'caregiver_earnings'
+
+    caregiver_user_id = Column(Integer, ForeignKey('caregiver.caregiver_user_id', ondelete='CASCADE'), primary_key=True)
+    accepted_appointments = Column(Integer, nullable=False, default=0)
+    accepted_hours = Column(DECIMAL(12, 2), nullable=False, default=0)
+    earnings = Column(DECIMAL(16, 4), nullable=False, default=0)
+
+
+    caregiver = relationship("Caregiver")
+
+
+class MaterializedViewRefresh(Base):
+    """When each materialized view was last refreshed (see matviews.refresh)"""
+    __tablename__ = 'materialized_view_refresh'
+
+    view_name = Column(String(63), primary_key=True)
+    refreshed_at = Column(DateTime(timezone=True), nullable=False)
+
+
+def _earnings_upsert(delta):
+    # `delta` yields (caregiver_user_id, appointments, hours) changes; rows are
+    # locked in key order so concurrent writers cannot deadlock
+    return f"""
+        INSERT INTO caregiver_earnings AS e (caregiver_user_id, accepted_appointments, accepted_hours, earnings)
+        SELECT d.caregiver_user_id, d.appointments, d.hours, d.hours * c.hourly_rate
+        FROM (
+            SELECT caregiver_user_id, sum(appointments) AS appointments, sum(hours) AS hours
+            FROM ({delta}) changes GROUP BY caregiver_user_id
+        ) d
+        JOIN caregiver c ON c.caregiver_user_id = d.caregiver_user_id
+        ORDER BY d.caregiver_user_id
+        ON CONFLICT (caregiver_user_id) DO UPDATE SET
+            accepted_appointments = e.accepted_appointments + EXCLUDED.accepted_appointments,
+            accepted_hours = e.accepted_hours + EXCLUDED.accepted_hours,
+            earnings = e.earnings + EXCLUDED.earnings;"""
+
+
+_ACCEPTED_ADDED = "SELECT caregiver_user_id, 1 AS appointments, work_hours AS hours FROM new_rows WHERE status = 'accepted'"
+_ACCEPTED_REMOVED = "SELECT caregiver_user_id, -1 AS appointments, -work_hours AS hours FROM old_rows WHERE status = 'accepted'"
+
+# Statement-level triggers see every changed appointment at once (transition
+# tables), so a bulk insert or status change costs one upsert per caregiver.
+# DROP + CREATE rather than CREATE OR REPLACE TRIGGER, which needs PostgreSQL 14
+EARNINGS_TRIGGERS = [
+    f"""
+    CREATE OR REPLACE FUNCTION caregiver_earnings_appointments() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN{_earnings_upsert(_ACCEPTED_ADDED)}
+        ELSIF TG_OP = 'DELETE' THEN{_earnings_upsert(_ACCEPTED_REMOVED)}
+        ELSE{_earnings_upsert(_ACCEPTED_ADDED + ' UNION ALL ' + _ACCEPTED_REMOVED)}
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS appointment_earnings_insert ON appointment",
+    """
+    CREATE TRIGGER appointment_earnings_insert AFTER INSERT ON appointment
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION caregiver_earnings_appointments()""",
+    "DROP TRIGGER IF EXISTS appointment_earnings_update ON appointment",
+    """
+    CREATE TRIGGER appointment_earnings_update AFTER UPDATE ON appointment
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION caregiver_earnings_appointments()""",
+    "DROP TRIGGER IF EXISTS appointment_earnings_delete ON appointment",
+    """
+    CREATE TRIGGER appointment_earnings_delete AFTER DELETE ON appointment
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION caregiver_earnings_appointments()""",
+    """
+    CREATE OR REPLACE FUNCTION caregiver_earnings_rate() RETURNS trigger AS $$
+    BEGIN
+        UPDATE caregiver_earnings SET earnings = accepted_hours * NEW.hourly_rate
+        WHERE caregiver_user_id = NEW.caregiver_user_id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS caregiver_earnings_rate ON caregiver",
+    """
+    CREATE TRIGGER caregiver_earnings_rate AFTER UPDATE OF hourly_rate ON caregiver
+    FOR EACH ROW WHEN (OLD.hourly_rate IS DISTINCT FROM NEW.hourly_rate)
+    EXECUTE FUNCTION caregiver_earnings_rate()""",
+]
+
+# After all tables exist, since the triggers live on appointment and caregiver
+for _statement in EARNINGS_TRIGGERS:
+    event.listen(Base.metadata, 'after_create', DDL(_statement).execute_if(dialect='postgresql'))
+
+
+# Materialized views: name -> statements that create it and its indexes.
+# The unique index is what allows REFRESH MATERIALIZED VIEW CONCURRENTLY; see matviews.py
+MATERIALIZED_VIEWS = {
+    'job_applications_view': [
+        """
+        CREATE MATERIALIZED VIEW IF NOT EXISTS job_applications_view AS
+        SELECT
+            ja.job_id,
+            j.required_caregiving_type,
+            j.other_requirements,
+            j.date_posted,
+            ja.caregiver_user_id,
+            u.given_name || ' ' || u.surname AS applicant_name,
+            c.caregiving_type,
+            c.hourly_rate,
+            ja.date_applied
+        FROM job_application ja
+        JOIN job j ON ja.job_id = j.job_id
+        JOIN caregiver c ON ja.caregiver_user_id = c.caregiver_user_id
+        JOIN users u ON c.caregiver_user_id = u.user_id""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_job_applications_view ON job_applications_view (job_id, caregiver_user_id)",
+        # Serves ORDER BY job_id, date_applied as an index-only scan
+        """
+        CREATE INDEX IF NOT EXISTS ix_job_applications_view_applied ON job_applications_view (job_id, date_applied)
+        INCLUDE (applicant_name, required_caregiving_type)""",
+    ],
+    # Caregiver matching candidates (see matching.py), with the caregiver's city
+    # next to the type and rate so both rankings are ordered index scans
+    'caregiver_match_candidates': [
+        """
+        CREATE MATERIALIZED VIEW IF NOT EXISTS caregiver_match_candidates AS
+        SELECT
+            c.caregiver_user_id,
+            c.caregiving_type,
+            u.city,
+            c.hourly_rate,
+            u.given_name || ' ' || u.surname AS caregiver_name
+        FROM caregiver c
+        JOIN users u ON c.caregiver_user_id = u.user_id""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_caregiver_match_candidates ON caregiver_match_candidates (caregiver_user_id)",
+        # Same-city candidates, cheapest first
+        """
+        CREATE INDEX IF NOT EXISTS ix_caregiver_match_candidates_city
+        ON caregiver_match_candidates (caregiving_type, city, hourly_rate, caregiver_user_id) INCLUDE (caregiver_name)""",
+        # Everyone else, cheapest first
+        """
+        CREATE INDEX IF NOT EXISTS ix_caregiver_match_candidates_rate
+        ON caregiver_match_candidates (caregiving_type, hourly_rate, caregiver_user_id) INCLUDE (city, caregiver_name)""",
+    ],
+}
+
+for _name, _statements in MATERIALIZED_VIEWS.items():
+    for _statement in _statements:
+        event.listen(Base.metadata, 'after_create', DDL(_statement).execute_if(dialect='postgresql'))
+    event.listen(
+        Base.metadata,
+        'before_drop',
+        DDL(f'DROP MATERIALIZED VIEW IF EXISTS {_name}').execute_if(dialect='postgresql'))
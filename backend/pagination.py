@@ -0,0 +1,140 @@
+"""
+Keyset (cursor) pagination for list views
+Pages are addressed by the key of their first or last row instead of an
+OFFSET, so a deep page costs the same as the first one
+"""
+
+import base64
+import json
+import os
+
+from flask import request, url_for
+from sqlalchemy import BigInteger, tuple_
+
+
+PAGE_SIZE = int(os.getenv('PAGE_SIZE', '50'))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', '500'))
+
+
+class Page:
+    def __init__(self, items, next_cursor=None, prev_cursor=None, per_page=PAGE_SIZE):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.per_page = per_page
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _fits(key, value):
+    # Whether `value` can be compared with the `key` column without a database error
+    python_type = key.type.python_type
+    if isinstance(value, bool):
+        return False
+    if python_type is int:
+        bits = 64 if isinstance(key.type, BigInteger) else 32
+        return isinstance(value, int) and -2 ** (bits - 1) <= value < 2 ** (bits - 1)
+    if python_type is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, python_type)
+
+
+def decode_cursor(cursor, keys):
+    # Malformed cursors are treated as "no cursor" rather than an error
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        return None
+    if not isinstance(values, list) or len(values) != len(keys):
+        return None
+    if not all(_fits(key, value) for key, value in zip(keys, values)):
+        return None
+    return values
+
+
+def _key_values(item, keys):
+    return [getattr(item, key.key) for key in keys]
+
+
+def paginate(query, keys, after=None, before=None, per_page=PAGE_SIZE, key_func=None, descending=False):
+    """Return one Page of `query` ordered by `keys` (a unique key, primary key last)"""
+    key_func = key_func or (lambda item: _key_values(item, keys))
+    key = tuple_(*keys) if len(keys) > 1 else keys[0]
+    after = decode_cursor(after, keys)
+    before = decode_cursor(before, keys) if after is None else None
+
+    def bound(values):
+        return tuple_(*values) if len(keys) > 1 else values[0]
+
+    def forward(values):
+        return key < bound(values) if descending else key > bound(values)
+
+    def backward(values):
+        return key > bound(values) if descending else key < bound(values)
+
+    forward_order = [k.desc() for k in keys] if descending else list(keys)
+    backward_order = list(keys) if descending else [k.desc() for k in keys]
+
+    if before is not None:
+        rows = query.filter(backward(before)).order_by(*backward_order).limit(per_page + 1).all()
+        has_prev = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_next = True
+    else:
+        if after is not None:
+            query = query.filter(forward(after))
+        rows = query.order_by(*forward_order).limit(per_page + 1).all()
+        items = rows[:per_page]
+        has_next = len(rows) > per_page
+        has_prev = after is not None
+
+    next_cursor = encode_cursor(key_func(items[-1])) if items and has_next else None
+    prev_cursor = encode_cursor(key_func(items[0])) if items and has_prev else None
+    return Page(items, next_cursor, prev_cursor, per_page)
+
+
+def per_page_arg():
+    per_page = request.args.get('per_page', type=int) or PAGE_SIZE
+    return max(1, min(per_page, MAX_PAGE_SIZE))
+
+
+def paginate_request(query, keys, search_rank=None, **kwargs):
+    """paginate() driven by the after/before/per_page query-string arguments
+
+    With a `search_rank` expression (see search.apply) rows come best match
+    first, ties broken by `keys`.
+    """
+    if search_rank is not None:
+        pk = keys
+        keys = [search_rank] + list(pk)
+        kwargs.update(
+            descending=True,
+            key_func=lambda item: [item.search_rank] + _key_values(item, pk)
+        )
+    return paginate(
+        query,
+        keys,
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        per_page=per_page_arg(),
+        **kwargs
+    )
+
+
+def page_url(**cursor):
+    # Current URL with its filters kept and the cursor arguments swapped
+    args = {k: v for k, v in request.args.items() if k not in ('after', 'before')}
+    args.update({k: v for k, v in cursor.items() if v})
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
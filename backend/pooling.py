@@ -0,0 +1,72 @@
+"""
+Connection pool with checkout timing
+A QueuePool that records how long each checkout took (waiting for a free
+connection, or opening a new one) so the pool can be sized to the workers
+"""
+
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+
+# Checkouts slower than this (seconds) are logged with the pool state
+SLOW_CHECKOUT = float(os.getenv('DB_POOL_SLOW_CHECKOUT', '0.5'))
+
+logger = logging.getLogger(__name__)
+
+
+class TimedQueuePool(QueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_time_total = 0.0
+        self.checkout_time_max = 0.0
+        self.slow_checkouts = 0
+        self.timeouts = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.checkout_time_total += elapsed
+                self.checkout_time_max = max(self.checkout_time_max, elapsed)
+                self.slow_checkouts += elapsed > SLOW_CHECKOUT
+                self.timeouts += timed_out
+            if elapsed > SLOW_CHECKOUT:
+                logger.warning("slow connection checkout (%.3fs): %s", elapsed, pool_stats(self))
+
+
+def pool_stats(pool):
+    """Current state and checkout timings of a pool (see TimedQueuePool)"""
+    stats = {
+        'pool_size': pool.size(),
+        'max_overflow': pool._max_overflow,
+        'checked_out': pool.checkedout(),
+        'checked_in': pool.checkedin(),
+        # QueuePool counts overflow from -pool_size
+        'overflow': max(pool.overflow(), 0),
+        'timeout': pool.timeout(),
+    }
+    if isinstance(pool, TimedQueuePool):
+        stats.update({
+            'checkouts': pool.checkouts,
+            'checkout_time_total': round(pool.checkout_time_total, 6),
+            'checkout_time_avg': round(pool.checkout_time_total / pool.checkouts, 6) if pool.checkouts else 0.0,
+            'checkout_time_max': round(pool.checkout_time_max, 6),
+            'slow_checkouts': pool.slow_checkouts,
+            'timeouts': pool.timeouts,
+        })
+    return stats
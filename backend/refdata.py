@@ -0,0 +1,115 @@
+"""
+Reference data for the form selectors
+Compact (id, name, type) rows for caregivers, members and jobs, looked up by
+name prefix for the typeahead fields (see lookup.py) so a form never loads
+the whole roster. Each word of the query must start the given name or the
+surname; the lower(name) text_pattern_ops indexes on users serve the match.
+An empty query matches nothing, since no index could order the whole
+roster by name. Results are not cached: each keystroke is a new query, and
+caching them would push the list pages out of the response cache.
+"""
+
+import os
+from collections import namedtuple
+
+from sqlalchemy import func, null, or_
+
+from models import User, Caregiver, Member, Job
+
+
+LOOKUP_LIMIT = int(os.getenv('LOOKUP_LIMIT', '10'))
+LOOKUP_MAX_LIMIT = 50
+# Shorter queries return no options (keep in step with static/js/typeahead.js)
+LOOKUP_MIN_CHARS = 1
+
+Option = namedtuple('Option', 'id name type')
+
+
+def _name(user):
+    return user.given_name + ' ' + user.surname
+
+
+def _like_prefix(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def _name_prefix(query, words):
+    for word in words:
+        pattern = _like_prefix(word)
+        query = query.filter(or_(
+            func.lower(User.given_name).like(pattern, escape='\\'),
+            func.lower(User.surname).like(pattern, escape='\\'),
+        ))
+    return query
+
+
+def _lookup(db, query, words, limit):
+    if len(''.join(words)) < LOOKUP_MIN_CHARS:
+        return []
+    return [Option(*row) for row in db.execute(query.limit(limit).statement)]
+
+
+def _words(q):
+    return q.lower().split()
+
+
+def caregivers(db, q='', caregiving_type=None, limit=LOOKUP_LIMIT):
+    """Caregivers as Option(caregiver_user_id, name, caregiving_type) whose name matches `q`, by name"""
+    words = _words(q)
+    query = _name_prefix(db.query(Caregiver.caregiver_user_id, _name(User), Caregiver.caregiving_type).join(
+        User, User.user_id == Caregiver.caregiver_user_id
+    ), words)
+    if caregiving_type:
+        query = query.filter(Caregiver.caregiving_type == caregiving_type)
+    query = query.order_by(func.lower(User.given_name), func.lower(User.surname), Caregiver.caregiver_user_id)
+    return _lookup(db, query, words, limit)
+
+
+def members(db, q='', limit=LOOKUP_LIMIT):
+    """Members as Option(member_user_id, name, None) whose name matches `q`, by name"""
+    words = _words(q)
+    query = _name_prefix(db.query(Member.member_user_id, _name(User), null()).join(
+        User, User.user_id == Member.member_user_id
+    ), words)
+    query = query.order_by(func.lower(User.given_name), func.lower(User.surname), Member.member_user_id)
+    return _lookup(db, query, words, limit)
+
+
+def jobs(db, q='', caregiving_type=None, limit=LOOKUP_LIMIT):
+    """Jobs as Option(job_id, posting member's name, required_caregiving_type), newest first
+
+    `q` is a job id or a prefix of the posting member's name.
+    """
+    words = _words(q)
+    query = db.query(Job.job_id, _name(User), Job.required_caregiving_type).join(
+        User, User.user_id == Job.member_user_id
+    )
+    job_id = words[0].lstrip('#') if len(words) == 1 else ''
+    if job_id.isdigit() and len(job_id) < 10:
+        query = query.filter(Job.job_id == int(job_id))
+    else:
+        query = _name_prefix(query, words)
+    if caregiving_type:
+        query = query.filter(Job.required_caregiving_type == caregiving_type)
+    query = query.order_by(Job.job_id.desc())
+    return _lookup(db, query, words, limit)
+
+
+def label(kind, option):
+    """How a selected option is shown in its form field"""
+    if kind == 'caregiver':
+        return f"{option.name} ({option.type})"
+    if kind == 'job':
+        return f"Job #{option.id} - {option.type} ({option.name})"
+    return option.name
+
+
+def record_label(kind, record):
+    """label() for a Caregiver, Member or Job row, e.g. the current value of an edit form"""
+    if kind == 'caregiver':
+        option = Option(record.caregiver_user_id, _name(record.user), record.caregiving_type)
+    elif kind == 'job':
+        option = Option(record.job_id, _name(record.member.user), record.required_caregiving_type)
+    else:
+        option = Option(record.member_user_id, _name(record.user), None)
+    return label(kind, option)
@@ -0,0 +1,81 @@
+"""
+Reporting queries
+Aggregates are computed by the database with GROUP BY; rows are never
+loaded into Python just to be counted. Earnings figures are read from the
+caregiver_earnings rollup, which is sized by caregivers, not appointments.
+"""
+
+from sqlalchemy import func, select
+
+from models import User, Caregiver, Job, JobApplication, Appointment, CaregiverEarnings
+
+
+def applicant_counts_query(db):
+    """Rows of (job_id, member_name, applicants) for every job, in job_id order; jobs with no applicants count 0"""
+    return db.query(
+        Job.job_id,
+        (User.given_name + ' ' + User.surname).label('member_name'),
+        func.count(JobApplication.caregiver_user_id).label('applicants')
+    ).join(
+        User, Job.member_user_id == User.user_id
+    ).outerjoin(
+        JobApplication, JobApplication.job_id == Job.job_id
+    ).group_by(Job.job_id, User.user_id).order_by(Job.job_id)
+
+
+def applicant_counts(db, job_ids):
+    """{job_id: number of applicants} for the given jobs (e.g. one page of a list)"""
+    job_ids = list(job_ids)
+    if not job_ids:
+        return {}
+    rows = db.query(
+        Job.job_id, func.count(JobApplication.caregiver_user_id)
+    ).outerjoin(
+        JobApplication, JobApplication.job_id == Job.job_id
+    ).filter(Job.job_id.in_(job_ids)).group_by(Job.job_id)
+    return dict(rows.all())
+
+
+def total_accepted_hours(db):
+    return db.query(func.coalesce(func.sum(CaregiverEarnings.accepted_hours), 0)).scalar()
+
+
+def total_earnings(db):
+    return db.query(func.coalesce(func.sum(CaregiverEarnings.earnings), 0)).scalar()
+
+
+def _average_pay():
+    # Average of hourly_rate * work_hours over all accepted appointments
+    return select(
+        func.sum(CaregiverEarnings.earnings) / func.nullif(func.sum(CaregiverEarnings.accepted_appointments), 0)
+    ).scalar_subquery()
+
+
+def average_pay(db):
+    """Average pay per accepted appointment, or None when there are none"""
+    return db.query(_average_pay()).scalar()
+
+
+def above_average_earners(db):
+    """Rows of (caregiver_name, earnings) for caregivers whose total earnings exceed the average pay"""
+    return db.query(
+        (User.given_name + ' ' + User.surname).label('caregiver_name'),
+        CaregiverEarnings.earnings
+    ).join(
+        User, User.user_id == CaregiverEarnings.caregiver_user_id
+    ).filter(CaregiverEarnings.earnings > _average_pay()).order_by(CaregiverEarnings.earnings.desc()).all()
+
+
+def accepted_appointment_costs(db):
+    """Rows of (appointment_id, caregiver_name, hourly_rate, work_hours, cost) for every accepted appointment"""
+    return db.query(
+        Appointment.appointment_id,
+        (User.given_name + ' ' + User.surname).label('caregiver_name'),
+        Caregiver.hourly_rate,
+        Appointment.work_hours,
+        (Caregiver.hourly_rate * Appointment.work_hours).label('cost')
+    ).join(
+        Caregiver, Caregiver.caregiver_user_id == Appointment.caregiver_user_id
+    ).join(
+        User, User.user_id == Caregiver.caregiver_user_id
+    ).filter(Appointment.status == 'accepted').order_by(Appointment.appointment_id).all()
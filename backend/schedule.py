@@ -0,0 +1,172 @@
+"""
+Caregiver and member schedules
+A week or month of appointments for one caregiver or member, read with a
+single range query on (caregiver_user_id, appointment_date) or
+(member_user_id, appointment_date), so the cost depends on the period shown
+and not on how many years of history the person has. Each day lists its
+appointments, the hours booked by accepted ones and the free slots left in
+the working day.
+"""
+
+import calendar
+import math
+import os
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy.orm import aliased
+
+from models import User, Appointment
+from scheduling import period
+
+
+DAY_START = time(int(os.getenv('SCHEDULE_DAY_START', '8')))
+DAY_END = time(int(os.getenv('SCHEDULE_DAY_END', '20')))
+VIEWS = ('week', 'month')
+
+
+def _spill_days():
+    # Days before a period an appointment can start and still reach into it
+    hours = Appointment.__table__.c.work_hours.type
+    return math.ceil((10 ** (hours.precision - hours.scale)) / 24)
+
+
+SPILL_DAYS = _spill_days()
+
+# Dates this close to date.min or date.max would take the grid, the days read
+# before it or an appointment's end past them
+_MARGIN = timedelta(days=SPILL_DAYS + 45)
+FIRST_START = date.min + _MARGIN
+LAST_START = date.max - _MARGIN
+
+
+class Entry:
+    """The part of an appointment that falls on one day"""
+
+    def __init__(self, appointment_id, start, end, status, with_name):
+        self.appointment_id = appointment_id
+        self.start = start
+        self.end = end
+        self.status = status
+        self.with_name = with_name
+
+    @property
+    def hours(self):
+        return (self.end - self.start).total_seconds() / 3600
+
+
+class Day:
+    def __init__(self, day, in_period):
+        self.date = day
+        self.in_period = in_period
+        self.entries = []
+
+    @property
+    def booked_hours(self):
+        return sum(entry.hours for entry in self.entries if entry.status == 'accepted')
+
+    @property
+    def free_slots(self):
+        """(start, end) datetimes of the working day not taken by accepted appointments"""
+        slots = []
+        free_from = datetime.combine(self.date, DAY_START)
+        day_end = datetime.combine(self.date, DAY_END)
+        for entry in sorted(self.entries, key=lambda entry: entry.start):
+            if entry.status != 'accepted':
+                continue
+            if entry.start > free_from:
+                slots.append((free_from, min(entry.start, day_end)))
+            free_from = max(free_from, entry.end)
+            if free_from >= day_end:
+                break
+        if free_from < day_end:
+            slots.append((free_from, day_end))
+        return [(start, end) for start, end in slots if start < end]
+
+
+class Schedule:
+    def __init__(self, view, first, last, days):
+        self.view = view
+        self.first = first
+        self.last = last
+        self.days = days
+
+    @property
+    def weeks(self):
+        return [self.days[index:index + 7] for index in range(0, len(self.days), 7)]
+
+    @property
+    def booked_hours(self):
+        return sum(day.booked_hours for day in self.days if day.in_period)
+
+    @property
+    def previous_start(self):
+        if self.view == 'week':
+            return self.first - timedelta(days=7)
+        return (self.first - timedelta(days=1)).replace(day=1)
+
+    @property
+    def next_start(self):
+        return self.last + timedelta(days=1)
+
+
+def period_bounds(view, start):
+    """First and last day of the week (from Monday) or month containing `start`"""
+    if view == 'week':
+        first = start - timedelta(days=start.weekday())
+        return first, first + timedelta(days=6)
+    first = start.replace(day=1)
+    return first, first.replace(day=calendar.monthrange(first.year, first.month)[1])
+
+
+def _schedule(db, person_column, other_column, person_id, view, start):
+    first, last = period_bounds(view, start)
+    # Months are shown as whole weeks
+    grid_first = first - timedelta(days=first.weekday())
+    grid_last = last + timedelta(days=6 - last.weekday())
+    days = {}
+    day = grid_first
+    while day <= grid_last:
+        days[day] = Day(day, first <= day <= last)
+        day += timedelta(days=1)
+
+    other = aliased(User)
+    rows = db.query(
+        Appointment.appointment_id,
+        Appointment.appointment_date,
+        Appointment.appointment_time,
+        Appointment.work_hours,
+        Appointment.status,
+        (other.given_name + ' ' + other.surname).label('with_name'),
+    ).join(
+        other, other.user_id == other_column
+    ).filter(
+        person_column == person_id,
+        Appointment.appointment_date.between(grid_first - timedelta(days=SPILL_DAYS), grid_last),
+    ).order_by(Appointment.appointment_date, Appointment.appointment_time).all()
+
+    for row in rows:
+        start_at, end_at = period(row.appointment_date, row.appointment_time, row.work_hours)
+        # Split appointments that run past midnight across the days they cover
+        while start_at < end_at:
+            day_end = datetime.combine(start_at.date() + timedelta(days=1), time())
+            piece_end = min(end_at, day_end)
+            if start_at.date() in days:
+                days[start_at.date()].entries.append(
+                    Entry(row.appointment_id, start_at, piece_end, row.status, row.with_name)
+                )
+            start_at = piece_end
+    return Schedule(view, first, last, list(days.values()))
+
+
+def caregiver_schedule(db, caregiver_user_id, view='week', start=None):
+    """The Schedule of a caregiver for the week or month containing `start` (default: today)"""
+    return _schedule(
+        db, Appointment.caregiver_user_id, Appointment.member_user_id, caregiver_user_id, view, start or date.today()
+    )
+
+
+def member_schedule(db, member_user_id, view='week', start=None):
+    """The Schedule of a member for the week or month containing `start` (default: today)"""
+    return _schedule(
+        db, Appointment.member_user_id, Appointment.caregiver_user_id, member_user_id, view, start or date.today()
+    )
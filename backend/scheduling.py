@@ -0,0 +1,87 @@
+"""
+Appointment scheduling
+An appointment takes its caregiver from appointment_date + appointment_time
+for work_hours (models.appointment_period). Accepted appointments of one
+caregiver may not overlap: the ex_appointment_caregiver_overlap exclusion
+constraint enforces it, and check_booking() looks for the clashes first,
+through that constraint's GiST index, so a form can say what is in the way.
+Two bookings racing each other can both pass that check; commit_booking()
+reports the one the constraint then rejects the same way.
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from models import Appointment, appointment_period
+
+
+MAX_REPORTED_CONFLICTS = 5
+OVERLAP_CONSTRAINT = 'ex_appointment_caregiver_overlap'
+
+
+class AppointmentConflict(ValueError):
+    pass
+
+
+def period(appointment_date, appointment_time, work_hours):
+    """(start, end) of an appointment as datetimes; the end is exclusive"""
+    start = datetime.combine(appointment_date, appointment_time)
+    return start, start + timedelta(hours=float(work_hours))
+
+
+def conflicts(db, caregiver_user_id, start, end, exclude_appointment_id=None):
+    """Query for the caregiver's accepted appointments overlapping [start, end), earliest first"""
+    query = db.query(Appointment).filter(
+        Appointment.caregiver_user_id == caregiver_user_id,
+        Appointment.status == 'accepted',
+        appointment_period(Appointment).op('&&')(func.tsrange(start, end)),
+    )
+    if exclude_appointment_id is not None:
+        query = query.filter(Appointment.appointment_id != exclude_appointment_id)
+    return query.order_by(Appointment.appointment_date, Appointment.appointment_time)
+
+
+def _describe(appointment):
+    start, end = period(appointment.appointment_date, appointment.appointment_time, appointment.work_hours)
+    return f"#{appointment.appointment_id} on {start:%Y-%m-%d} {start:%H:%M}-{end:%H:%M}"
+
+
+def _conflict(clashes):
+    message = "The caregiver already has accepted appointments at that time"
+    if clashes:
+        message += ": " + ', '.join(_describe(clash) for clash in clashes)
+    return AppointmentConflict(message)
+
+
+def check_booking(db, appointment):
+    """Raise AppointmentConflict if saving `appointment` would double-book its caregiver"""
+    if appointment.work_hours <= 0:
+        raise ValueError("Work hours must be greater than 0")
+    if appointment.status != 'accepted':
+        return
+    start, end = period(appointment.appointment_date, appointment.appointment_time, appointment.work_hours)
+    # Without this the pending changes would be flushed, and the constraint would fire first
+    with db.no_autoflush:
+        clashes = conflicts(
+            db, appointment.caregiver_user_id, start, end, appointment.appointment_id
+        ).limit(MAX_REPORTED_CONFLICTS).all()
+    if clashes:
+        raise _conflict(clashes)
+
+
+def commit_booking(db, appointment):
+    """Commit the session saving `appointment`; raise AppointmentConflict if
+    the overlap constraint rejects it (a concurrent booking got there first)"""
+    # Read now: the rollback expires or expunges the appointment
+    caregiver_user_id, appointment_id = appointment.caregiver_user_id, appointment.appointment_id
+    start, end = period(appointment.appointment_date, appointment.appointment_time, appointment.work_hours)
+    try:
+        db.commit()
+    except IntegrityError as error:
+        if getattr(getattr(error.orig, 'diag', None), 'constraint_name', None) != OVERLAP_CONSTRAINT:
+            raise
+        db.rollback()
+        clashes = conflicts(db, caregiver_user_id, start, end, appointment_id).limit(MAX_REPORTED_CONFLICTS).all()
+        raise _conflict(clashes) from error
@@ -1,73 +1,261 @@
-DROP TABLE IF EXISTS appointment CASCADE;
+-- Generated from models.py by `flask --app app dump-schema`; do not edit by hand
+
 DROP TABLE IF EXISTS job_application CASCADE;
+
 DROP TABLE IF EXISTS job CASCADE;
+
+DROP TABLE IF EXISTS caregiver_earnings CASCADE;
+
+DROP TABLE IF EXISTS appointment CASCADE;
+
 DROP TABLE IF EXISTS address CASCADE;
+
 DROP TABLE IF EXISTS member CASCADE;
+
 DROP TABLE IF EXISTS caregiver CASCADE;
-DROP TABLE IF EXISTS "user" CASCADE;
-
-CREATE TABLE "user" (
-    user_id SERIAL PRIMARY KEY,
-    email VARCHAR(255) UNIQUE NOT NULL,
-    given_name VARCHAR(100) NOT NULL,
-    surname VARCHAR(100) NOT NULL,
-    city VARCHAR(100) NOT NULL,
-    phone_number VARCHAR(20) NOT NULL,
-    profile_description TEXT,
-    password VARCHAR(255) NOT NULL
+
+DROP TABLE IF EXISTS users CASCADE;
+
+DROP TABLE IF EXISTS materialized_view_refresh CASCADE;
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+CREATE TABLE materialized_view_refresh (
+	view_name VARCHAR(63) NOT NULL, 
+	refreshed_at TIMESTAMP WITH TIME ZONE NOT NULL, 
+	PRIMARY KEY (view_name)
 );
 
+CREATE TABLE users (
+	user_id SERIAL NOT NULL, 
+	email VARCHAR(255) NOT NULL, 
+	given_name VARCHAR(100) NOT NULL, 
+	surname VARCHAR(100) NOT NULL, 
+	city VARCHAR(100) NOT NULL, 
+	phone_number VARCHAR(20) NOT NULL, 
+	profile_description TEXT, 
+	password VARCHAR(255) NOT NULL, 
+	PRIMARY KEY (user_id), 
+	UNIQUE (email)
+);
+
+CREATE INDEX ix_users_city_trgm ON users USING gin (city gin_trgm_ops);
+
+CREATE INDEX ix_users_email_trgm ON users USING gin (email gin_trgm_ops);
+
+CREATE INDEX ix_users_given_name_prefix ON users (lower(given_name) text_pattern_ops);
+
+CREATE INDEX ix_users_given_name_trgm ON users USING gin (given_name gin_trgm_ops);
+
+CREATE INDEX ix_users_name_search ON users USING gin (to_tsvector('simple'::regconfig, given_name || ' ' || surname));
+
+CREATE INDEX ix_users_profile_search ON users USING gin (to_tsvector('simple'::regconfig, given_name || ' ' || surname || ' ' || email || ' ' || city));
+
+CREATE INDEX ix_users_surname_prefix ON users (lower(surname) text_pattern_ops);
+
+CREATE INDEX ix_users_surname_trgm ON users USING gin (surname gin_trgm_ops);
+
 CREATE TABLE caregiver (
-    caregiver_user_id INTEGER PRIMARY KEY,
-    photo VARCHAR(255),
-    gender VARCHAR(20) NOT NULL,
-    caregiving_type VARCHAR(50) NOT NULL CHECK (caregiving_type IN ('babysitter', 'elderly care', 'playmate for children')),
-    hourly_rate DECIMAL(10, 2) NOT NULL,
-    FOREIGN KEY (caregiver_user_id) REFERENCES "user"(user_id) ON DELETE CASCADE
+	caregiver_user_id INTEGER NOT NULL, 
+	photo VARCHAR(255), 
+	gender VARCHAR(20) NOT NULL, 
+	caregiving_type VARCHAR(50) NOT NULL, 
+	hourly_rate DECIMAL(10, 2) NOT NULL, 
+	PRIMARY KEY (caregiver_user_id), 
+	CONSTRAINT check_caregiving_type CHECK (caregiving_type IN ('babysitter', 'elderly care', 'playmate for children')), 
+	FOREIGN KEY(caregiver_user_id) REFERENCES users (user_id) ON DELETE CASCADE
 );
 
+CREATE INDEX ix_caregiver_caregiving_type ON caregiver (caregiving_type, caregiver_user_id);
+
 CREATE TABLE member (
-    member_user_id INTEGER PRIMARY KEY,
-    house_rules TEXT,
-    dependent_description TEXT,
-    FOREIGN KEY (member_user_id) REFERENCES "user"(user_id) ON DELETE CASCADE
+	member_user_id INTEGER NOT NULL, 
+	house_rules TEXT, 
+	dependent_description TEXT, 
+	PRIMARY KEY (member_user_id), 
+	FOREIGN KEY(member_user_id) REFERENCES users (user_id) ON DELETE CASCADE
 );
 
 CREATE TABLE address (
-    member_user_id INTEGER PRIMARY KEY,
-    house_number VARCHAR(20) NOT NULL,
-    street VARCHAR(255) NOT NULL,
-    town VARCHAR(100) NOT NULL,
-    FOREIGN KEY (member_user_id) REFERENCES member(member_user_id) ON DELETE CASCADE
+	member_user_id INTEGER NOT NULL, 
+	house_number VARCHAR(20) NOT NULL, 
+	street VARCHAR(255) NOT NULL, 
+	town VARCHAR(100) NOT NULL, 
+	PRIMARY KEY (member_user_id), 
+	FOREIGN KEY(member_user_id) REFERENCES member (member_user_id) ON DELETE CASCADE
+);
+
+CREATE TABLE appointment (
+	appointment_id SERIAL NOT NULL, 
+	caregiver_user_id INTEGER NOT NULL, 
+	member_user_id INTEGER NOT NULL, 
+	appointment_date DATE NOT NULL, 
+	appointment_time TIME WITHOUT TIME ZONE NOT NULL, 
+	work_hours DECIMAL(5, 2) NOT NULL, 
+	status VARCHAR(20) NOT NULL, 
+	PRIMARY KEY (appointment_id), 
+	CONSTRAINT check_status CHECK (status IN ('pending', 'accepted', 'declined')), 
+	FOREIGN KEY(caregiver_user_id) REFERENCES caregiver (caregiver_user_id) ON DELETE CASCADE, 
+	FOREIGN KEY(member_user_id) REFERENCES member (member_user_id) ON DELETE CASCADE, 
+	CONSTRAINT ex_appointment_caregiver_overlap EXCLUDE USING gist (caregiver_user_id WITH =, tsrange(appointment_date + appointment_time, appointment_date + appointment_time + work_hours * interval '1 hour') WITH &&) WHERE (appointment.status = 'accepted')
+);
+
+CREATE INDEX ix_appointment_accepted ON appointment (caregiver_user_id, work_hours) WHERE status = 'accepted';
+
+CREATE INDEX ix_appointment_caregiver_date ON appointment (caregiver_user_id, appointment_date);
+
+CREATE INDEX ix_appointment_member_date ON appointment (member_user_id, appointment_date);
+
+CREATE TABLE caregiver_earnings (
+	caregiver_user_id INTEGER NOT NULL, 
+	accepted_appointments INTEGER NOT NULL, 
+	accepted_hours DECIMAL(12, 2) NOT NULL, 
+	earnings DECIMAL(16, 4) NOT NULL, 
+	PRIMARY KEY (caregiver_user_id), 
+	FOREIGN KEY(caregiver_user_id) REFERENCES caregiver (caregiver_user_id) ON DELETE CASCADE
 );
 
 CREATE TABLE job (
-    job_id SERIAL PRIMARY KEY,
-    member_user_id INTEGER NOT NULL,
-    required_caregiving_type VARCHAR(50) NOT NULL CHECK (required_caregiving_type IN ('babysitter', 'elderly care', 'playmate for children')),
-    other_requirements TEXT,
-    date_posted DATE NOT NULL,
-    FOREIGN KEY (member_user_id) REFERENCES member(member_user_id) ON DELETE CASCADE
+	job_id SERIAL NOT NULL, 
+	member_user_id INTEGER NOT NULL, 
+	required_caregiving_type VARCHAR(50) NOT NULL, 
+	other_requirements TEXT, 
+	date_posted DATE NOT NULL, 
+	PRIMARY KEY (job_id), 
+	CONSTRAINT check_required_caregiving_type CHECK (required_caregiving_type IN ('babysitter', 'elderly care', 'playmate for children')), 
+	FOREIGN KEY(member_user_id) REFERENCES member (member_user_id) ON DELETE CASCADE
 );
 
+CREATE INDEX ix_job_member_user_id ON job (member_user_id);
+
+CREATE INDEX ix_job_search ON job USING gin (to_tsvector('simple'::regconfig, required_caregiving_type || ' ' || coalesce(other_requirements, '')));
+
 CREATE TABLE job_application (
-    caregiver_user_id INTEGER NOT NULL,
-    job_id INTEGER NOT NULL,
-    date_applied DATE NOT NULL,
-    PRIMARY KEY (caregiver_user_id, job_id),
-    FOREIGN KEY (caregiver_user_id) REFERENCES caregiver(caregiver_user_id) ON DELETE CASCADE,
-    FOREIGN KEY (job_id) REFERENCES job(job_id) ON DELETE CASCADE
+	caregiver_user_id INTEGER NOT NULL, 
+	job_id INTEGER NOT NULL, 
+	date_applied DATE NOT NULL, 
+	PRIMARY KEY (caregiver_user_id, job_id), 
+	FOREIGN KEY(caregiver_user_id) REFERENCES caregiver (caregiver_user_id) ON DELETE CASCADE, 
+	FOREIGN KEY(job_id) REFERENCES job (job_id) ON DELETE CASCADE
 );
 
-CREATE TABLE appointment (
-    appointment_id SERIAL PRIMARY KEY,
-    caregiver_user_id INTEGER NOT NULL,
-    member_user_id INTEGER NOT NULL,
-    appointment_date DATE NOT NULL,
-    appointment_time TIME NOT NULL,
-    work_hours DECIMAL(5, 2) NOT NULL,
-    status VARCHAR(20) NOT NULL CHECK (status IN ('pending', 'accepted', 'declined')),
-    FOREIGN KEY (caregiver_user_id) REFERENCES caregiver(caregiver_user_id) ON DELETE CASCADE,
-    FOREIGN KEY (member_user_id) REFERENCES member(member_user_id) ON DELETE CASCADE
-);
+CREATE INDEX ix_job_application_job_id ON job_application (job_id);
+
+CREATE OR REPLACE FUNCTION caregiver_earnings_appointments() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+        INSERT INTO caregiver_earnings AS e (caregiver_user_id, accepted_appointments, accepted_hours, earnings)
+        SELECT d.caregiver_user_id, d.appointments, d.hours, d.hours * c.hourly_rate
+        FROM (
+            SELECT caregiver_user_id, sum(appointments) AS appointments, sum(hours) AS hours
+            FROM (SELECT caregiver_user_id, 1 AS appointments, work_hours AS hours FROM new_rows WHERE status = 'accepted') changes GROUP BY caregiver_user_id
+        ) d
+        JOIN caregiver c ON c.caregiver_user_id = d.caregiver_user_id
+        ORDER BY d.caregiver_user_id
+        ON CONFLICT (caregiver_user_id) DO UPDATE SET
+            accepted_appointments = e.accepted_appointments + EXCLUDED.accepted_appointments,
+            accepted_hours = e.accepted_hours + EXCLUDED.accepted_hours,
+            earnings = e.earnings + EXCLUDED.earnings;
+        ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO caregiver_earnings AS e (caregiver_user_id, accepted_appointments, accepted_hours, earnings)
+        SELECT d.caregiver_user_id, d.appointments, d.hours, d.hours * c.hourly_rate
+        FROM (
+            SELECT caregiver_user_id, sum(appointments) AS appointments, sum(hours) AS hours
+            FROM (SELECT caregiver_user_id, -1 AS appointments, -work_hours AS hours FROM old_rows WHERE status = 'accepted') changes GROUP BY caregiver_user_id
+        ) d
+        JOIN caregiver c ON c.caregiver_user_id = d.caregiver_user_id
+        ORDER BY d.caregiver_user_id
+        ON CONFLICT (caregiver_user_id) DO UPDATE SET
+            accepted_appointments = e.accepted_appointments + EXCLUDED.accepted_appointments,
+            accepted_hours = e.accepted_hours + EXCLUDED.accepted_hours,
+            earnings = e.earnings + EXCLUDED.earnings;
+        ELSE
+        INSERT INTO caregiver_earnings AS e (caregiver_user_id, accepted_appointments, accepted_hours, earnings)
+        SELECT d.caregiver_user_id, d.appointments, d.hours, d.hours * c.hourly_rate
+        FROM (
+            SELECT caregiver_user_id, sum(appointments) AS appointments, sum(hours) AS hours
+            FROM (SELECT caregiver_user_id, 1 AS appointments, work_hours AS hours FROM new_rows WHERE status = 'accepted' UNION ALL SELECT caregiver_user_id, -1 AS appointments, -work_hours AS hours FROM old_rows WHERE status = 'accepted') changes GROUP BY caregiver_user_id
+        ) d
+        JOIN caregiver c ON c.caregiver_user_id = d.caregiver_user_id
+        ORDER BY d.caregiver_user_id
+        ON CONFLICT (caregiver_user_id) DO UPDATE SET
+            accepted_appointments = e.accepted_appointments + EXCLUDED.accepted_appointments,
+            accepted_hours = e.accepted_hours + EXCLUDED.accepted_hours,
+            earnings = e.earnings + EXCLUDED.earnings;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS appointment_earnings_insert ON appointment;
+
+CREATE TRIGGER appointment_earnings_insert AFTER INSERT ON appointment
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION caregiver_earnings_appointments();
+
+DROP TRIGGER IF EXISTS appointment_earnings_update ON appointment;
+
+CREATE TRIGGER appointment_earnings_update AFTER UPDATE ON appointment
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION caregiver_earnings_appointments();
+
+DROP TRIGGER IF EXISTS appointment_earnings_delete ON appointment;
+
+CREATE TRIGGER appointment_earnings_delete AFTER DELETE ON appointment
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION caregiver_earnings_appointments();
+
+CREATE OR REPLACE FUNCTION caregiver_earnings_rate() RETURNS trigger AS $$
+    BEGIN
+        UPDATE caregiver_earnings SET earnings = accepted_hours * NEW.hourly_rate
+        WHERE caregiver_user_id = NEW.caregiver_user_id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS caregiver_earnings_rate ON caregiver;
+
+CREATE TRIGGER caregiver_earnings_rate AFTER UPDATE OF hourly_rate ON caregiver
+    FOR EACH ROW WHEN (OLD.hourly_rate IS DISTINCT FROM NEW.hourly_rate)
+    EXECUTE FUNCTION caregiver_earnings_rate();
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS job_applications_view AS
+        SELECT
+            ja.job_id,
+            j.required_caregiving_type,
+            j.other_requirements,
+            j.date_posted,
+            ja.caregiver_user_id,
+            u.given_name || ' ' || u.surname AS applicant_name,
+            c.caregiving_type,
+            c.hourly_rate,
+            ja.date_applied
+        FROM job_application ja
+        JOIN job j ON ja.job_id = j.job_id
+        JOIN caregiver c ON ja.caregiver_user_id = c.caregiver_user_id
+        JOIN users u ON c.caregiver_user_id = u.user_id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_job_applications_view ON job_applications_view (job_id, caregiver_user_id);
+
+CREATE INDEX IF NOT EXISTS ix_job_applications_view_applied ON job_applications_view (job_id, date_applied)
+        INCLUDE (applicant_name, required_caregiving_type);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS caregiver_match_candidates AS
+        SELECT
+            c.caregiver_user_id,
+            c.caregiving_type,
+            u.city,
+            c.hourly_rate,
+            u.given_name || ' ' || u.surname AS caregiver_name
+        FROM caregiver c
+        JOIN users u ON c.caregiver_user_id = u.user_id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_caregiver_match_candidates ON caregiver_match_candidates (caregiver_user_id);
+
+CREATE INDEX IF NOT EXISTS ix_caregiver_match_candidates_city
+        ON caregiver_match_candidates (caregiving_type, city, hourly_rate, caregiver_user_id) INCLUDE (caregiver_name);
 
+CREATE INDEX IF NOT EXISTS ix_caregiver_match_candidates_rate
+        ON caregiver_match_candidates (caregiving_type, hourly_rate, caregiver_user_id) INCLUDE (city, caregiver_name);
@@ -0,0 +1,101 @@
+"""
+Search for the list views
+- fulltext (default): GIN tsvector expression indexes, ranked with ts_rank;
+  every search term is treated as a prefix. Lists over joined tables match
+  each table through its own index and combine the keys (see apply)
+- substring: ILIKE '%q%', served by the pg_trgm indexes on users
+- fuzzy: pg_trgm similarity, tolerant of misspellings, best match first
+"""
+
+import re
+
+from sqlalchemy import Double, cast, func, or_, union
+from sqlalchemy.orm import with_expression
+
+from models import SEARCH_CONFIG
+
+
+SEARCH_MODES = ('fulltext', 'substring', 'fuzzy')
+
+
+def to_tsquery(search_query):
+    """Turn free text into a prefix tsquery, or None when nothing searchable remains"""
+    terms = []
+    for term in search_query.split():
+        if not re.search(r'\w', term):
+            continue
+        term = term.replace('\\', '\\\\').replace("'", "''")
+        terms.append(f"'{term}':*")
+    if not terms:
+        return None
+    return func.to_tsquery(SEARCH_CONFIG, ' & '.join(terms))
+
+
+def matches(documents, tsquery):
+    return or_(*[document.op('@@')(tsquery) for document in documents])
+
+
+def rank(documents, tsquery):
+    total = func.ts_rank(documents[0], tsquery)
+    for document in documents[1:]:
+        total = total + func.ts_rank(document, tsquery)
+    # ts_rank is a real; as a double it survives the round trip through a page cursor
+    return cast(total, Double)
+
+
+def apply(query, entity, documents, search_query, extra=None, key=None, sources=None):
+    """Filter `query` to rows matching `search_query` and attach entity.search_rank
+
+    `extra` is an optional SQL condition OR'd with the text match (for
+    example an exact status match). Returns (query, rank expression), or
+    (query, None) when the search text has no searchable terms.
+
+    When the documents come from different joined tables, no index can serve
+    an OR of them over the join. Pass `key` and `sources` instead: (select,
+    document) pairs, each selecting the `key` values of the rows whose
+    document (on the select's own table, through its GIN index) matches. Rows
+    are kept where key IN the union of those selects, and `extra` is one more
+    select of keys. `documents` then only rank the rows found.
+    """
+    tsquery = to_tsquery(search_query)
+    if key is not None:
+        selects = [select.where(matches([document], tsquery)) for select, document in sources] if tsquery is not None else []
+        if extra is not None:
+            selects.append(extra)
+        condition = key.in_(union(*selects) if len(selects) > 1 else selects[0]) if selects else False
+    else:
+        condition = matches(documents, tsquery) if tsquery is not None else False
+        if extra is not None:
+            condition = or_(condition, extra)
+    if tsquery is None:
+        return query.filter(condition), None
+    search_rank = rank(documents, tsquery)
+    query = query.filter(condition).options(with_expression(entity.search_rank, search_rank))
+    return query, search_rank
+
+
+def search_mode_arg(args, default='fulltext'):
+    mode = args.get('mode', default)
+    return mode if mode in SEARCH_MODES else default
+
+
+def escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def substring(query, columns, search_query):
+    """Filter to rows where any of `columns` contains `search_query` (case-insensitive)"""
+    pattern = f"%{escape_like(search_query)}%"
+    return query.filter(or_(*[column.ilike(pattern, escape='\\') for column in columns]))
+
+
+def fuzzy(query, entity, columns, search_query):
+    """Filter to rows where any of `columns` is trigram-similar to `search_query`
+
+    Uses the pg_trgm `%` operator (index-backed, pg_trgm.similarity_threshold)
+    and ranks by the best similarity(). Returns (query, rank expression).
+    """
+    condition = or_(*[column.op('%')(search_query) for column in columns])
+    search_rank = cast(func.greatest(*[func.similarity(column, search_query) for column in columns]), Double)
+    query = query.filter(condition).options(with_expression(entity.search_rank, search_rank))
+    return query, search_rank
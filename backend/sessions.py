@@ -0,0 +1,33 @@
+"""
+The request-scoped database session
+Routes and blueprints share one session per request through get_db(); it is
+closed when the app context ends.
+"""
+
+from flask import g
+
+from models import SessionLocal
+
+
+def get_db():
+    """The request's session, created on first use
+
+    It checks out a pooled connection only when its first query runs;
+    _teardown_db() closes it after the request. Routes commit their writes
+    themselves: anything left uncommitted is rolled back.
+    """
+    if 'db' not in g:
+        g.db = SessionLocal()
+    return g.db
+
+
+def _teardown_db(error):
+    # Not committed here: HTTP errors such as a 400 for a missing form field
+    # are handled responses, so `error` is None even though the route failed
+    db = g.pop('db', None)
+    if db is not None:
+        db.close()
+
+
+def init_app(app):
+    app.teardown_appcontext(_teardown_db)
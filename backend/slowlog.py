@@ -0,0 +1,167 @@
+"""
+Slow-query log
+Statements on the shared engine that run longer than SLOW_QUERY_MS are
+written, one JSON object per line, to a rotating file with their bound
+parameters and where they came from: the route, the CLI command, or a step
+named with set_step() (e.g. "complex_queries 6.4"). For a sample of slow
+SELECTs the plan is captured with EXPLAIN (ANALYZE, BUFFERS).
+
+EXPLAIN ANALYZE runs the query again. In a web request that happens at
+teardown, after instrumentation has recorded the request's metrics, on a
+connection of its own (see init_app); elsewhere it runs right away.
+
+Disabled unless SLOW_QUERY_MS is set.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+
+import click
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '0'))
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', 'slow_queries.log')
+SLOW_QUERY_LOG_BYTES = int(os.getenv('SLOW_QUERY_LOG_BYTES', str(10 * 1024 * 1024)))
+SLOW_QUERY_LOG_BACKUPS = int(os.getenv('SLOW_QUERY_LOG_BACKUPS', '5'))
+# Fraction of slow SELECTs whose plan is captured; EXPLAIN ANALYZE runs the query again
+SLOW_QUERY_EXPLAIN_SAMPLE = float(os.getenv('SLOW_QUERY_EXPLAIN_SAMPLE', '0.1'))
+
+logger = logging.getLogger('slow_queries')
+
+_step = contextvars.ContextVar('slow_query_step', default=None)
+
+
+def set_step(name):
+    """Name what the current code is doing, for statements logged from here on"""
+    _step.set(name)
+
+
+def _context():
+    context = {}
+    if has_request_context():
+        context['route'] = request.url_rule.rule if request.url_rule else request.path
+        context['endpoint'] = request.endpoint
+    else:
+        click_context = click.get_current_context(silent=True)
+        if click_context is not None:
+            context['command'] = click_context.command_path
+    if _step.get() is not None:
+        context['step'] = _step.get()
+    return context
+
+
+_engine = None
+_deferred = False
+
+
+def _explain(conn, statement, parameters):
+    cursor = conn.connection.dbapi_connection.cursor()
+    # The EXPLAIN runs inside a savepoint that is always rolled back, so neither
+    # its failure nor any side effect of running the query again survives
+    try:
+        cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + statement, parameters)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+        except Exception as error:
+            return f"EXPLAIN failed: {error}"
+        finally:
+            cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+    finally:
+        cursor.close()
+
+
+def _explain_later(statement, parameters):
+    # On a pooled connection of its own, through the DBAPI cursor so that the
+    # engine's statement hooks (and the request's metrics) never see it
+    try:
+        connection = _engine.raw_connection()
+    except Exception as error:
+        return f"EXPLAIN failed: {error}"
+    try:
+        cursor = connection.cursor()
+        try:
+            cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + statement, parameters)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+        except Exception as error:
+            return f"EXPLAIN failed: {error}"
+        finally:
+            cursor.close()
+            connection.rollback()
+    finally:
+        connection.close()
+
+
+def _explain_pending(error=None):
+    for entry, statement, parameters in g.pop('slow_query_explains', []):
+        entry['plan'] = _explain_later(statement, parameters)
+        logger.warning(json.dumps(entry, default=str))
+
+
+def _before_statement(conn, cursor, statement, parameters, context, executemany):
+    # Discarded with the execution context, also when the statement fails
+    if context is not None:
+        context._slow_query_start = time.perf_counter()
+
+
+def _after_statement(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, '_slow_query_start', None)
+    if start is None:
+        return
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if elapsed_ms < SLOW_QUERY_MS:
+        return
+    entry = {
+        'time': datetime.now(timezone.utc).isoformat(),
+        'duration_ms': round(elapsed_ms, 3),
+        **_context(),
+        'statement': statement,
+        'parameters': parameters,
+    }
+    # Only plain SELECTs inside a transaction (where a savepoint is possible) are explained
+    explainable = (
+        statement.lstrip().upper().startswith('SELECT')
+        and not executemany
+        and not conn.connection.dbapi_connection.autocommit
+    )
+    if explainable and random.random() < SLOW_QUERY_EXPLAIN_SAMPLE:
+        if _deferred and has_request_context():
+            g.setdefault('slow_query_explains', []).append((entry, statement, parameters))
+            return
+        entry['plan'] = _explain(conn, statement, parameters)
+    logger.warning(json.dumps(entry, default=str))
+
+
+def install(engine):
+    """Log slow statements on `engine` when SLOW_QUERY_MS is set"""
+    global _engine
+    if SLOW_QUERY_MS <= 0:
+        return
+    _engine = engine
+    if not logger.handlers:
+        handler = RotatingFileHandler(
+            SLOW_QUERY_LOG, maxBytes=SLOW_QUERY_LOG_BYTES, backupCount=SLOW_QUERY_LOG_BACKUPS, encoding='utf-8'
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.WARNING)
+        logger.propagate = False
+    event.listen(engine, 'before_cursor_execute', _before_statement)
+    event.listen(engine, 'after_cursor_execute', _after_statement)
+
+
+def init_app(app):
+    """Capture the sampled plans of a request's slow statements at its teardown"""
+    global _deferred
+    if SLOW_QUERY_MS <= 0:
+        return
+    _deferred = True
+    app.teardown_request(_explain_pending)
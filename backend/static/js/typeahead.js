@@ -0,0 +1,99 @@
+// Typeahead for the caregiver / member / job fields (templates/_typeahead.html).
+// Typing queries the field's /lookup endpoint; picking a match fills the hidden
+// input that is submitted with the form.
+(function () {
+    var DELAY = 150;
+    // Shorter queries have no results (refdata.LOOKUP_MIN_CHARS)
+    var MIN_CHARS = 1;
+
+    function setup(field) {
+        var input = field.querySelector('.typeahead-input');
+        var hidden = field.querySelector('input[type=hidden]');
+        var list = field.querySelector('.typeahead-results');
+        var url = field.dataset.lookup;
+        var timer = null;
+        var request = 0;
+        var active = -1;
+
+        function validate() {
+            input.setCustomValidity(hidden.value ? '' : 'Pick a match from the list');
+        }
+
+        function close() {
+            list.innerHTML = '';
+            list.hidden = true;
+            active = -1;
+        }
+
+        function choose(item) {
+            hidden.value = item.dataset.id;
+            input.value = item.textContent;
+            validate();
+            close();
+        }
+
+        function highlight(index) {
+            var items = list.children;
+            if (!items.length) return;
+            active = (index + items.length) % items.length;
+            for (var i = 0; i < items.length; i++) {
+                items[i].classList.toggle('active', i === active);
+            }
+        }
+
+        function search() {
+            if (input.value.replace(/\s/g, '').length < MIN_CHARS) {
+                // Also drops the results of a request still in flight
+                ++request;
+                close();
+                return;
+            }
+            var params = new URLSearchParams({q: input.value});
+            if (field.dataset.type) params.set('type', field.dataset.type);
+            var current = ++request;
+            fetch(url + '?' + params, {headers: {Accept: 'application/json'}})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    // A slower, older response must not replace newer results
+                    if (current !== request) return;
+                    list.innerHTML = '';
+                    data.results.forEach(function (result) {
+                        var item = document.createElement('li');
+                        item.dataset.id = result.id;
+                        item.textContent = result.label;
+                        list.appendChild(item);
+                    });
+                    list.hidden = !data.results.length;
+                    active = -1;
+                });
+        }
+
+        input.addEventListener('input', function () {
+            hidden.value = '';
+            validate();
+            clearTimeout(timer);
+            timer = setTimeout(search, DELAY);
+        });
+        input.addEventListener('focus', function () {
+            if (!hidden.value) search();
+        });
+        input.addEventListener('keydown', function (event) {
+            if (event.key === 'ArrowDown') highlight(active + 1);
+            else if (event.key === 'ArrowUp') highlight(active - 1);
+            else if (event.key === 'Escape') close();
+            else if (event.key === 'Enter' && active >= 0) choose(list.children[active]);
+            else return;
+            event.preventDefault();
+        });
+        input.addEventListener('blur', function () {
+            // Let a click on a result land before the list closes
+            setTimeout(close, 200);
+        });
+        list.addEventListener('mousedown', function (event) {
+            if (event.target.tagName === 'LI') choose(event.target);
+        });
+        validate();
+    }
+
+    document.querySelectorAll('.typeahead').forEach(setup);
+})();